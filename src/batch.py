@@ -0,0 +1,244 @@
+#!/usr/bin/python3.7
+'''The batch module schedules many months or departments in one run
+
+The jobs are listed in a JSON manifest, and run in a pool of processes.
+The CPUs available are split between the width of the pool and the
+CP-SAT workers of each job (see splitCpus). Each job writes its own
+schedule file, and a failing job does not affect the rest of them.
+
+The manifest has the following structure:
+    {
+        "jobs": [
+            {
+                "name": "cardiology-2020-06",
+                "doctorsFile": "cardiology/doctors.json",
+                "shiftConfsFile": "cardiology/shiftConfs.json",
+                "calendarFile": "cardiology/calendar-2020-06.json",
+                "scheduleFile": "cardiology/schedule-2020-06.json"
+            },
+            ...
+        ]
+    }
+Relative paths are relative to the directory of the manifest. The name
+is optional, and defaults to the position of the job in the list.
+
+An example call to the program would be:
+    python3.7 src/batch.py manifest.json --summary summary.json
+
+Run it with --help to see all the options. The summary lists the status
+of each job, and the program exits with status 1 if any job failed.
+
+Author: miggoncan
+'''
+
+import argparse
+import concurrent.futures
+import json
+import logging
+import sys
+import time
+import traceback
+from pathlib import Path
+
+import main as mainLib
+import scheduler
+import storage
+
+# Number of CP-SAT workers given to each job unless the width of the
+# pool or the workers per job are given
+DEFAULT_WORKERS_PER_JOB = 8
+
+# Set in each process of the pool by initProcess
+processSchedulerConf = None
+
+
+def splitCpus(cpus, numJobs, *, poolWidth=None, workersPerJob=None):
+    '''Split the CPUs between the processes of the pool and the CP-SAT
+    workers of each job
+
+    Args:
+        cpus: the number of CPUs to be used
+        numJobs: the number of jobs to be run
+
+    Keyword Args:
+        poolWidth: optional. The number of jobs to run at the same time
+        workersPerJob: optional. The number of CP-SAT workers of each
+            job
+
+    Returns:
+        A tuple as (poolWidth, workersPerJob). Values that were given
+        are returned as they are. Otherwise, they are chosen so that
+        poolWidth * workersPerJob is about the number of CPUs
+    '''
+    numJobs = max(1, numJobs)
+    if poolWidth is None:
+        if workersPerJob is None:
+            poolWidth = max(1, cpus // DEFAULT_WORKERS_PER_JOB)
+        else:
+            poolWidth = max(1, cpus // workersPerJob)
+        poolWidth = min(poolWidth, numJobs)
+    if workersPerJob is None:
+        workersPerJob = max(1, cpus // poolWidth)
+    return poolWidth, workersPerJob
+
+
+def readManifest(manifestPath):
+    '''Read the jobs of a manifest, making their paths absolute
+
+    Returns:
+        A list of dicts, one for each job. See the documentation of this
+        module
+    '''
+    manifest = storage.readJsonFile(manifestPath)
+    baseDir = Path(manifestPath).resolve().parent
+    jobs = []
+    for i, job in enumerate(manifest['jobs']):
+        job = dict(job)
+        job.setdefault('name', str(i))
+        for key in ('doctorsFile', 'shiftConfsFile', 'calendarFile',
+                'scheduleFile'):
+            if key not in job:
+                raise ValueError('The job {} does not have the key {}'
+                    .format(job['name'], key))
+            job[key] = str(baseDir / job[key])
+        jobs.append(job)
+    return jobs
+
+
+def initProcess(configDir):
+    '''Initialize a process of the pool
+
+    The logging has to be configured again, as the background threads
+    of the logging handlers are not inherited by forked processes. The
+    handlers are not queued, as the processes of the pool do not run 
+    the atexit handlers that flush the queues (see 
+    main.loadLoggingConfiguration)
+    '''
+    global processSchedulerConf
+    mainLib.loadLoggingConfiguration(configDir, queued=False)
+    processSchedulerConf = mainLib.loadSchedulerConfiguration(configDir)
+
+
+def runJob(job, solverParameters):
+    '''Run one job of the manifest in a process of the pool
+
+    Any exception is caught, so that it does not affect other jobs
+
+    Returns:
+        A dict summarizing the job, with the keys name, status (the
+        status of the schedule, or 'FAILED' if an exception was raised),
+        scheduleFile, wallTime and error (only if an exception was
+        raised)
+    '''
+    log = logging.getLogger('batch')
+    log.info('Starting the job %s', job['name'])
+    start = time.perf_counter()
+    summary = {'name': job['name'], 'scheduleFile': job['scheduleFile']}
+    try:
+        schedule = scheduler.schedule(
+            storage.readJsonFile(job['doctorsFile']),
+            storage.readJsonFile(job['shiftConfsFile']),
+            storage.readJsonFile(job['calendarFile']),
+            processSchedulerConf, solverParameters=solverParameters)
+        storage.writeJsonFile(job['scheduleFile'], schedule)
+        summary['status'] = schedule['status']
+    except Exception as e:
+        log.error('The job %s failed: %s', job['name'],
+            traceback.format_exc())
+        summary['status'] = 'FAILED'
+        summary['error'] = '{}: {}'.format(type(e).__name__, e)
+    summary['wallTime'] = time.perf_counter() - start
+    log.info('Finished the job %s with status %s', job['name'],
+        summary['status'])
+    return summary
+
+
+def runBatch(jobs, configDir, *, cpus=None, poolWidth=None,
+        workersPerJob=None, solverParameters=None):
+    '''Run the given jobs in a pool of processes
+
+    Args:
+        jobs: a list of jobs as returned by readManifest
+        configDir: a Path to the configuration directory
+
+    Keyword Args:
+        cpus: optional. The number of CPUs to be used. Defaults to the
+            ones available (see scheduler.getAvailableCpus)
+        poolWidth, workersPerJob: see splitCpus
+        solverParameters: optional. CP-SAT parameters for all the jobs.
+            See scheduler.schedule
+
+    Returns:
+        A list with the summary of each job (see runJob), in the same
+        order as the jobs
+    '''
+    log = logging.getLogger('batch')
+    if cpus is None:
+        cpus = scheduler.getAvailableCpus()
+    poolWidth, workersPerJob = splitCpus(cpus, len(jobs),
+        poolWidth=poolWidth, workersPerJob=workersPerJob)
+    log.info('Running %d jobs in %d processes with %d CP-SAT workers each',
+        len(jobs), poolWidth, workersPerJob)
+    jobParameters = {'num_search_workers': workersPerJob}
+    if solverParameters:
+        jobParameters.update(solverParameters)
+
+    summaries = [None] * len(jobs)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=poolWidth,
+            initializer=initProcess, initargs=(configDir,)) as pool:
+        futures = {pool.submit(runJob, job, jobParameters): i
+            for i, job in enumerate(jobs)}
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            try:
+                summaries[i] = future.result()
+            except Exception as e:
+                # E.g. the process running the job died
+                log.error('The job %s could not be run: %s', jobs[i]['name'],
+                    e)
+                summaries[i] = {'name': jobs[i]['name'],
+                    'scheduleFile': jobs[i]['scheduleFile'],
+                    'status': 'FAILED',
+                    'error': '{}: {}'.format(type(e).__name__, e)}
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate the schedules listed in a manifest')
+    parser.add_argument('manifest', type=Path)
+    parser.add_argument('--configDir', type=Path,
+        default=mainLib.DEFAULT_CONFIG_DIR)
+    parser.add_argument('--cpus', type=int, default=None,
+        help='number of CPUs to use. Defaults to the available ones')
+    parser.add_argument('--poolWidth', type=int, default=None,
+        help='number of jobs run at the same time')
+    parser.add_argument('--workersPerJob', type=int, default=None,
+        help='number of CP-SAT workers of each job')
+    parser.add_argument('--solverParameters', type=json.loads, default=None,
+        help='JSON dict of CP-SAT parameters for all the jobs')
+    parser.add_argument('--summary', type=Path, default=None,
+        help='store the summary of the jobs in this file')
+    args = parser.parse_args()
+
+    mainLib.loadLoggingConfiguration(args.configDir)
+    log = logging.getLogger('batch')
+
+    jobs = readManifest(args.manifest)
+    summaries = runBatch(jobs, args.configDir, cpus=args.cpus,
+        poolWidth=args.poolWidth, workersPerJob=args.workersPerJob,
+        solverParameters=args.solverParameters)
+    if args.summary:
+        storage.writeJsonFile(args.summary, summaries)
+    else:
+        print(json.dumps(summaries, indent=2))
+
+    numFailed = sum(1 for summary in summaries
+        if summary['status'] == 'FAILED')
+    log.info('%d jobs finished, %d failed', len(summaries), numFailed)
+    if numFailed > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
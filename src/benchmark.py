@@ -0,0 +1,213 @@
+#!/usr/bin/python3.7
+'''The benchmark module times scheduler.schedule over synthetic workloads
+
+For each department size, a workload is generated (see the generator
+module) and scheduled several times. The median wall time of the whole
+call and of each of its phases (see the stats returned by
+scheduler.schedule) are reported.
+
+The results can be stored, and later runs can be compared against them
+to catch regressions before deployment:
+    python3.7 src/benchmark.py --save baseline.json
+    ... (change the scheduler) ...
+    python3.7 src/benchmark.py --baseline baseline.json
+
+When a baseline is given, the program exits with status 1 if any
+measure is slower than the baseline by more than the tolerance. Note
+the baseline has to be generated in the same hardware the comparisons
+are made on.
+
+Author: miggoncan
+'''
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import generator
+import scheduler
+import storage
+
+DEFAULT_SIZES = [10, 25, 50, 100, 250, 500, 1000]
+DEFAULT_CONFIG_FILE = Path(__file__).resolve().parent.parent \
+    / 'config' / 'scheduler.json'
+
+# Measures whose baseline is below this number of seconds are not
+# compared, as they are dominated by noise
+MIN_COMPARED_SECONDS = 0.05
+
+
+def runBenchmark(sizes, *, schedulerConf, repetitions=3, year=2020, month=6,
+        preferenceDensity=0.1, consultationRate=0.2, cycleShiftRate=10,
+        seed=0, solverParameters=None):
+    '''Time scheduler.schedule for each of the given department sizes
+
+    Args:
+        sizes: an iterable of ints. The number of doctors of each
+            workload
+
+    Keyword Args:
+        schedulerConf: the scheduler configuration. The configurations
+            returned by generator.generateWorkload are added to it
+        repetitions: the number of times each workload is scheduled
+        year, month, preferenceDensity, consultationRate, cycleShiftRate,
+            seed: see generator.generateWorkload
+        solverParameters: see scheduler.schedule
+
+    Returns:
+        A dict with the results of the benchmark. Its 'results' key maps
+        each size (as a str) to a dict like:
+            {
+                'total': 1.52,
+                'phases': {'preferences': 0.01, 'solve': 1.4, ...},
+                'status': 'OPTIMAL',
+                'objective': 120.0,
+                'numVariables': 3600,
+                'numConstraints': 3900
+            }
+        Where the times are the median wall time in seconds, and the
+        rest of the values are the ones of the last repetition
+    '''
+    log = logging.getLogger('benchmark')
+    results = {}
+    for size in sizes:
+        workload = generator.generateWorkload(size, year, month,
+            preferenceDensity=preferenceDensity,
+            consultationRate=consultationRate,
+            cycleShiftRate=cycleShiftRate, seed=seed)
+        conf = dict(schedulerConf)
+        conf.update(workload['schedulerConf'])
+
+        totals = []
+        phases = {}
+        for repetition in range(repetitions):
+            start = time.perf_counter()
+            schedule = scheduler.schedule(workload['doctors'],
+                workload['shiftConfs'], workload['calendar'], conf,
+                solverParameters=solverParameters, collectStats=True)
+            totals.append(time.perf_counter() - start)
+            for name, times in schedule['stats']['phases'].items():
+                phases.setdefault(name, []).append(times['wallTime'])
+        stats = schedule['stats']
+        results[str(size)] = {
+            'total': statistics.median(totals),
+            'phases': {name: statistics.median(times)
+                for name, times in phases.items()},
+            'status': stats['status'],
+            'objective': stats['objective'],
+            'numVariables': stats['numVariables'],
+            'numConstraints': stats['numConstraints']
+        }
+        log.info('%s doctors: %s', size, results[str(size)])
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': scheduler.getAvailableCpus()
+        },
+        'parameters': {
+            'repetitions': repetitions,
+            'year': year,
+            'month': month,
+            'preferenceDensity': preferenceDensity,
+            'consultationRate': consultationRate,
+            'cycleShiftRate': cycleShiftRate,
+            'seed': seed,
+            'solverParameters': solverParameters
+        },
+        'results': results
+    }
+
+
+def compareResults(results, baseline, tolerance):
+    '''Compare the results of runBenchmark against a baseline
+
+    Args:
+        results, baseline: dicts returned by runBenchmark
+        tolerance: the allowed relative slowdown. E.g. 0.2 means a
+            measure can be up to a 20% slower than the baseline
+
+    Returns:
+        A list of str, one for each regression found
+    '''
+    regressions = []
+    for size, result in results['results'].items():
+        baselineResult = baseline['results'].get(size, None)
+        if baselineResult is None:
+            continue
+        measures = [('total', result['total'], baselineResult['total'])]
+        for name, value in result['phases'].items():
+            if name in baselineResult['phases']:
+                measures.append((name, value, baselineResult['phases'][name]))
+        for name, value, baselineValue in measures:
+            if baselineValue < MIN_COMPARED_SECONDS:
+                continue
+            if value > baselineValue * (1 + tolerance):
+                regressions.append('{} doctors, {}: {:.3f}s vs {:.3f}s in '
+                    'the baseline (+{:.0%})'.format(size, name, value,
+                    baselineValue, value / baselineValue - 1))
+        if result['status'] != baselineResult['status']:
+            regressions.append('{} doctors: the status is {}, but it was {} '
+                'in the baseline'.format(size, result['status'],
+                baselineResult['status']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the scheduler over synthetic workloads')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+        help='number of doctors of each workload')
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--year', type=int, default=2020)
+    parser.add_argument('--month', type=int, default=6)
+    parser.add_argument('--preferenceDensity', type=float, default=0.1)
+    parser.add_argument('--consultationRate', type=float, default=0.2)
+    parser.add_argument('--cycleShiftRate', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--solverParameters', type=json.loads, default=None,
+        help='JSON dict of CP-SAT parameters. E.g. '
+            '\'{"max_time_in_seconds": 60}\'')
+    parser.add_argument('--schedulerConf', type=Path,
+        default=DEFAULT_CONFIG_FILE)
+    parser.add_argument('--save', type=Path, default=None,
+        help='store the results in this file')
+    parser.add_argument('--baseline', type=Path, default=None,
+        help='compare the results with the ones stored in this file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+        help='allowed relative slowdown with respect to the baseline')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING'))
+    # The progress of the benchmark is always shown
+    logging.getLogger('benchmark').setLevel(logging.INFO)
+
+    results = runBenchmark(args.sizes,
+        schedulerConf=storage.readJsonFile(args.schedulerConf),
+        repetitions=args.repetitions, year=args.year, month=args.month,
+        preferenceDensity=args.preferenceDensity,
+        consultationRate=args.consultationRate,
+        cycleShiftRate=args.cycleShiftRate, seed=args.seed,
+        solverParameters=args.solverParameters)
+    print(json.dumps(results, indent=2))
+    if args.save:
+        storage.writeJsonFile(args.save, results)
+
+    if args.baseline:
+        regressions = compareResults(results,
+            storage.readJsonFile(args.baseline), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION: ' + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
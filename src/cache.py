@@ -0,0 +1,228 @@
+'''The cache module stores generated schedules, so that identical
+requests do not need to be solved again
+
+Requests are identified by a canonical hash of their inputs (see
+getCacheKey). Two caches with the same interface are provided:
+    MemoryScheduleCache: a bounded LRU cache living in the process.
+        Useful for long-running processes (e.g. the worker mode)
+    DiskScheduleCache: a bounded LRU cache stored in a directory. It can
+        be shared by several concurrent processes
+
+Both of them keep hit and miss counters (see their counters method)
+
+Author: miggoncan
+'''
+
+import collections
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import storage
+
+# Change this value whenever the scheduler generates different schedules
+# for the same inputs, so that old entries are not used anymore
+CACHE_VERSION = 3
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+# Keys of the scheduler configuration that do not change the schedule
+IGNORED_CONFIGURATION_KEYS = ('cacheMaxEntries', 'cacheMaxBytes')
+
+
+def sortByKey(items, key):
+    '''Return a canonical order of a list of dicts identified by key
+
+    The order of these lists does not change the generated schedule
+    (e.g. the order of the doctors), so they are sorted by their key,
+    and then by their JSON representation. The rest of lists are kept in
+    order, as it may be meaningful (e.g. repeated solver parameters)
+    '''
+    if not isinstance(items, list):
+        return items
+    return sorted(items, key=lambda item: (
+        json.dumps(item.get(key, None) if isinstance(item, dict) else None,
+            sort_keys=True),
+        json.dumps(item, sort_keys=True)))
+
+
+def getCacheKey(doctors, shiftConfs, calendarDict, schedulerConf,
+        options=None):
+    '''Return a hash identifying a schedule request
+
+    Args:
+        doctors, shiftConfs, calendarDict, schedulerConf: see
+            scheduler.schedule. Only the values of the schedulerConf are
+            taken into account (not their descriptions)
+        options: optional. A JSON serializable object with any other
+            argument that changes the generated schedule (e.g. the
+            solver parameters or the hint)
+
+    Returns:
+        An hexadecimal str
+    '''
+    configuration = {key: conf.get('value', None)
+        if isinstance(conf, dict) else conf
+        for key, conf in schedulerConf.items()
+        if key not in IGNORED_CONFIGURATION_KEYS}
+    if isinstance(calendarDict, dict):
+        calendarDict = dict(calendarDict, dayConfigurations=sortByKey(
+            calendarDict.get('dayConfigurations', None), 'day'))
+    request = {
+        'version': CACHE_VERSION,
+        'doctors': sortByKey(doctors, 'id'),
+        'shiftConfs': sortByKey(shiftConfs, 'doctorId'),
+        'calendar': calendarDict,
+        'configuration': configuration,
+        'options': options
+    }
+    serialized = json.dumps(request, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class MemoryScheduleCache:
+    '''A LRU cache of schedules kept in memory
+
+    It is thread safe, but it is not shared between processes
+    '''
+    def __init__(self, maxEntries=DEFAULT_MAX_ENTRIES):
+        self.maxEntries = maxEntries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        '''Return the schedule stored with key, or None'''
+        with self.lock:
+            schedule = self.entries.get(key, None)
+            if schedule is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            # A deep copy, so that the caller can modify it
+            return json.loads(schedule)
+
+    def put(self, key, schedule):
+        with self.lock:
+            self.entries[key] = json.dumps(schedule)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+    def counters(self):
+        '''Return a dict with the keys hits, misses and entries'''
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self.entries)}
+
+
+class DiskScheduleCache:
+    '''A LRU cache of schedules stored in a directory
+
+    Each schedule is stored in its own file, written atomically, and the
+    modification time of the files is used as their last access time.
+    The eviction and the counters are protected with a lock file, so
+    that several processes can share the same directory
+    '''
+    ENTRY_SUFFIX = '.json'
+    LOCK_FILE_NAME = '.lock'
+    COUNTERS_FILE_NAME = 'counters.json'
+
+    def __init__(self, directory, *, maxEntries=DEFAULT_MAX_ENTRIES,
+            maxBytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+
+    def getEntryPath(self, key):
+        return self.directory / (key + self.ENTRY_SUFFIX)
+
+    def locked(self):
+        '''Return an open lock file. The lock is held until it is closed.
+        E.g.
+            with self.locked():
+                ...
+        '''
+        lockFile = (self.directory / self.LOCK_FILE_NAME).open(mode='a')
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        return lockFile
+
+    def updateCounters(self, counter):
+        with self.locked():
+            counters = self.readCounters()
+            counters[counter] += 1
+            storage.writeJsonFile(self.directory / self.COUNTERS_FILE_NAME,
+                counters)
+
+    def readCounters(self):
+        try:
+            return storage.readJsonFile(
+                self.directory / self.COUNTERS_FILE_NAME)
+        except (OSError, ValueError):
+            return {'hits': 0, 'misses': 0}
+
+    def get(self, key):
+        '''Return the schedule stored with key, or None'''
+        entryPath = self.getEntryPath(key)
+        try:
+            schedule = storage.readJsonFile(entryPath)
+            # Mark the entry as recently used
+            os.utime(entryPath)
+        except (OSError, ValueError):
+            # The entry does not exist, or it has just been evicted
+            self.updateCounters('misses')
+            return None
+        self.updateCounters('hits')
+        return schedule
+
+    def put(self, key, schedule):
+        storage.writeJsonFile(self.getEntryPath(key), schedule)
+        with self.locked():
+            self.evict()
+
+    def listEntries(self):
+        '''Return a list of tuples as (mtime, size, path), one for each
+        entry, sorted from the least to the most recently used'''
+        entries = []
+        for path in self.directory.glob('*' + self.ENTRY_SUFFIX):
+            if path.name == self.COUNTERS_FILE_NAME:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        '''Remove the least recently used entries until the cache is
+        within its limits. Must be called with the lock held'''
+        entries = self.listEntries()
+        totalBytes = sum(size for _, size, _ in entries)
+        numEntries = len(entries)
+        for _, size, path in entries:
+            if numEntries <= self.maxEntries and totalBytes <= self.maxBytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            numEntries -= 1
+            totalBytes -= size
+
+    def counters(self):
+        '''Return a dict with the keys hits, misses, entries and bytes'''
+        with self.locked():
+            counters = self.readCounters()
+        entries = self.listEntries()
+        counters['entries'] = len(entries)
+        counters['bytes'] = sum(size for _, size, _ in entries)
+        return counters
@@ -0,0 +1,216 @@
+#!/usr/bin/python3.7
+'''The generator module creates synthetic inputs for the scheduler
+
+The generated doctors, shiftConfs and calendar follow the format
+expected by scheduler.schedule, and try to resemble the ones of a real
+department: most doctors do cycle-shifts, some of them do
+consultations, and both the shift configurations and the calendar have
+shift preferences. The number of shifts and consultations of each day
+is chosen so that the doctors can cover them.
+
+It can be used as a module (see generateWorkload), or as a program:
+    python3.7 src/generator.py --doctors 100 --year 2020 --month 6 \
+        --outputDir /tmp/workload
+
+Which will create the doctors.json, shiftConfs.json, calendar.json and
+schedulerConf.json files in the output directory. schedulerConf.json
+only contains the configurations that have to be changed in
+config/scheduler.json to schedule the workload (e.g. cycleShiftRate)
+
+Author: miggoncan
+'''
+
+import argparse
+import calendar as calendarLib
+import datetime
+import json
+import random
+from pathlib import Path
+
+from scheduler import WEEK_DAY
+
+# Keys of the shift preferences and the probability of each of them
+# once it has been decided that a doctor has a preference
+SHIFT_PREFERENCES = (
+    ('wantedShifts', 0.45),
+    ('unwantedShifts', 0.4),
+    ('unavailableShifts', 0.1),
+    ('mandatoryShifts', 0.05)
+)
+
+# Fraction of the shifts the doctors can take that will be needed each
+# day. Lower values make the problem easier to solve
+DEFAULT_LOAD = 0.6
+
+
+def choosePreference(rng):
+    '''Return the key of a shift preference, chosen according to the
+    probabilities in SHIFT_PREFERENCES'''
+    value = rng.random()
+    for key, probability in SHIFT_PREFERENCES:
+        if value < probability:
+            return key
+        value -= probability
+    return SHIFT_PREFERENCES[-1][0]
+
+
+def generateWorkload(numDoctors, year, month, *, preferenceDensity=0.1,
+        consultationRate=0.2, cycleShiftRate=10, load=DEFAULT_LOAD,
+        seed=None):
+    '''Generate the inputs of scheduler.schedule
+
+    Args:
+        numDoctors: the number of doctors of the department
+        year, month: the month to be scheduled
+
+    Keyword Args:
+        preferenceDensity: the probability of a doctor having a shift
+            preference for a given week day or day of the month.
+            Defaults to 0.1
+        consultationRate: the fraction of doctors that do consultations.
+            Defaults to 0.2
+        cycleShiftRate: the value of the cycleShiftRate configuration.
+            Defaults to 10
+        load: the fraction of the capacity of the doctors that will be
+            needed to cover the shifts and consultations. Defaults to
+            DEFAULT_LOAD
+        seed: the seed of the random generator. Defaults to None,
+            meaning a different workload is generated each time
+
+    Returns:
+        A dict with the keys:
+            doctors, shiftConfs, calendar: the arguments of
+                scheduler.schedule
+            schedulerConf: the configurations that have to be changed
+                in the scheduler configuration. E.g.
+                {'cycleShiftRate': {'value': 10}}
+    '''
+    rng = random.Random(seed)
+    weekDays = list(WEEK_DAY)
+    daysOfMonth = [day for day in calendarLib.Calendar().itermonthdates(
+        year, month) if day.month == month]
+    firstDayOfMonth = daysOfMonth[0]
+
+    doctors = []
+    shiftConfs = []
+    for docId in range(1, numDoctors + 1):
+        # Doctors started working some time in the last years
+        startDate = firstDayOfMonth \
+            - datetime.timedelta(days=rng.randint(1, 5 * 365))
+        doctors.append({
+            'id': docId,
+            'startDate': startDate.isoformat(),
+            'absence': None
+        })
+
+        doesCycleShifts = rng.random() < 0.7
+        numConsultations = rng.randint(2, 4) \
+            if rng.random() < consultationRate else 0
+        minShifts = rng.randint(0, 2)
+        shiftConf = {
+            'doctorId': docId,
+            'numConsultations': numConsultations,
+            'doesCycleShifts': doesCycleShifts,
+            'hasShiftsOnlyWhenCycleShifts': doesCycleShifts
+                and rng.random() < 0.05,
+            'minShifts': minShifts,
+            # Cycle-shifts also count as shifts. The mandatory shifts are
+            # added below
+            'maxShifts': minShifts + rng.randint(3, 5)
+                + (len(daysOfMonth) // cycleShiftRate + 1
+                    if doesCycleShifts else 0),
+            'wantedConsultations': []
+        }
+        for key, _ in SHIFT_PREFERENCES:
+            shiftConf[key] = []
+        for weekDay in weekDays:
+            if rng.random() < preferenceDensity:
+                key = choosePreference(rng)
+                # A mandatory shift every week is too much
+                if key == 'mandatoryShifts' \
+                        and shiftConf['mandatoryShifts']:
+                    continue
+                shiftConf[key].append({'shift': weekDay})
+            if numConsultations > 0 and weekDay not in ('Saturday', 'Sunday') \
+                    and rng.random() < preferenceDensity:
+                shiftConf['wantedConsultations'].append({'shift': weekDay})
+        # Mandatory shifts also count as shifts, so they are added to the
+        # maxShifts (the days of a cycle-shift may be counted twice)
+        mandatoryWeekDays = {WEEK_DAY[preference['shift']]
+            for preference in shiftConf['mandatoryShifts']}
+        shiftConf['maxShifts'] += sum(1 for day in daysOfMonth
+            if day.weekday() in mandatoryWeekDays)
+        shiftConfs.append(shiftConf)
+
+    # Capacity of the doctors, used to compute the shifts of each day
+    capacity = sum(shiftConf['maxShifts'] for shiftConf in shiftConfs
+        if not shiftConf['hasShiftsOnlyWhenCycleShifts'])
+    consultationCapacity = sum(shiftConf['numConsultations']
+        for shiftConf in shiftConfs)
+    consultationDays = [day for day in daysOfMonth if day.weekday() < 5]
+    numShifts = max(1, int(load * capacity / len(daysOfMonth)))
+    numConsultations = int(load * consultationCapacity
+        / max(1, len(consultationDays)))
+
+    dayConfigurations = []
+    for day in daysOfMonth:
+        dayConf = {
+            'day': day.day,
+            'isWorkingDay': True,
+            'numShifts': numShifts,
+            'numConsultations': numConsultations if day.weekday() < 5 else 0,
+            'cycleChanges': []
+        }
+        for key, _ in SHIFT_PREFERENCES:
+            dayConf[key] = []
+        # Day preferences are less common than week day ones
+        for docId in rng.sample(range(1, numDoctors + 1),
+                int(numDoctors * preferenceDensity / 7)):
+            key = choosePreference(rng)
+            if key != 'mandatoryShifts':
+                dayConf[key].append({'id': docId})
+        dayConfigurations.append(dayConf)
+
+    return {
+        'doctors': doctors,
+        'shiftConfs': shiftConfs,
+        'calendar': {
+            'year': year,
+            'month': month,
+            'dayConfigurations': dayConfigurations
+        },
+        'schedulerConf': {
+            'cycleShiftRate': {'value': cycleShiftRate}
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic inputs for the scheduler')
+    parser.add_argument('--doctors', type=int, required=True,
+        help='number of doctors')
+    parser.add_argument('--year', type=int, required=True)
+    parser.add_argument('--month', type=int, required=True)
+    parser.add_argument('--preferenceDensity', type=float, default=0.1)
+    parser.add_argument('--consultationRate', type=float, default=0.2)
+    parser.add_argument('--cycleShiftRate', type=int, default=10)
+    parser.add_argument('--load', type=float, default=DEFAULT_LOAD)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--outputDir', type=Path, required=True)
+    args = parser.parse_args()
+
+    workload = generateWorkload(args.doctors, args.year, args.month,
+        preferenceDensity=args.preferenceDensity,
+        consultationRate=args.consultationRate,
+        cycleShiftRate=args.cycleShiftRate, load=args.load, seed=args.seed)
+    args.outputDir.mkdir(parents=True, exist_ok=True)
+    for key, fileName in (('doctors', 'doctors.json'),
+            ('shiftConfs', 'shiftConfs.json'), ('calendar', 'calendar.json'),
+            ('schedulerConf', 'schedulerConf.json')):
+        with (args.outputDir / fileName).open(mode='w') as file:
+            file.write(json.dumps(workload[key], indent=2))
+
+
+if __name__ == '__main__':
+    main()
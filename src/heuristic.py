@@ -0,0 +1,599 @@
+'''The heuristic module generates schedules with a greedy construction
+followed by a local search, without OR-Tools
+
+It solves the same problem as scheduler.schedule (the same constraints
+and objective), but it does not prove that its schedules are optimal,
+and it may not find a schedule for tight inputs that have one. In
+exchange, it takes milliseconds, so its schedules are used:
+    - As an immediate preview (see the --heuristic argument of the main
+      module)
+    - As the hint of the solver (see the heuristicHint configuration)
+    - As a fallback when the solver finds no schedule within its time
+      limit, or OR-Tools is not installed (see the heuristicFallback
+      configuration)
+
+The construction first covers the shifts and consultations needed each
+day, starting with the days with fewer doctors to spare, then gives each
+doctor their minShifts, and then adds the assignments that improve the
+objective. The local search then moves assignments between the doctors
+of a day, and between the days of a doctor, and removes the ones that
+are not needed, while the objective improves
+
+Author: miggoncan
+'''
+
+import logging
+
+import scheduler
+import stats as statsLib
+
+# The kinds of assignments, used as the first index of the cells
+SHIFT = 0
+CONSULTATION = 1
+KINDS = (SHIFT, CONSULTATION)
+
+# Maximum number of rounds of the local search. Each round tries every
+# move once
+DEFAULT_MAX_ROUNDS = 100
+
+
+class Assignment:
+    '''The shifts and consultations of the working days of a month, with
+    the counts needed to check its constraints in constant time
+
+    The cells are indexed as [kind][i][j], where kind is SHIFT or
+    CONSULTATION, i is the index of a doctor in the shiftConfs, and j is
+    the index of a working day. Each cell is 0 or 1
+
+    Attributes:
+        values: the cells
+        objective: the objective value of the cells, as the one of
+            scheduler.schedule
+    '''
+    def __init__(self, *, shiftConfs, needs, fixed, gains):
+        '''
+        Keyword Args:
+            shiftConfs: see scheduler.schedule
+            needs: needs[kind][j] is the minimum number of assignments of
+                the kind the working day j
+            fixed: fixed[kind][i][j] is the value of the cell if it is
+                known before solving, or None
+            gains: gains[kind][i][j] is the change of the objective when
+                the cell is 1
+        '''
+        self.numDoctors = len(shiftConfs)
+        self.numDays = len(needs[SHIFT])
+        # The doctors that only have shifts with their cycle-shifts do
+        # not have minShifts and maxShifts in the model
+        self.bounded = [not shiftConf['hasShiftsOnlyWhenCycleShifts']
+            for shiftConf in shiftConfs]
+        self.minShifts = [shiftConf['minShifts'] for shiftConf in shiftConfs]
+        self.maxShifts = [shiftConf['maxShifts'] for shiftConf in shiftConfs]
+        self.maxConsultations = [shiftConf['numConsultations']
+            for shiftConf in shiftConfs]
+        self.needs = needs
+        self.fixed = fixed
+        self.gains = gains
+        self.values = [[[value or 0 for value in row] for row in fixed[kind]]
+            for kind in KINDS]
+        self.doctorCounts = [[sum(row) for row in self.values[kind]]
+            for kind in KINDS]
+        self.dayCounts = [[sum(row[j] for row in self.values[kind])
+            for j in range(self.numDays)] for kind in KINDS]
+        self.objective = sum(gain
+            for kind in KINDS
+            for valueRow, gainRow in zip(self.values[kind], gains[kind])
+            for value, gain in zip(valueRow, gainRow) if value)
+
+    def set(self, kind, i, j, value):
+        '''Set the value of a cell, updating the counts'''
+        delta = value - self.values[kind][i][j]
+        self.values[kind][i][j] = value
+        self.doctorCounts[kind][i] += delta
+        self.dayCounts[kind][j] += delta
+        self.objective += delta * self.gains[kind][i][j]
+
+    def isFree(self, kind, i, j):
+        return self.fixed[kind][i][j] is None
+
+    def getRemainingCapacity(self, i):
+        '''Return the number of assignments the doctor i can still have,
+        or None if it is not limited'''
+        if not self.bounded[i]:
+            return None
+        return self.maxShifts[i] - self.doctorCounts[SHIFT][i] \
+            - self.doctorCounts[CONSULTATION][i]
+
+    def canAdd(self, kind, i, j):
+        '''Return whether the cell can be set to 1 without breaking any
+        constraint'''
+        if not self.isFree(kind, i, j) or self.values[kind][i][j] \
+                or self.values[1 - kind][i][j]:
+            return False
+        if not self.bounded[i]:
+            return True
+        return self.getRemainingCapacity(i) > 0 and (kind == SHIFT
+            or self.doctorCounts[CONSULTATION][i] < self.maxConsultations[i])
+
+    def canLeave(self, kind, i, j):
+        '''Return whether the doctor i can lose the assignment of the cell
+        without breaking their minShifts (the day may need it)'''
+        if not self.isFree(kind, i, j) or not self.values[kind][i][j]:
+            return False
+        return kind == CONSULTATION or not self.bounded[i] \
+            or self.doctorCounts[SHIFT][i] > self.minShifts[i]
+
+    def canRemove(self, kind, i, j):
+        '''Return whether the cell can be set to 0 without breaking any
+        constraint'''
+        return self.canLeave(kind, i, j) \
+            and self.dayCounts[kind][j] > self.needs[kind][j]
+
+    def isBelowMinShifts(self, i):
+        return self.bounded[i] \
+            and self.doctorCounts[SHIFT][i] < self.minShifts[i]
+
+    def getViolations(self):
+        '''Return a list with a message for each constraint not met'''
+        violations = []
+        for kind, name in ((SHIFT, 'shifts'),
+                (CONSULTATION, 'consultations')):
+            for j in range(self.numDays):
+                if self.dayCounts[kind][j] < self.needs[kind][j]:
+                    violations.append('The working day {} has {} of its {} '
+                        '{}'.format(j, self.dayCounts[kind][j],
+                            self.needs[kind][j], name))
+        for i in range(self.numDoctors):
+            if self.isBelowMinShifts(i):
+                violations.append('The doctor {} has {} of their {} '
+                    'minShifts'.format(i, self.doctorCounts[SHIFT][i],
+                        self.minShifts[i]))
+        return violations
+
+    def makeRoom(self, kind, j):
+        '''Add an assignment of the kind the day j that cannot be simply
+        added, by first removing another assignment of the same doctor
+        that is not needed
+
+        Returns:
+            Whether the assignment was added
+        '''
+        candidates = sorted((i for i in range(self.numDoctors)
+                if self.isFree(kind, i, j) and not self.values[kind][i][j]),
+            key=lambda i: -self.gains[kind][i][j])
+        for i in candidates:
+            removed = []
+            if self.values[1 - kind][i][j]:
+                if not self.canRemove(1 - kind, i, j):
+                    continue
+                self.set(1 - kind, i, j, 0)
+                removed.append((1 - kind, j))
+            if not self.canAdd(kind, i, j):
+                # The capacity of the doctor is full. When consultations
+                # are limited, one of them has to be removed
+                consultationsFull = kind == CONSULTATION and \
+                    self.doctorCounts[CONSULTATION][i] \
+                        >= self.maxConsultations[i]
+                otherCells = [(otherKind, otherJ)
+                    for otherKind in ((CONSULTATION,) if consultationsFull
+                        else KINDS)
+                    for otherJ in range(self.numDays)
+                    if self.canRemove(otherKind, i, otherJ)]
+                if otherCells:
+                    otherKind, otherJ = min(otherCells, key=lambda cell:
+                        self.gains[cell[0]][i][cell[1]])
+                    self.set(otherKind, i, otherJ, 0)
+                    removed.append((otherKind, otherJ))
+            if self.canAdd(kind, i, j):
+                self.set(kind, i, j, 1)
+                return True
+            for otherKind, otherJ in removed:
+                self.set(otherKind, i, otherJ, 1)
+        return False
+
+    def transfer(self, kind, j, i, otherI):
+        '''Move the assignment of the cell of the doctor i to otherI, the
+        same day, if both can
+
+        Returns:
+            Whether the assignment was moved
+        '''
+        if i == otherI or not self.canLeave(kind, i, j):
+            return False
+        self.set(kind, i, j, 0)
+        if self.canAdd(kind, otherI, j):
+            self.set(kind, otherI, j, 1)
+            return True
+        self.set(kind, i, j, 1)
+        return False
+
+    def move(self, kind, i, j, otherJ):
+        '''Move the assignment of the cell of the doctor i to the day
+        otherJ, if both days can
+
+        Returns:
+            Whether the assignment was moved
+        '''
+        if j == otherJ or not self.canRemove(kind, i, j):
+            return False
+        self.set(kind, i, j, 0)
+        if self.canAdd(kind, i, otherJ):
+            self.set(kind, i, otherJ, 1)
+            return True
+        self.set(kind, i, j, 1)
+        return False
+
+
+def construct(assignment):
+    '''Give the assignment the shifts and consultations needed, and then
+    the ones that improve its objective
+
+    Args:
+        assignment: an Assignment, modified in place
+    '''
+    numDoctors = assignment.numDoctors
+    numDays = assignment.numDays
+    # The days with fewer doctors to spare are covered first, as the
+    # other days have more choices left
+    def getSlack(kind, j):
+        return sum(1 for i in range(numDoctors)
+            if assignment.isFree(kind, i, j)
+                and assignment.fixed[1 - kind][i][j] != 1) \
+            - (assignment.needs[kind][j] - assignment.dayCounts[kind][j])
+    cells = sorted(((kind, j) for kind in KINDS for j in range(numDays)),
+        key=lambda cell: (getSlack(*cell), -cell[0]))
+    for kind, j in cells:
+        while assignment.dayCounts[kind][j] < assignment.needs[kind][j]:
+            candidates = [i for i in range(numDoctors)
+                if assignment.canAdd(kind, i, j)]
+            if not candidates:
+                if not assignment.makeRoom(kind, j):
+                    break
+                continue
+            # Doctors still needing shifts first, then the best gains,
+            # then the doctors with more capacity left. The doctors that
+            # only have shifts with their cycle-shifts are the last
+            def getPriority(i):
+                capacity = assignment.getRemainingCapacity(i)
+                return (kind == SHIFT and assignment.isBelowMinShifts(i),
+                    assignment.gains[kind][i][j],
+                    -1 if capacity is None else capacity, -i)
+            assignment.set(kind, max(candidates, key=getPriority), j, 1)
+
+    for i in range(numDoctors):
+        days = sorted(range(numDays),
+            key=lambda j: -assignment.gains[SHIFT][i][j])
+        for j in days:
+            if not assignment.isBelowMinShifts(i):
+                break
+            if assignment.values[CONSULTATION][i][j] \
+                    and assignment.canRemove(CONSULTATION, i, j):
+                assignment.set(CONSULTATION, i, j, 0)
+            if not assignment.canAdd(SHIFT, i, j) \
+                    and assignment.isFree(SHIFT, i, j) \
+                    and not assignment.values[SHIFT][i][j] \
+                    and not assignment.values[CONSULTATION][i][j]:
+                # The capacity is full. A consultation of the doctor is
+                # removed, or given to another doctor
+                freeCapacity(assignment, i)
+            if assignment.canAdd(SHIFT, i, j):
+                assignment.set(SHIFT, i, j, 1)
+
+    addGains(assignment)
+
+
+def freeCapacity(assignment, i):
+    '''Remove a consultation of the doctor i, giving it to another doctor
+    if the day needs it
+
+    Returns:
+        Whether the consultation was removed
+    '''
+    for j in range(assignment.numDays):
+        if assignment.canRemove(CONSULTATION, i, j):
+            assignment.set(CONSULTATION, i, j, 0)
+            return True
+    for j in range(assignment.numDays):
+        if not assignment.values[CONSULTATION][i][j]:
+            continue
+        for otherI in range(assignment.numDoctors):
+            if assignment.transfer(CONSULTATION, j, i, otherI):
+                return True
+    return False
+
+
+def addGains(assignment):
+    '''Add the assignments that improve the objective, the best first
+
+    Returns:
+        Whether any assignment was added
+    '''
+    cells = sorted(((assignment.gains[kind][i][j], kind, i, j)
+            for kind in KINDS for i in range(assignment.numDoctors)
+            for j in range(assignment.numDays)
+            if assignment.gains[kind][i][j] > 0),
+        reverse=True)
+    added = False
+    for _, kind, i, j in cells:
+        if assignment.canAdd(kind, i, j):
+            assignment.set(kind, i, j, 1)
+            added = True
+    return added
+
+
+def improve(assignment, maxRounds=DEFAULT_MAX_ROUNDS):
+    '''Apply the moves that improve the objective of the assignment until
+    none does
+
+    The moves are: removing an assignment not needed that worsens the
+    objective, transferring an assignment to another doctor the same
+    day, moving an assignment of a doctor to another day, and adding an
+    assignment that improves the objective
+
+    Args:
+        assignment: an Assignment, modified in place
+        maxRounds: optional. The maximum number of rounds. Each round
+            tries every move once
+
+    Returns:
+        The number of moves applied
+    '''
+    numDoctors = assignment.numDoctors
+    numDays = assignment.numDays
+    gains = assignment.gains
+    values = assignment.values
+    # The doctors sorted by their gain, for each kind and day
+    doctorsByGain = [[sorted(range(numDoctors),
+            key=lambda i: -gains[kind][i][j]) for j in range(numDays)]
+        for kind in KINDS]
+    numMoves = 0
+    for _ in range(maxRounds):
+        startMoves = numMoves
+        for kind in KINDS:
+            for i in range(numDoctors):
+                for j in range(numDays):
+                    if gains[kind][i][j] < 0 \
+                            and assignment.canRemove(kind, i, j):
+                        assignment.set(kind, i, j, 0)
+                        numMoves += 1
+        for kind in KINDS:
+            for j in range(numDays):
+                for i in range(numDoctors):
+                    if not values[kind][i][j] \
+                            or not assignment.isFree(kind, i, j):
+                        continue
+                    for otherI in doctorsByGain[kind][j]:
+                        if gains[kind][otherI][j] <= gains[kind][i][j]:
+                            break
+                        if assignment.transfer(kind, j, i, otherI):
+                            numMoves += 1
+                            break
+        for kind in KINDS:
+            for i in range(numDoctors):
+                for j in range(numDays):
+                    if not values[kind][i][j] \
+                            or not assignment.isFree(kind, i, j):
+                        continue
+                    for otherJ in range(numDays):
+                        if gains[kind][i][otherJ] > gains[kind][i][j] \
+                                and assignment.move(kind, i, j, otherJ):
+                            numMoves += 1
+                            break
+        if addGains(assignment):
+            numMoves += 1
+        if numMoves == startMoves:
+            break
+    return numMoves
+
+
+def schedule(doctors, shiftConfs, calendarDict, schedulerConf, *,
+        collectStats=False, maxRounds=DEFAULT_MAX_ROUNDS):
+    '''Generate a schedule with the heuristic
+
+    Args:
+        doctors, shiftConfs, calendarDict, schedulerConf: see
+            scheduler.schedule
+
+    Keyword Args:
+        collectStats: optional. If True, the returned schedule will have
+            an additional 'stats' key, as the one of scheduler.schedule
+            with the 'construction' and 'localSearch' phases, a
+            'numMoves' key with the number of moves of the local search,
+            and a 'heuristic' key set to True. Its status is FEASIBLE,
+            or UNKNOWN if no schedule was found. The keys about the CP
+            model and its search (e.g. numVariables or numConflicts)
+            are 0, as no model is solved. Defaults to False
+        maxRounds: optional. See the improve function
+
+    Returns:
+        A schedule dict as the one of scheduler.schedule, with the key
+        'heuristic' set to True. If no schedule is found, the status is
+        GENERATION_ERROR and the issues are the ones found by
+        scheduler.checkFeasibility (the heuristic does not prove that
+        there is no schedule)
+    '''
+    log = logging.getLogger('heuristic')
+    timer = statsLib.PhaseTimer()
+    timer.startPhase('validation')
+    scheduler.checkInputs(doctors, shiftConfs, calendarDict)
+    year = calendarDict['year']
+    month = calendarDict['month']
+    log.info('Generating a heuristic schedule for %s-%s', year, month)
+    cycleShiftRate = scheduler.getConfiguration(schedulerConf,
+        'cycleShiftRate', default=scheduler.DEFAULT_CYCLE_SHIFT_RATE)
+    weights = {
+        'wantedShiftWeight': scheduler.getConfiguration(schedulerConf,
+            'wantedShiftWeight',
+            default=scheduler.DEFAULT_WANTED_SHIFT_WEIGHT),
+        'unwantedShiftWeight': scheduler.getConfiguration(schedulerConf,
+            'unwantedShiftWeight',
+            default=scheduler.DEFAULT_UNWANTED_SHIFT_WEIGHT),
+        'wantedConsultationWeight': scheduler.getConfiguration(
+            schedulerConf, 'wantedConsultationWeight',
+            default=scheduler.DEFAULT_WANTED_CONSULTATION_WEIGHT),
+        'allShiftWeight': scheduler.getConfiguration(schedulerConf,
+            'allShiftWeight', default=scheduler.DEFAULT_ALL_SHIFT_WEIGHT),
+        'consultationWeight': scheduler.getConfiguration(schedulerConf,
+            'consultationWeight',
+            default=scheduler.DEFAULT_CONSULTATION_WEIGHT)
+    }
+    dayConfs = sorted(calendarDict['dayConfigurations'],
+        key=lambda day: day['day'])
+    daysOfMonth = scheduler.getDaysOfMonth(year, month, dayConfs)
+
+    timer.startPhase('preferences')
+    requestKeys = ('wantedShifts', 'unwantedShifts')
+    requiredKeys = ('mandatoryShifts', 'unavailableShifts')
+    consultationKeys = ('wantedConsultations', 'unwantedConsultations')
+    preferences = scheduler.getAllShiftPreferences(shiftConfs=shiftConfs,
+        dayConfs=dayConfs,
+        keyPairs=(requestKeys, requiredKeys, consultationKeys),
+        daysOfMonth=daysOfMonth)
+
+    timer.startPhase('cycleShifts')
+    shiftConfsDict = {shiftConf['doctorId']: shiftConf
+        for shiftConf in shiftConfs}
+    absences = scheduler.getAbsences(doctors, daysOfMonth)
+    cycleShifts = scheduler.getCycleShifts(doctors=doctors,
+        shiftConfsDict=shiftConfsDict, daysOfMonth=daysOfMonth,
+        cycleShiftRate=cycleShiftRate, absences=absences)
+    workingDays = [dayConf['day'] for dayConf in dayConfs
+        if dayConf['isWorkingDay']]
+    forcedCycleShifts = scheduler.getForcedCycleShifts(
+        cycleShifts=cycleShifts, shiftConfsDict=shiftConfsDict,
+        workingDays=workingDays)
+    fixedShifts, fixedConsultations = scheduler.getFixedAssignments(
+        shiftConfsDict=shiftConfsDict, workingDays=workingDays,
+        required=preferences[requiredKeys],
+        forcedCycleShifts=forcedCycleShifts, absences=absences)
+
+    timer.startPhase('precheck')
+    issues = scheduler.checkFeasibility(shiftConfs=shiftConfs,
+        dayConfs=dayConfs, workingDays=workingDays, fixedShifts=fixedShifts,
+        fixedConsultations=fixedConsultations)
+
+    def getErrorSchedule(status):
+        timer.stop()
+        generatedSchedule = {
+            'month': month,
+            'year': year,
+            'status': 'GENERATION_ERROR',
+            'days': [],
+            'issues': issues
+        }
+        if collectStats:
+            generatedSchedule['stats'] = {
+                'phases': timer.toDict(),
+                'status': status,
+                'objective': None,
+                'bestBound': None,
+                'gap': None,
+                'objectiveTerms': None,
+                'numVariables': 0,
+                'numConstraints': 0,
+                'numSolutions': 0,
+                'numConflicts': 0,
+                'numBranches': 0,
+                'numMoves': 0,
+                'heuristic': True
+            }
+        return generatedSchedule
+
+    if issues:
+        return getErrorSchedule('INFEASIBLE')
+
+    timer.startPhase('construction')
+    docIds = [shiftConf['doctorId'] for shiftConf in shiftConfs]
+    docIndexes = {docId: i for i, docId in enumerate(docIds)}
+    consultationDays = {dayNum for dayNum in workingDays
+        if dayConfs[dayNum-1]['numConsultations'] > 0}
+    needs = [[dayConfs[dayNum-1]['numShifts'] for dayNum in workingDays],
+        [dayConfs[dayNum-1]['numConsultations']
+            if dayNum in consultationDays else 0 for dayNum in workingDays]]
+    # The cells of the doctors without consultations, and of the days
+    # without consultations, are 0 as in the model
+    fixed = [[[fixedShifts.get((docId, dayNum), None)
+            for dayNum in workingDays] for docId in docIds],
+        [[fixedConsultations.get((docId, dayNum), None)
+                if shiftConf['numConsultations'] > 0
+                    and dayNum in consultationDays else 0
+            for dayNum in workingDays]
+            for docId, shiftConf in zip(docIds, shiftConfs)]]
+    # The coefficients of each of the OBJECTIVE_TERMS, laid out as the
+    # cells
+    coefficients = {term: [[[0] * len(workingDays) for _ in docIds]
+            for kind in KINDS]
+        for term, _, _ in scheduler.OBJECTIVE_TERMS}
+    coefficients['shifts'][SHIFT] = [[1] * len(workingDays) for _ in docIds]
+    coefficients['consultations'][CONSULTATION] = [[1] * len(workingDays)
+        for _ in docIds]
+    for j, dayNum in enumerate(workingDays):
+        wantedIds, unwantedIds = preferences[requestKeys][dayNum]
+        for term, kind, dayIds in (('wantedShifts', SHIFT, wantedIds),
+                ('unwantedShifts', SHIFT, unwantedIds),
+                ('wantedConsultations', CONSULTATION,
+                    preferences[consultationKeys][dayNum][0])):
+            for docId in dayIds:
+                i = docIndexes.get(docId, None)
+                if i is not None:
+                    coefficients[term][kind][i][j] += 1
+    gains = [[[sum(sign * weights[weightKey]
+                    * coefficients[term][kind][i][j]
+                for term, weightKey, sign in scheduler.OBJECTIVE_TERMS)
+            for j in range(len(workingDays))] for i in range(len(docIds))]
+        for kind in KINDS]
+    assignment = Assignment(shiftConfs=shiftConfs, needs=needs, fixed=fixed,
+        gains=gains)
+    construct(assignment)
+    log.debug('The objective of the constructed schedule is %s',
+        assignment.objective)
+
+    timer.startPhase('localSearch')
+    numMoves = improve(assignment, maxRounds)
+    log.info('The local search applied %d moves. The objective is %s',
+        numMoves, assignment.objective)
+
+    violations = assignment.getViolations()
+    if violations:
+        for violation in violations:
+            log.warning('Heuristic schedule not found: %s', violation)
+        return getErrorSchedule('UNKNOWN')
+
+    timer.startPhase('extraction')
+    values = assignment.values
+    generatedSchedule = scheduler.createSchedule(year=year, month=month,
+        daysOfMonth=daysOfMonth, dayConfs=dayConfs, cycleShifts=cycleShifts,
+        docIds=docIds, workingDays=workingDays,
+        shiftValues=values[SHIFT],
+        consultationValues=[row if shiftConf['numConsultations'] > 0
+            else None for row, shiftConf in zip(values[CONSULTATION],
+                shiftConfs)])
+    generatedSchedule['heuristic'] = True
+    timer.stop()
+    if collectStats:
+        objectiveTerms = {}
+        for term, weightKey, sign in scheduler.OBJECTIVE_TERMS:
+            count = sum(coefficient * value
+                for kind in KINDS
+                for coefficientRow, valueRow in zip(
+                    coefficients[term][kind], values[kind])
+                for coefficient, value in zip(coefficientRow, valueRow))
+            objectiveTerms[term] = {'count': count,
+                'weight': weights[weightKey],
+                'contribution': sign * weights[weightKey] * count}
+        generatedSchedule['stats'] = {
+            'phases': timer.toDict(),
+            'status': 'FEASIBLE',
+            'objective': assignment.objective,
+            'bestBound': None,
+            'gap': None,
+            'objectiveTerms': objectiveTerms,
+            'numVariables': 0,
+            'numConstraints': 0,
+            'numSolutions': 0,
+            'numConflicts': 0,
+            'numBranches': 0,
+            'numMoves': numMoves,
+            'heuristic': True
+        }
+    return generatedSchedule
@@ -0,0 +1,212 @@
+'''The jobs module runs the scheduler in the background, so that it can
+be embedded in asyncio applications
+
+A ScheduleJob builds and solves the model in a worker thread. CP-SAT
+releases the GIL while it searches, so the event loop keeps running.
+The job reports each improving schedule found, can be cancelled, and
+can be given a deadline after which the best schedule found so far is
+returned. E.g.
+    job = jobs.ScheduleJob(doctors, shiftConfs, calendarDict,
+        schedulerConf, timeout=60)
+    job.start()
+    async for progress in job.progress():
+        print(progress['objective'], progress['bestBound'],
+            progress['wallTime'])
+    schedule = await job
+
+A thread is used instead of a process because the progress and the
+cancellation need to share state with the search
+
+Author: miggoncan
+'''
+
+import asyncio
+import logging
+import threading
+
+import scheduler
+
+
+class ScheduleJob:
+    '''A schedule generated in a background thread
+
+    The job can be awaited to get the schedule dict returned by
+    scheduler.schedule. If the job is cancelled, awaiting it raises
+    asyncio.CancelledError. If the task awaiting the job is cancelled
+    (e.g. by asyncio.wait_for), the job is cancelled too
+
+    Attributes:
+        bestSchedule: the best schedule found so far, or None
+        lastProgress: the progress dict of the bestSchedule, or None.
+            See the progress method
+    '''
+    def __init__(self, doctors, shiftConfs, calendarDict, schedulerConf, *,
+            timeout=None, executor=None, **scheduleArgs):
+        '''
+        Args:
+            doctors, shiftConfs, calendarDict, schedulerConf: see
+                scheduler.schedule
+
+        Keyword Args:
+            timeout: optional. The seconds after the start of the job in
+                which the search is stopped. The job then returns the
+                best schedule found so far (with the GENERATION_ERROR
+                status if none was found. The heuristicFallback
+                configuration is not used, as the search is stopped with
+                the stopEvent). It includes the time to build the model
+            executor: optional. The concurrent.futures.ThreadPoolExecutor
+                running the job. Defaults to the one of the event loop
+            scheduleArgs: the other keyword arguments of
+                scheduler.schedule (e.g. solverParameters, collectStats
+                or hint), except onSolution and stopEvent, which are set
+                by the job
+        '''
+        for key in ('onSolution', 'stopEvent'):
+            if key in scheduleArgs:
+                log = logging.getLogger('jobs')
+                errorMessage = 'The {} argument is set by the ScheduleJob' \
+                    .format(key)
+                log.error(errorMessage)
+                log.error('Raising ValueError')
+                raise ValueError(errorMessage)
+        self.doctors = doctors
+        self.shiftConfs = shiftConfs
+        self.calendarDict = calendarDict
+        self.schedulerConf = schedulerConf
+        self.timeout = timeout
+        self.executor = executor
+        self.scheduleArgs = scheduleArgs
+        self.log = logging.getLogger('jobs')
+        self.stopEvent = threading.Event()
+        self.cancelled = False
+        self.bestSchedule = None
+        self.lastProgress = None
+        self.loop = None
+        self.future = None
+        self.progressQueue = None
+        self.deadlineHandle = None
+
+    def start(self):
+        '''Start solving in the background. It has to be called from the
+        thread of the event loop (e.g. from a coroutine)
+
+        Returns:
+            self, so that a job can be created and started in one line
+
+        Raises:
+            RuntimeError if the job was already started, or if there is
+            no running event loop
+        '''
+        if self.future is not None:
+            errorMessage = 'The job has already been started'
+            self.log.error(errorMessage)
+            self.log.error('Raising RuntimeError')
+            raise RuntimeError(errorMessage)
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            errorMessage = 'The job has to be started from a running event ' \
+                'loop'
+            self.log.error(errorMessage)
+            self.log.error('Raising RuntimeError')
+            raise RuntimeError(errorMessage)
+        self.progressQueue = asyncio.Queue()
+        self.future = self.loop.run_in_executor(self.executor, self.run)
+        self.future.add_done_callback(self.onDone)
+        if self.timeout is not None:
+            self.deadlineHandle = self.loop.call_later(self.timeout,
+                self.onDeadline)
+        self.log.info('Job started with a timeout of %s seconds',
+            self.timeout)
+        return self
+
+    def run(self):
+        # Runs in the thread of the executor
+        return scheduler.schedule(self.doctors, self.shiftConfs,
+            self.calendarDict, self.schedulerConf,
+            onSolution=self.onSolution, stopEvent=self.stopEvent,
+            **self.scheduleArgs)
+
+    def onSolution(self, schedule, progress):
+        # Runs in the thread of the executor. The events are handled in
+        # the order they are scheduled, so they all arrive before the
+        # result of the job
+        self.loop.call_soon_threadsafe(self.publish, schedule, progress)
+
+    def publish(self, schedule, progress):
+        self.bestSchedule = schedule
+        self.lastProgress = progress
+        self.progressQueue.put_nowait(progress)
+
+    def onDeadline(self):
+        self.log.info('The deadline of the job has been reached. Stopping '
+            'the search')
+        self.stopEvent.set()
+
+    def onDone(self, future):
+        if self.deadlineHandle is not None:
+            self.deadlineHandle.cancel()
+        # Marks the end of the progress
+        self.progressQueue.put_nowait(None)
+
+    async def progress(self):
+        '''Iterate over the progress of the search as it happens
+
+        Each progress is a dict, with the keys:
+            solution: the number of solutions found so far
+            objective: the objective value of this solution
+            bestBound: the best bound of the objective found
+            wallTime: the seconds elapsed since the search started
+        The iteration ends when the job finishes. Each progress is only
+        received by one of the iterations (see the lastProgress
+        attribute for the latest one)
+        '''
+        while True:
+            progress = await self.progressQueue.get()
+            if progress is None:
+                # For any other iteration
+                self.progressQueue.put_nowait(None)
+                return
+            yield progress
+
+    def cancel(self):
+        '''Stop the search. Awaiting the job then raises
+        asyncio.CancelledError
+
+        Returns:
+            False if the job had already finished, and True otherwise
+        '''
+        if self.future is not None and self.future.done():
+            return False
+        self.log.info('Cancelling the job')
+        self.cancelled = True
+        self.stopEvent.set()
+        return True
+
+    def done(self):
+        '''Return whether the job has finished'''
+        return self.future is not None and self.future.done()
+
+    async def result(self):
+        '''Wait for the job to finish, and return the generated
+        schedule. Starts the job if it was not started
+
+        Raises:
+            asyncio.CancelledError if the job was cancelled. Otherwise,
+            any exception raised by scheduler.schedule
+        '''
+        if self.future is None:
+            self.start()
+        try:
+            # Shielded, so that the schedule is kept if this task is
+            # cancelled
+            schedule = await asyncio.shield(self.future)
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+        if self.cancelled:
+            raise asyncio.CancelledError()
+        return schedule
+
+    def __await__(self):
+        return self.result().__await__()
@@ -20,22 +20,118 @@ This program needs 4 positional command line arguments. Them being
         python3.7 src/main.py doctors.json shiftConf.json \
             calendar.json schedule.json
 
-It also takes one optional argument:
+It also takes the optional arguments:
     --configDir=<pathToConfigDir>
         This argument indicates the path to the configuration directory.
         If it is not provided, the DEFAULT_CONFIG_DIR will be used
         E.g. --configDir=/etc/scheduler/
+    --worker
+        Instead of generating one schedule, keep the process running and
+        serve schedule requests read from stdin. When this argument is 
+        given, no positional arguments are needed. The protocol is 
+        described in the worker module
+        E.g. python3.7 src/main.py --worker
+    --stream
+        Instead of generating one schedule, run the jobs read from a 
+        newline-delimited JSON file (one job per line) and write one 
+        result record per job as soon as it finishes. The positional 
+        arguments are the input and output files, which default to stdin
+        and stdout. The records are described in the worker module. The
+        program exits with status 1 if any job could not be run
+        E.g. python3.7 src/main.py --stream jobs.ndjson results.ndjson
+    --validate
+        Instead of generating a schedule, only check the structure and 
+        the consistency of the doctorsFile, shiftConfsFile and 
+        calendarFile (the scheduleFile is not needed). The result is 
+        printed to stdout as a JSON object like:
+            {"valid": false, "issues": [{"level": "error", 
+                "path": "calendar.month", "message": "..."}]}
+        See scheduler.validateInputs. OR-Tools is not loaded, so it 
+        takes milliseconds. The program exits with status 1 if there is
+        any issue of level error
+        E.g. python3.7 src/main.py --validate doctors.json \
+            shiftConf.json calendar.json
+    --heuristic
+        Generate the schedule with the greedy heuristic of the heuristic
+        module instead of the solver. OR-Tools is not loaded, and it 
+        takes milliseconds, but the schedule is usually not optimal. 
+        Meant for previews of the schedule. The stored schedule has the 
+        key 'heuristic' with the value True
+        E.g. python3.7 src/main.py --heuristic doctors.json \
+            shiftConf.json calendar.json schedule.json
+    --progress
+        Store in the scheduleFile each improving schedule found while 
+        the search continues, so that a good schedule can be read before
+        the search finishes. The file is replaced atomically each time.
+        The search can be limited with the maxTimeInSeconds and 
+        relativeGapLimit configurations
+    --stats
+        Add to the stored schedule a 'stats' key with the time taken by 
+        each phase of the generation, the size of the model and the 
+        result of the solver. See scheduler.schedule
+    --hint=<pathToScheduleFile>
+        Use the shifts and consultations of a previous schedule (with 
+        the same format as the scheduleFile) as the starting point of 
+        the search. This speeds up regenerating a schedule after small 
+        changes. E.g. --hint=/tmp/previousSchedule.json
+    --repairHint
+        If the hint is infeasible, make the solver repair it instead of
+        discarding it
+    --confirmed=<pathToScheduleFile> --changeSet=<pathToChangeSetFile>
+        Re-schedule only the region of the confirmed schedule affected 
+        by the changes, keeping the rest of its assignments. The change 
+        set is a JSON file like:
+            {"days": [12], "doctors": [], "radius": 1, "maxRadius": 7}
+        See the incremental argument of scheduler.schedule
+    --cacheDir=<pathToCacheDir>
+        Store the generated schedules in this directory, and return the
+        stored schedule when the same inputs are scheduled again. The 
+        directory can be shared by several processes. Its size is 
+        limited by the cacheMaxEntries and cacheMaxBytes configurations.
+        E.g. --cacheDir=/var/cache/scheduler/
+    --memoryCache
+        Only in worker and stream modes, and without --cacheDir. Keep 
+        the generated schedules in the memory of the worker instead
+    --decompose[=<weeksPerBlock>]
+        Solve each block of weeks of the month as a separate problem in
+        parallel processes, and stitch the schedules together. Meant 
+        for departments too large to be solved as a whole. See the 
+        decomposition argument of scheduler.schedule. E.g. --decompose=2
+    --dumpModel=<pathToDumpDir>
+        Store the built CP-SAT model, the solver parameters and the 
+        meaning of its variables in this directory, so that the solve 
+        can be investigated offline with src/replay.py. See the 
+        modelDumpDir argument of scheduler.schedule. 
+        E.g. --dumpModel=/tmp/slowSchedule/
+    --metricsFile=<pathToPromFile>
+        Add the performance metrics of the generated schedules (solve 
+        and model build times, model sizes, statuses, gaps and cache 
+        hits) to this file in the Prometheus text format, to be read by
+        the textfile collector of node_exporter. The file can be shared
+        by several processes. See the metrics module. 
+        E.g. --metricsFile=/var/lib/node_exporter/scheduler.prom
+    --metricsPort=<port>
+        Only in worker and stream modes. Serve the metrics of the 
+        schedules generated by the process at 
+        http://127.0.0.1:<port>/metrics. E.g. --metricsPort=9464
 
 Author: miggoncan
 '''
+import contextlib
+import functools
 import json
 import sys
 import traceback
 from pathlib import Path
+import atexit
+import queue
 import logging
 import logging.config
+import logging.handlers
 
+import cache as cacheLib
 import scheduler
+import storage
 
 # Resolve will return the absolute path
 # The first parent refest to the src dir
@@ -44,30 +140,132 @@ SCHEDULER_DIR = Path(__file__).resolve().parent.parent
 LOGGING_CONFIG_FILE_NAME = 'logging.json'
 SCHEDULER_CONFIG_FILE_NAME = 'scheduler.json'
 
+# Key of the logging configuration listing the names of the handlers that
+# have to run in a background thread. E.g. "queuedHandlers": ["file"]
+QUEUED_HANDLERS_KEY = 'queuedHandlers'
+
 DEFAULT_CONFIG_DIR = SCHEDULER_DIR / 'config'
 
 # This argument indicates the path to the configuration directory
 # E.g. --configDir=/etc/scheduler/
 CONFIG_DIR_ARG = '--configDir='
 
+# With this argument, the input files are only validated (see 
+# scheduler.validateInputs)
+VALIDATE_ARG = '--validate'
 
-def main():
-    # Check for the CONFIG_DIR_ARG and extract the positional arguments
-    configDir = DEFAULT_CONFIG_DIR
-    positionalArgs = []
-    for arg in sys.argv[1:]:
-        if arg.startswith(CONFIG_DIR_ARG):
-            configDir = Path(arg.replace(CONFIG_DIR_ARG, ''))
-        else:
-            positionalArgs.append(arg)
-    loggingConfigPath = configDir / LOGGING_CONFIG_FILE_NAME
-    schedulerConfigPath = configDir / SCHEDULER_CONFIG_FILE_NAME
+# With this argument, the schedule is generated by the heuristic module
+# instead of the solver
+HEURISTIC_ARG = '--heuristic'
 
-    # First, load the logging configuration
+# With this argument, each improving schedule found while the search
+# continues is stored in the scheduleFile
+PROGRESS_ARG = '--progress'
+
+# With this argument, the stored schedule will contain a 'stats' key 
+# with performance information (see scheduler.schedule)
+STATS_ARG = '--stats'
+
+# This argument indicates the path to a previous schedule, used as the
+# starting point of the search. E.g. --hint=/tmp/previousSchedule.json
+HINT_ARG = '--hint='
+
+# With this argument, an infeasible hint will be repaired by the solver
+REPAIR_HINT_ARG = '--repairHint'
+
+# These arguments re-schedule only the region of a confirmed schedule
+# affected by a change set (see the incremental argument of 
+# scheduler.schedule). E.g. 
+#   --confirmed=/tmp/confirmedSchedule.json --changeSet=/tmp/changes.json
+CONFIRMED_ARG = '--confirmed='
+CHANGE_SET_ARG = '--changeSet='
+
+# This argument indicates the directory in which the generated schedules
+# are cached. E.g. --cacheDir=/var/cache/scheduler/
+CACHE_DIR_ARG = '--cacheDir='
+
+# With this argument, the worker caches the generated schedules in memory
+MEMORY_CACHE_ARG = '--memoryCache'
+
+# With this argument, the month is solved by blocks of weeks (see the 
+# decomposition argument of scheduler.schedule). The number of weeks of 
+# each block can be given as --decompose=2
+DECOMPOSE_ARG = '--decompose'
+
+# This argument indicates the directory in which the built model is 
+# dumped. E.g. --dumpModel=/tmp/slowSchedule/
+DUMP_MODEL_ARG = '--dumpModel='
+
+# These arguments export the metrics of the generated schedules to a 
+# file read by node_exporter, or from a local HTTP endpoint (see the 
+# metrics module). E.g. --metricsFile=/tmp/scheduler.prom 
+# --metricsPort=9464
+METRICS_FILE_ARG = '--metricsFile='
+METRICS_PORT_ARG = '--metricsPort='
+
+# This argument starts the scheduler as a long-running worker that 
+# reads schedule requests from stdin (see the worker module)
+WORKER_ARG = '--worker'
+
+# With this argument, the jobs of a newline-delimited JSON stream are run
+# one after the other (see worker.streamJobs)
+STREAM_ARG = '--stream'
+
+
+def startQueuedHandlers(handlerNames):
+    '''Move the given handlers to a background thread
+
+    Each of the handlers is replaced, in all the loggers using it, by a 
+    QueueHandler. The records put in the queue are handled by a 
+    QueueListener running in its own thread, so that the I/O of the 
+    handler (e.g. writing to a file) never blocks the logging thread. 
+    The listeners are stopped (flushing the queued records) at exit
+
+    Args:
+        handlerNames: an iterable of the names of handlers configured 
+            with logging.config.dictConfig
+    '''
+    loggers = [logging.getLogger()] + [logger 
+        for logger in logging.Logger.manager.loggerDict.values() 
+        if isinstance(logger, logging.Logger)]
+    queueHandlers = {}
+    for logger in loggers:
+        for i, handler in enumerate(logger.handlers):
+            if handler.name not in handlerNames:
+                continue
+            if handler.name not in queueHandlers:
+                recordQueue = queue.Queue()
+                listener = logging.handlers.QueueListener(recordQueue, 
+                    handler, respect_handler_level=True)
+                listener.start()
+                atexit.register(listener.stop)
+                queueHandlers[handler.name] = \
+                    logging.handlers.QueueHandler(recordQueue)
+            logger.handlers[i] = queueHandlers[handler.name]
+
+
+def loadLoggingConfiguration(configDir, *, queued=True):
+    '''Configure the logging module using the logging.json file found in
+    the given configuration directory
+
+    The filename of the file handler is made relative to the 
+    SCHEDULER_DIR (only if the path is not absolute). The handlers 
+    listed in the QUEUED_HANDLERS_KEY are moved to a background thread 
+    (see startQueuedHandlers)
+
+    Args:
+        configDir: a Path to the configuration directory
+
+    Keyword Args:
+        queued: optional. If False, all the handlers are kept in the 
+            logging thread. Needed in processes that do not run the 
+            atexit handlers (e.g. the ones of a ProcessPoolExecutor), as
+            the records still queued when they exit would be lost. 
+            Defaults to True
+    '''
+    loggingConfigPath = configDir / LOGGING_CONFIG_FILE_NAME
     with loggingConfigPath.open() as loggingConfFile:
         loggingConf = json.loads(loggingConfFile.read())
-    # Change the filename of the file handler to be relative to the
-    # scheduler dir (only if the path is not absolute)
     handlers = loggingConf.get('handlers', None)
     if handlers:
         file = handlers.get('file', None)
@@ -75,11 +273,209 @@ def main():
             filename = file.get('filename', None)
             if filename and not filename.startswith('/'):
                 file['filename'] = SCHEDULER_DIR / filename
+    queuedHandlers = loggingConf.pop(QUEUED_HANDLERS_KEY, [])
     logging.config.dictConfig(loggingConf)
+    if queued and queuedHandlers:
+        startQueuedHandlers(queuedHandlers)
+
+
+def loadSchedulerConfiguration(configDir):
+    '''Read the scheduler.json file found in the given configuration 
+    directory
+
+    Args:
+        configDir: a Path to the configuration directory
+
+    Returns:
+        The scheduler configuration dict. See the documentation of the
+        scheduler.getConfiguration function
+    '''
+    schedulerConfigPath = configDir / SCHEDULER_CONFIG_FILE_NAME
+    with schedulerConfigPath.open() as schedulerConfFile:
+        return json.loads(schedulerConfFile.read())
+
+
+def createCache(schedulerConf, *, cacheDir=None, memoryCache=False):
+    '''Create the cache of schedules requested in the command line
+
+    Args:
+        schedulerConf: the scheduler configuration dict. Its 
+            cacheMaxEntries and cacheMaxBytes configurations are used
+
+    Keyword Args:
+        cacheDir: optional. The directory of a cache.DiskScheduleCache
+        memoryCache: optional. If True and no cacheDir is given, a
+            cache.MemoryScheduleCache is created
+
+    Returns:
+        The cache, or None if no cache was requested
+    '''
+    maxEntries = scheduler.getConfiguration(schedulerConf, 
+        'cacheMaxEntries', cacheLib.DEFAULT_MAX_ENTRIES)
+    if cacheDir:
+        maxBytes = scheduler.getConfiguration(schedulerConf, 
+            'cacheMaxBytes', cacheLib.DEFAULT_MAX_BYTES)
+        return cacheLib.DiskScheduleCache(cacheDir, maxEntries=maxEntries,
+            maxBytes=maxBytes)
+    if memoryCache:
+        return cacheLib.MemoryScheduleCache(maxEntries)
+    return None
+
+
+def validateFiles(doctorsFilePath, shiftConfsFilePath, calendarFilePath):
+    '''Validate the input files of the scheduler
+
+    Returns:
+        A dict with the keys 'valid' (a bool) and 'issues'. A file that
+        cannot be read is an issue of level 'error' whose path is the 
+        name of its argument. See scheduler.validateInputs for the rest
+    '''
+    inputs = {}
+    issues = []
+    for name, filePath in (('doctors', doctorsFilePath), 
+            ('shiftConfs', shiftConfsFilePath), 
+            ('calendar', calendarFilePath)):
+        try:
+            inputs[name] = storage.readJsonFile(filePath)
+        except (OSError, ValueError) as e:
+            issues.append({'level': 'error', 'path': name, 
+                'message': 'Could not read {}: {}'.format(filePath, e)})
+    if not issues:
+        issues = scheduler.validateInputs(inputs['doctors'], 
+            inputs['shiftConfs'], inputs['calendar'])
+    return {'valid': all(issue['level'] != 'error' for issue in issues), 
+        'issues': issues}
+
+
+def main():
+    # Check for the CONFIG_DIR_ARG and extract the positional arguments
+    configDir = DEFAULT_CONFIG_DIR
+    workerMode = False
+    streamMode = False
+    validateMode = False
+    heuristicMode = False
+    writeProgress = False
+    collectStats = False
+    hintFilePath = None
+    repairHint = False
+    confirmedFilePath = None
+    changeSetFilePath = None
+    cacheDir = None
+    memoryCache = False
+    decomposition = None
+    modelDumpDir = None
+    metricsFilePath = None
+    metricsPort = None
+    positionalArgs = []
+    for arg in sys.argv[1:]:
+        if arg.startswith(CONFIG_DIR_ARG):
+            configDir = Path(arg.replace(CONFIG_DIR_ARG, ''))
+        elif arg == WORKER_ARG:
+            workerMode = True
+        elif arg == STREAM_ARG:
+            streamMode = True
+        elif arg == VALIDATE_ARG:
+            validateMode = True
+        elif arg == HEURISTIC_ARG:
+            heuristicMode = True
+        elif arg == PROGRESS_ARG:
+            writeProgress = True
+        elif arg == STATS_ARG:
+            collectStats = True
+        elif arg.startswith(HINT_ARG):
+            hintFilePath = arg.replace(HINT_ARG, '')
+        elif arg == REPAIR_HINT_ARG:
+            repairHint = True
+        elif arg.startswith(CONFIRMED_ARG):
+            confirmedFilePath = arg.replace(CONFIRMED_ARG, '')
+        elif arg.startswith(CHANGE_SET_ARG):
+            changeSetFilePath = arg.replace(CHANGE_SET_ARG, '')
+        elif arg.startswith(CACHE_DIR_ARG):
+            cacheDir = arg.replace(CACHE_DIR_ARG, '')
+        elif arg == MEMORY_CACHE_ARG:
+            memoryCache = True
+        elif arg == DECOMPOSE_ARG:
+            decomposition = {}
+        elif arg.startswith(DECOMPOSE_ARG + '='):
+            decomposition = {'weeksPerBlock': 
+                int(arg.replace(DECOMPOSE_ARG + '=', ''))}
+        elif arg.startswith(DUMP_MODEL_ARG):
+            modelDumpDir = arg.replace(DUMP_MODEL_ARG, '')
+        elif arg.startswith(METRICS_FILE_ARG):
+            metricsFilePath = arg.replace(METRICS_FILE_ARG, '')
+        elif arg.startswith(METRICS_PORT_ARG):
+            metricsPort = int(arg.replace(METRICS_PORT_ARG, ''))
+        else:
+            positionalArgs.append(arg)
+
+    # First, load the logging configuration
+    loadLoggingConfiguration(configDir)
 
     log = logging.getLogger('main')
     log.info('Starting main program')
 
+    metrics = None
+    if metricsFilePath or metricsPort is not None:
+        # The metrics module is only needed when they are exported
+        import metrics as metricsLib
+        metrics = metricsLib.ScheduleMetrics(textfilePath=metricsFilePath)
+        if metricsPort is not None:
+            if workerMode or streamMode:
+                metrics.serve(metricsPort)
+            else:
+                log.warning(f'{METRICS_PORT_ARG} is only used in worker and '
+                    + 'stream modes')
+
+    if workerMode:
+        # The worker module is only needed in this mode
+        import worker
+        log.info('Starting the scheduler in worker mode')
+        cache = createCache(loadSchedulerConfiguration(configDir), 
+            cacheDir=cacheDir, memoryCache=memoryCache)
+        worker.serve(sys.stdin, sys.stdout, 
+            functools.partial(loadSchedulerConfiguration, configDir),
+            cache=cache, metrics=metrics)
+        log.info('Finishing the main program')
+        return
+
+    if streamMode:
+        # The worker module is only needed in this mode
+        import worker
+        if len(positionalArgs) > 2:
+            log.error(f'Usage: {sys.argv[0]} {STREAM_ARG} [jobsFile] '
+                + '[resultsFile]')
+            sys.exit(1)
+        log.info('Starting the scheduler in stream mode')
+        cache = createCache(loadSchedulerConfiguration(configDir), 
+            cacheDir=cacheDir, memoryCache=memoryCache)
+        with contextlib.ExitStack() as stack:
+            inStream = sys.stdin
+            outStream = sys.stdout
+            if len(positionalArgs) > 0:
+                inStream = stack.enter_context(open(positionalArgs[0]))
+            if len(positionalArgs) > 1:
+                outStream = stack.enter_context(open(positionalArgs[1], 'w'))
+            _, numFailed = worker.streamJobs(inStream, outStream, 
+                functools.partial(loadSchedulerConfiguration, configDir),
+                cache=cache, metrics=metrics)
+        log.info('Finishing the main program')
+        if numFailed > 0:
+            sys.exit(1)
+        return
+
+    if validateMode:
+        if len(positionalArgs) not in (3, 4):
+            log.error(f'Usage: {sys.argv[0]} {VALIDATE_ARG} doctorsFile '
+                + 'shiftConfFile calendarFile')
+            sys.exit(1)
+        log.info('Validating the input files')
+        result = validateFiles(*positionalArgs[:3])
+        print(json.dumps(result, indent=2))
+        log.info('Finishing the main program')
+        if not result['valid']:
+            sys.exit(1)
+        return
+
     # Extract the needed arguments
     if len(positionalArgs) != 4:
         # To know the format of these files, see the scheduler.schedule
@@ -100,37 +496,73 @@ def main():
     scheduleFilePath = positionalArgs[3]
 
     # Read the scheduler configuration
-    with schedulerConfigPath.open() as schedulerConfFile:
-        schedulerConf = json.loads(schedulerConfFile.read())
+    schedulerConf = loadSchedulerConfiguration(configDir)
 
     # First, read the data from the files
     with open(doctorsFilePath) as doctorsFile:
-        log.debug('Reading the doctors file: {}'.format(doctorsFilePath))
+        log.debug('Reading the doctors file: %s', doctorsFilePath)
         doctors = json.loads(doctorsFile.read())
-        log.debug('The doctors dict is: {}'.format(doctors))
+        log.debug('The doctors dict is: %s', doctors)
     with open(shiftConfsFilePath) as shiftConfsFile:
-        log.debug('Reading the shiftConfs file: {}'.format(shiftConfsFilePath))
+        log.debug('Reading the shiftConfs file: %s', shiftConfsFilePath)
         shiftConfs = json.loads(shiftConfsFile.read())
-        log.debug('The shiftConfs dict is: {}'.format(shiftConfs))
+        log.debug('The shiftConfs dict is: %s', shiftConfs)
     with open(calendarFilePath) as calendarFile:
-        log.debug('Reading the calendar file: {}'.format(calendarFilePath))
+        log.debug('Reading the calendar file: %s', calendarFilePath)
         calendarDict = json.loads(calendarFile.read())
-        log.debug('The calendar dict is: {}'.format(calendarDict))
+        log.debug('The calendar dict is: %s', calendarDict)
+    hint = None
+    if hintFilePath:
+        log.debug('Reading the hint file: %s', hintFilePath)
+        hint = storage.readJsonFile(hintFilePath)
+    incremental = None
+    if confirmedFilePath or changeSetFilePath:
+        if not (confirmedFilePath and changeSetFilePath):
+            log.error(f'Both {CONFIRMED_ARG} and {CHANGE_SET_ARG} are needed '
+                + 'to re-schedule incrementally')
+            sys.exit(1)
+        log.debug('Reading the change set file: %s', changeSetFilePath)
+        incremental = storage.readJsonFile(changeSetFilePath)
+        incremental['schedule'] = storage.readJsonFile(confirmedFilePath)
+
+    onSolution = None
+    if writeProgress:
+        def onSolution(schedule, progress):
+            log.debug('Storing the intermediate schedule %d at: %s', 
+                progress['solution'], scheduleFilePath)
+            storage.writeJsonFile(scheduleFilePath, schedule)
 
     log.info('Generating the schedule')
     try:
-        schedule = scheduler.schedule(doctors, shiftConfs, calendarDict, 
-            schedulerConf)
+        if heuristicMode:
+            # The heuristic module is only needed in this mode
+            import heuristic
+            schedule = heuristic.schedule(doctors, shiftConfs, calendarDict,
+                schedulerConf, collectStats=collectStats or metrics is not None)
+        else:
+            # The metrics are taken from the stats
+            schedule = scheduler.schedule(doctors, shiftConfs, 
+                calendarDict, schedulerConf, onSolution=onSolution, 
+                collectStats=collectStats or metrics is not None, 
+                hint=hint, repairHint=repairHint, incremental=incremental,
+                cache=createCache(schedulerConf, cacheDir=cacheDir),
+                decomposition=decomposition, modelDumpDir=modelDumpDir)
     except Exception as e:
-        log.error('An unexpected exception occurred: {}'.format(traceback.format_exc()))
+        log.error('An unexpected exception occurred: %s', 
+            traceback.format_exc())
         raise e
     
-    log.debug('The generated schedule is: {}'.format(schedule))
+    log.debug('The generated schedule is: %s', schedule)
+
+    if metrics is not None:
+        metrics.observeSchedule(schedule, len(shiftConfs))
+        metrics.writeTextfile()
+        if not collectStats:
+            schedule.pop('stats', None)
 
-    log.debug('Attemting to store the resulting schedule at: {}'
-        .format(scheduleFilePath))
-    with open(scheduleFilePath, mode='w') as scheduleFile:
-        scheduleFile.write(json.dumps(schedule))
+    log.debug('Attemting to store the resulting schedule at: %s', 
+        scheduleFilePath)
+    storage.writeJsonFile(scheduleFilePath, schedule)
 
     log.info('Finishing the main program')
 
@@ -0,0 +1,329 @@
+'''The metrics module aggregates the performance of the generated
+schedules, and exports it in the Prometheus text format
+
+The metrics of each schedule are taken from its stats (see the
+collectStats argument of scheduler.schedule), and they are labeled by
+the size class of the department (see getSizeClass):
+    scheduler_jobs_total: a counter of the schedules solved, also
+        labeled by the status of the solver. A search stopped by its
+        time limit without a solution has the status TIMEOUT
+    scheduler_solve_duration_seconds: a histogram of the time spent
+        solving the model
+    scheduler_model_build_duration_seconds: a histogram of the time
+        spent building the model, from the validation of the inputs to
+        the objective (see MODEL_BUILD_PHASES)
+    scheduler_model_variables, scheduler_model_constraints: histograms
+        of the size of the model
+    scheduler_objective_gap: a histogram of the relative gap between
+        the objective and its best bound when the search finished
+    scheduler_cache_requests_total: a counter of the requests to the
+        cache, also labeled by their result (hit or miss). Schedules
+        taken from the cache only count here
+
+The metrics can be exported in two ways:
+    - To a file read by the textfile collector of node_exporter (see
+      ScheduleMetrics.writeTextfile). Several processes can share the
+      same file: each of them adds its observations to the ones already
+      in the file, so the counters keep growing across runs
+    - From an HTTP endpoint, for long-running processes (see
+      ScheduleMetrics.serve). E.g. http://127.0.0.1:9464/metrics
+
+Author: miggoncan
+'''
+
+import fcntl
+import http.server
+import logging
+import math
+import re
+import threading
+
+import storage
+
+# The size classes of the departments, as (maxDoctors, name). Larger
+# departments are in the LARGEST_SIZE_CLASS
+SIZE_CLASSES = ((20, 'small'), (60, 'medium'), (150, 'large'))
+LARGEST_SIZE_CLASS = 'xlarge'
+
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600)
+MODEL_SIZE_BUCKETS = (100, 300, 1000, 3000, 10000, 30000, 100000)
+GAP_BUCKETS = (0, 0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1)
+
+# The metric families, as name: (type, help, buckets). The buckets are
+# None for the counters
+METRICS = {
+    'scheduler_jobs_total': ('counter',
+        'Schedules solved, by the status of the solver', None),
+    'scheduler_solve_duration_seconds': ('histogram',
+        'Seconds spent solving the model', DURATION_BUCKETS),
+    'scheduler_model_build_duration_seconds': ('histogram',
+        'Seconds spent building the model', DURATION_BUCKETS),
+    'scheduler_model_variables': ('histogram',
+        'Variables of the model', MODEL_SIZE_BUCKETS),
+    'scheduler_model_constraints': ('histogram',
+        'Constraints of the model', MODEL_SIZE_BUCKETS),
+    'scheduler_objective_gap': ('histogram',
+        'Relative gap of the objective when the search finished',
+        GAP_BUCKETS),
+    'scheduler_cache_requests_total': ('counter',
+        'Requests to the schedule cache, by their result', None)
+}
+
+# The phases of the stats (see scheduler.schedule and
+# scheduler.scheduleDecomposed) measured by each duration. The model is
+# built by all the phases recorded before the search, except the ones
+# that solve or store something else (repairHint, heuristic and dump)
+SOLVE_PHASES = ('solve', 'blocks', 'repair')
+MODEL_BUILD_PHASES = ('validation', 'preferences', 'cycleShifts',
+    'precheck', 'symmetry', 'variables', 'constraints', 'objective',
+    'incremental', 'decomposition')
+
+# The statuses of the solver renamed in the metrics
+STATUS_NAMES = {'UNKNOWN': 'TIMEOUT'}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_ADDRESS = '127.0.0.1'
+METRICS_PATH = '/metrics'
+
+# A sample of the text format. E.g. name{label="value",le="0.5"} 3.0
+SAMPLE_PATTERN = re.compile(r'^(\w+)(?:\{(.*)\})?\s+(\S+)\s*$')
+LABEL_PATTERN = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def getSizeClass(numDoctors):
+    '''Return the name of the size class of a department with the given
+    number of doctors. See SIZE_CLASSES'''
+    for maxDoctors, name in SIZE_CLASSES:
+        if numDoctors <= maxDoctors:
+            return name
+    return LARGEST_SIZE_CLASS
+
+
+def formatValue(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def getFamily(sampleName):
+    '''Return the name of the metric family of a sample, or None if it
+    is not one of the METRICS'''
+    if sampleName in METRICS:
+        return sampleName
+    for suffix in ('_bucket', '_sum', '_count'):
+        if sampleName.endswith(suffix) \
+                and sampleName[:-len(suffix)] in METRICS:
+            return sampleName[:-len(suffix)]
+    return None
+
+
+def getSampleSortKey(sample):
+    '''Return the key used to sort the samples of a family, so that the
+    samples of each series are together, with the buckets in order'''
+    sampleName, labels, _ = sample
+    seriesLabels = tuple(label for label in labels if label[0] != 'le')
+    bounds = [float(value) for name, value in labels if name == 'le']
+    suffixOrder = [sampleName.endswith(suffix)
+        for suffix in ('_bucket', '_sum', '_count')] + [True]
+    return (seriesLabels, suffixOrder.index(True), bounds)
+
+
+def parseSamples(text):
+    '''Parse the samples of the METRICS written in the text format
+
+    Returns:
+        A dict as the samples of ScheduleMetrics
+    '''
+    samples = {}
+    for line in text.splitlines():
+        match = SAMPLE_PATTERN.match(line)
+        if line.startswith('#') or match is None:
+            continue
+        sampleName, labelText, value = match.groups()
+        family = getFamily(sampleName)
+        if family is None:
+            continue
+        labels = tuple(LABEL_PATTERN.findall(labelText or ''))
+        key = (family, sampleName, labels)
+        samples[key] = samples.get(key, 0) + float(value)
+    return samples
+
+
+class ScheduleMetrics:
+    '''The metrics of the schedules generated by a process
+
+    All the samples are sums (the counters, and the buckets, sums and
+    counts of the histograms), so the samples of several processes can
+    be added together. It can be used from several threads
+
+    Attributes:
+        textfilePath: the path of the file written by writeTextfile, or
+            None
+    '''
+    def __init__(self, *, textfilePath=None):
+        '''
+        Keyword Args:
+            textfilePath: optional. The path of the file in which the
+                metrics are stored (see writeTextfile). It should have
+                the .prom extension to be read by node_exporter
+        '''
+        self.log = logging.getLogger('metrics')
+        self.textfilePath = textfilePath
+        self.lock = threading.Lock()
+        # Dicts as {(family, sampleName, labels): value}, where labels is
+        # a tuple of (name, value) pairs. The pending samples are the
+        # ones not yet added to the textfile
+        self.samples = {}
+        self.pendingSamples = {}
+
+    def add(self, family, sampleName, labels, value):
+        # Must be called with the lock held
+        key = (family, sampleName, tuple(labels))
+        self.samples[key] = self.samples.get(key, 0) + value
+        if self.textfilePath is not None:
+            self.pendingSamples[key] = self.pendingSamples.get(key, 0) \
+                + value
+
+    def increment(self, family, labels):
+        # Must be called with the lock held
+        self.add(family, family, labels, 1)
+
+    def observe(self, family, labels, value):
+        # Must be called with the lock held. The buckets are cumulative,
+        # and all of them are written, even if they are 0
+        for bound in METRICS[family][2] + (math.inf,):
+            self.add(family, family + '_bucket',
+                labels + [('le', formatValue(bound))],
+                1 if value <= bound else 0)
+        self.add(family, family + '_sum', labels, value)
+        self.add(family, family + '_count', labels, 1)
+
+    def observeSchedule(self, schedule, numDoctors):
+        '''Add the metrics of a generated schedule
+
+        Args:
+            schedule: the schedule dict returned by scheduler.schedule,
+                with its 'stats'. Schedules without stats are ignored
+            numDoctors: the number of doctors of the department
+        '''
+        stats = schedule.get('stats', None)
+        if stats is None:
+            self.log.warning('The schedule has no stats. Ignoring it')
+            return
+        labels = [('size_class', getSizeClass(numDoctors))]
+        phases = stats.get('phases', {})
+        with self.lock:
+            if 'cacheHit' in stats:
+                self.increment('scheduler_cache_requests_total', labels
+                    + [('result', 'hit' if stats['cacheHit'] else 'miss')])
+                if stats['cacheHit']:
+                    return
+            status = STATUS_NAMES.get(stats['status'], stats['status'])
+            self.increment('scheduler_jobs_total',
+                labels + [('status', status)])
+            for family, phaseNames in (
+                    ('scheduler_solve_duration_seconds', SOLVE_PHASES),
+                    ('scheduler_model_build_duration_seconds',
+                        MODEL_BUILD_PHASES)):
+                if any(name in phases for name in phaseNames):
+                    self.observe(family, labels, sum(phases[name]['wallTime']
+                        for name in phaseNames if name in phases))
+            # Only the models actually built are measured
+            if stats.get('numVariables', 0) > 0:
+                self.observe('scheduler_model_variables', labels,
+                    stats['numVariables'])
+                self.observe('scheduler_model_constraints', labels,
+                    stats['numConstraints'])
+            if stats.get('gap', None) is not None:
+                self.observe('scheduler_objective_gap', labels, stats['gap'])
+
+    def render(self, samples=None):
+        '''Return the samples (by default, the ones of this process) in
+        the Prometheus text format'''
+        if samples is None:
+            with self.lock:
+                samples = dict(self.samples)
+        lines = []
+        for family, (metricType, helpText, _) in METRICS.items():
+            familySamples = sorted(((sampleName, labels, value)
+                for (sampleFamily, sampleName, labels), value
+                in samples.items() if sampleFamily == family),
+                key=getSampleSortKey)
+            if not familySamples:
+                continue
+            lines.append('# HELP {} {}'.format(family, helpText))
+            lines.append('# TYPE {} {}'.format(family, metricType))
+            for sampleName, labels, value in familySamples:
+                labelText = ','.join('{}="{}"'.format(name, labelValue)
+                    for name, labelValue in labels)
+                lines.append('{}{} {}'.format(sampleName,
+                    '{' + labelText + '}' if labelText else '',
+                    formatValue(value)))
+        return ''.join(line + '\n' for line in lines)
+
+    def writeTextfile(self):
+        '''Add the samples observed since the last call to the ones
+        stored in the textfilePath, if any
+
+        The file is protected with a lock file (the textfilePath with
+        the .lock suffix), and it is replaced atomically, so it can be
+        shared by several processes and read by node_exporter at any
+        time
+        '''
+        if self.textfilePath is None:
+            return
+        with self.lock:
+            pendingSamples = self.pendingSamples
+            self.pendingSamples = {}
+        with open(str(self.textfilePath) + '.lock', mode='a') as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            try:
+                with open(self.textfilePath) as textfile:
+                    samples = parseSamples(textfile.read())
+            except OSError:
+                samples = {}
+            for key, value in pendingSamples.items():
+                samples[key] = samples.get(key, 0) + value
+            storage.writeTextFile(self.textfilePath, self.render(samples))
+        self.log.debug('Metrics stored at %s', self.textfilePath)
+
+    def serve(self, port, address=DEFAULT_ADDRESS):
+        '''Serve the metrics of this process over HTTP from a background
+        thread, at the METRICS_PATH
+
+        Args:
+            port: the TCP port. 0 to choose a free one
+            address: optional. The address to listen on. Defaults to the
+                DEFAULT_ADDRESS (only local connections)
+
+        Returns:
+            The http.server.ThreadingHTTPServer. Its shutdown method
+            stops it, and its server_address has the port used
+        '''
+        metrics = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != METRICS_PATH:
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                metrics.log.debug('%s: %s', self.address_string(),
+                    format % args)
+
+        server = http.server.ThreadingHTTPServer((address, port),
+            MetricsHandler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever,
+            name='metrics', daemon=True)
+        thread.start()
+        self.log.info('Serving the metrics at http://%s:%d%s',
+            *server.server_address[:2], METRICS_PATH)
+        return server
@@ -0,0 +1,209 @@
+#!/usr/bin/python3.7
+'''The replay module solves again a model dumped by the scheduler (see
+the --dumpModel argument of the main module), so that slow schedules
+can be investigated offline without their input data
+
+Each parameter set given is merged over the solver parameters stored in
+the dump, and the model is solved with it the given number of times.
+The timings and the result of each run are printed as JSON, together
+with the ones of the original solve:
+    python3.7 src/replay.py /tmp/slowSchedule/ --repetitions 3 \
+        --parameters '{}' '{"num_search_workers": 1}' \
+        '{"cp_model_presolve": false}'
+
+Author: miggoncan
+'''
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+from pathlib import Path
+
+import scheduler
+import stats as statsLib
+import storage
+
+
+def loadModelDump(directory):
+    '''Load a model stored by scheduler.dumpModel
+
+    Args:
+        directory: the path of the directory of the dump
+
+    Returns:
+        A tuple as (model, info), with the cp_model.CpModel and the info
+        dict stored with it (see the modelDumpDir argument of
+        scheduler.schedule)
+    '''
+    cp_model = scheduler.importSolver()
+    from ortools.sat import cp_model_pb2
+    directory = Path(directory)
+    modelProto = cp_model_pb2.CpModelProto()
+    with (directory / scheduler.MODEL_DUMP_PROTO_FILE_NAME).open('rb') \
+            as protoFile:
+        modelProto.ParseFromString(protoFile.read())
+    model = cp_model.CpModel()
+    if hasattr(model.Proto(), 'CopyFrom'):
+        model.Proto().CopyFrom(modelProto)
+    else:
+        # Newer versions of OR-Tools do not use protobuf for the model
+        from google.protobuf import text_format
+        model.Proto().parse_text_format(
+            text_format.MessageToString(modelProto))
+    info = storage.readJsonFile(
+        directory / scheduler.MODEL_DUMP_INFO_FILE_NAME)
+    return model, info
+
+
+def solveModel(model, parameters, *, trackSolutions=False):
+    '''Solve a model, measuring the time it takes
+
+    Args:
+        model: a cp_model.CpModel
+        parameters: a dict of CP-SAT parameters (see
+            scheduler.setSolverParameters)
+
+    Keyword Args:
+        trackSolutions: optional. If True, the returned dict also has
+            the key 'solutions', with a list of [wallTime, objective]
+            for each improving solution found. Defaults to False
+
+    Returns:
+        A dict like:
+            {
+                'status': 'OPTIMAL',
+                'objective': 54.0,
+                'bestBound': 54.0,
+                'gap': 0.0,
+                'wallTime': 1.2,
+                'userTime': 4.5,
+                'numConflicts': 120,
+                'numBranches': 3400
+            }
+        Where the objective, bestBound and gap are None if no solution
+        was found
+    '''
+    cp_model = scheduler.importSolver()
+    solver = cp_model.CpSolver()
+    scheduler.setSolverParameters(solver.parameters, parameters)
+    solutions = []
+    class SolutionTracker(cp_model.CpSolverSolutionCallback):
+        def OnSolutionCallback(self):
+            solutions.append([self.WallTime(), self.ObjectiveValue()])
+    start = time.perf_counter()
+    if trackSolutions:
+        status = solver.Solve(model, SolutionTracker())
+    else:
+        status = solver.Solve(model)
+    wallTime = time.perf_counter() - start
+    objective = bestBound = gap = None
+    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+        objective = solver.ObjectiveValue()
+        bestBound = solver.BestObjectiveBound()
+        gap = statsLib.getRelativeGap(objective, bestBound)
+    result = {
+        'status': solver.StatusName(status),
+        'objective': objective,
+        'bestBound': bestBound,
+        'gap': gap,
+        'wallTime': wallTime,
+        'userTime': solver.UserTime(),
+        'numConflicts': solver.NumConflicts(),
+        'numBranches': solver.NumBranches()
+    }
+    if trackSolutions:
+        result['solutions'] = solutions
+    return result
+
+
+def replay(directory, parameterSets=({},), *, repetitions=1):
+    '''Solve a dumped model with each of the given parameter sets
+
+    Args:
+        directory: the path of the directory of the dump
+        parameterSets: an iterable of dicts of CP-SAT parameters. Each
+            of them is merged over the solver parameters of the dump
+
+    Keyword Args:
+        repetitions: the number of times the model is solved with each
+            parameter set
+
+    Returns:
+        A dict like:
+            {
+                'model': {'year': 2020, 'month': 6, 'numVariables': 3600,
+                          'numConstraints': 3900},
+                'original': {...},
+                'runs': [
+                    {
+                        'parameters': {'num_search_workers': 8, ...},
+                        'wallTime': 1.2,
+                        'results': [{...}, ...]
+                    },
+                    ...
+                ]
+            }
+        Where the original is the result of the solve stored in the dump
+        (None if it did not finish), the wallTime of each run is the
+        median of its repetitions, and its results are the ones returned
+        by solveModel
+    '''
+    log = logging.getLogger('replay')
+    model, info = loadModelDump(directory)
+    modelProto = model.Proto()
+    runs = []
+    for parameterSet in parameterSets:
+        parameters = dict(info['solverParameters'], **parameterSet)
+        results = []
+        for repetition in range(repetitions):
+            result = solveModel(model, parameters)
+            log.info('%s (repetition %d): %s', parameterSet, repetition,
+                result)
+            results.append(result)
+        runs.append({
+            'parameters': parameters,
+            'wallTime': statistics.median(result['wallTime']
+                for result in results),
+            'results': results
+        })
+    return {
+        'model': {
+            'year': info['year'],
+            'month': info['month'],
+            'numVariables': len(modelProto.variables),
+            'numConstraints': len(modelProto.constraints)
+        },
+        'original': info['solve'],
+        'runs': runs
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Solve again a model dumped by the scheduler')
+    parser.add_argument('dumpDir', type=Path,
+        help='directory given to the --dumpModel argument of the scheduler')
+    parser.add_argument('--parameters', type=json.loads, nargs='+',
+        default=[{}], help='JSON dicts of CP-SAT parameters, merged over '
+            'the ones of the dump. E.g. \'{"num_search_workers": 1}\'')
+    parser.add_argument('--repetitions', type=int, default=1)
+    parser.add_argument('--save', type=Path, default=None,
+        help='store the results in this file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING'))
+    # The progress of the replay is always shown
+    logging.getLogger('replay').setLevel(logging.INFO)
+
+    results = replay(args.dumpDir, args.parameters,
+        repetitions=args.repetitions)
+    print(json.dumps(results, indent=2))
+    if args.save:
+        storage.writeJsonFile(args.save, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,17 +4,27 @@ scheduling problem
 Author: miggoncan2
 '''
 
-import sys
+import os
+import concurrent.futures
+import copy
+import math
 import logging
 import logging.config
 import calendar as calendarLib
 import datetime
+import threading
+import time
+from pathlib import Path
 
-try:
-    from ortools.sat.python import cp_model
-except ImportError:
-    print('ERROR: Could not find module ortools. Try \'pip install ortools\'')
-    sys.exit(1)
+import stats as statsLib
+import cache as cacheLib
+import storage
+
+# The CP-SAT module of OR-Tools. It takes a noticeable time to import, so
+# it is only imported when a model has to be solved (see importSolver)
+cp_model = None
+# The class of the solution callbacks (see getScheduleSolutionCallbackClass)
+_scheduleSolutionCallbackClass = None
 
 
 # This dict will be used to convert from a day str to its int 
@@ -49,6 +59,188 @@ DEFAULT_WANTED_CONSULTATION_WEIGHT = 3
 DEFAULT_ALL_SHIFT_WEIGHT = 1
 DEFAULT_CONSULTATION_WEIGHT = 1
 
+# The terms of the objective function, as (term, weightKey, sign). Each 
+# term counts some assignments of the schedule, and it is multiplied by
+# the weight of the configuration (or weight set) with that key:
+#   shifts: all the shifts, so that no more shifts than needed are given
+#   consultations: all the consultations, preferred over regular shifts
+#   wantedShifts: the shifts the doctors want
+#   unwantedShifts: the shifts the doctors do not want
+#   wantedConsultations: the consultations the doctors want
+OBJECTIVE_TERMS = (
+    ('shifts', 'allShiftWeight', -1),
+    ('consultations', 'consultationWeight', 1),
+    ('wantedShifts', 'wantedShiftWeight', 1),
+    ('unwantedShifts', 'unwantedShiftWeight', -1),
+    ('wantedConsultations', 'wantedConsultationWeight', 1)
+)
+# Limits of the search. A value of 0 means no limit
+DEFAULT_MAX_TIME_IN_SECONDS = 0
+DEFAULT_RELATIVE_GAP_LIMIT = 0
+DEFAULT_SOLVER_PARAMETERS = {}
+
+# Whether interchangeable doctors are modeled together (see 
+# getEquivalentDoctors)
+DEFAULT_AGGREGATE_EQUIVALENT_DOCTORS = True
+
+# Whether a schedule of the heuristic module is returned when the solver
+# finds none, and whether it is the hint of the solver
+DEFAULT_HEURISTIC_FALLBACK = True
+DEFAULT_HEURISTIC_HINT = False
+
+# Size of the blocks of the decomposition mode (see scheduleDecomposed). 
+# Blocks with less working days are merged with their neighbour
+DEFAULT_DECOMPOSITION_WEEKS_PER_BLOCK = 1
+DECOMPOSITION_MIN_BLOCK_DAYS = 3
+
+# Maximum time spent looking for the constraints that make the inputs
+# infeasible (see explainInfeasibility). A value of 0 means no search
+DEFAULT_INFEASIBILITY_DIAGNOSIS_MAX_TIME_IN_SECONDS = 30
+
+# Maximum time spent looking for the closest feasible schedule to an 
+# infeasible hint (see repairScheduleHint)
+REPAIR_HINT_MAX_TIME_IN_SECONDS = 10
+
+# Seconds between two checks of the stopEvent of a search (see 
+# startSearchStopper)
+STOP_EVENT_POLL_INTERVAL_IN_SECONDS = 0.05
+
+# Files of the directory in which a model is dumped (see dumpModel)
+MODEL_DUMP_PROTO_FILE_NAME = 'model.pb'
+MODEL_DUMP_INFO_FILE_NAME = 'model.json'
+
+# Files used to find the CPU quota of the cgroup this process runs in
+CGROUP_V2_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+CGROUP_V1_CPU_QUOTA = '/sys/fs/cgroup/cpu/cpu.cfs_quota_us'
+CGROUP_V1_CPU_PERIOD = '/sys/fs/cgroup/cpu/cpu.cfs_period_us'
+
+
+def importSolver():
+    '''Import the CP-SAT module of OR-Tools, if it was not imported yet
+
+    Returns:
+        The ortools.sat.python.cp_model module
+
+    Raises:
+        ImportError if OR-Tools is not installed
+    '''
+    global cp_model
+    if cp_model is None:
+        try:
+            from ortools.sat.python import cp_model as cpModelModule
+        except ImportError:
+            log = logging.getLogger('scheduler.schedule')
+            log.error('Could not find module ortools. Try '
+                '\'pip install ortools\'')
+            log.error('Raising ImportError')
+            raise
+        cp_model = cpModelModule
+    return cp_model
+
+
+def getScheduleSolutionCallbackClass():
+    '''Return the ScheduleSolutionCallback class, importing OR-Tools if
+    needed (the class derives from one of its classes)'''
+    global _scheduleSolutionCallbackClass
+    if _scheduleSolutionCallbackClass is not None:
+        return _scheduleSolutionCallbackClass
+    importSolver()
+
+    class ScheduleSolutionCallback(cp_model.CpSolverSolutionCallback):
+        '''Solution callback used to report the intermediate schedules found
+        by the solver
+
+        Each time the solver finds an improving solution, the schedule
+        corresponding to it is generated and handed to onSolution. If 
+        onSolution is None, the solutions are only counted
+
+        Attributes:
+            numSolutions: the number of solutions found so far
+        '''
+        def __init__(self, createSchedule, onSolution, stopEvent=None):
+            '''
+            Args:
+                createSchedule: a callable receiving a function to get the 
+                    value of a variable, and returning the schedule dict
+                    (see the createSchedule function), or None if the
+                    solution cannot be turned into a schedule. Such 
+                    solutions are not handed to onSolution
+                onSolution: None or a callable receiving two arguments: the schedule
+                    dict and a dict with the progress of the search. The
+                    progress dict has the keys:
+                        solution: the number of solutions found so far
+                        objective: the objective value of this solution
+                        bestBound: the best bound of the objective found
+                        wallTime: the seconds elapsed since the search 
+                            started
+                stopEvent: optional. A threading.Event. The search is 
+                    stopped at the first solution found after it is set
+            '''
+            super().__init__()
+            self.createSchedule = createSchedule
+            self.onSolution = onSolution
+            self.stopEvent = stopEvent
+            self.numSolutions = 0
+
+        def OnSolutionCallback(self):
+            self.numSolutions += 1
+            if self.stopEvent is not None and self.stopEvent.is_set():
+                self.StopSearch()
+            if self.onSolution is None:
+                return
+            progress = {
+                'solution': self.numSolutions,
+                'objective': self.ObjectiveValue(),
+                'bestBound': self.BestObjectiveBound(),
+                'wallTime': self.WallTime()
+            }
+            logging.getLogger('scheduler.schedule').info(
+                'Solution %d found with objective %s after %.3fs',
+                self.numSolutions, progress['objective'], progress['wallTime'])
+            generatedSchedule = self.createSchedule(self.Value)
+            if generatedSchedule is not None:
+                self.onSolution(generatedSchedule, progress)
+
+    # As if it was defined at the module level (see __getattr__)
+    ScheduleSolutionCallback.__qualname__ = 'ScheduleSolutionCallback'
+    _scheduleSolutionCallbackClass = ScheduleSolutionCallback
+    return ScheduleSolutionCallback
+
+
+def startSearchStopper(solver, stopEvent):
+    '''Start a thread that stops the search of the solver once stopEvent
+    is set
+
+    The stopEvent is polled every STOP_EVENT_POLL_INTERVAL_IN_SECONDS, 
+    and the search is stopped again at each poll, as a stop requested 
+    before the search starts is ignored by the solver
+
+    Args:
+        solver: a cp_model.CpSolver
+        stopEvent: a threading.Event
+
+    Returns:
+        A threading.Event that has to be set once the search finishes, 
+        so that the thread ends
+    '''
+    searchFinished = threading.Event()
+    def stopSearch():
+        while not searchFinished.wait(STOP_EVENT_POLL_INTERVAL_IN_SECONDS):
+            if stopEvent.is_set():
+                solver.StopSearch()
+    threading.Thread(target=stopSearch, name='searchStopper', 
+        daemon=True).start()
+    return searchFinished
+
+
+def __getattr__(name):
+    # The classes deriving from OR-Tools are created on first access, so
+    # that importing this module does not import OR-Tools
+    if name == 'ScheduleSolutionCallback':
+        return getScheduleSolutionCallbackClass()
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+        __name__, name))
+
 
 def getShiftPreferences(*, shiftConfs, dayConfs, keys, daysOfMonth):
     '''Obtain the shift preferences indicated by keys
@@ -59,6 +251,8 @@ def getShiftPreferences(*, shiftConfs, dayConfs, keys, daysOfMonth):
     If keys are not present in the shiftConfs or in dayConfs, a default
     empty list will be used as their values
 
+    To obtain several pairs of keys, getAllShiftPreferences is faster
+
     Keyword Args:
         shiftConfs:
             A list of dicts representing the shift configuration of the 
@@ -195,87 +389,132 @@ def getShiftPreferences(*, shiftConfs, dayConfs, keys, daysOfMonth):
                 month, and the doctor with id 3 would like to have a 
                 shift the fourth day of the month
     '''
-    log = logging.getLogger('scheduler.getShiftPreferences')
-    log.info('Requested the shift preferences: {}'.format(keys))
+    return getAllShiftPreferences(shiftConfs=shiftConfs, dayConfs=dayConfs,
+        keyPairs=[keys], daysOfMonth=daysOfMonth)[tuple(keys)]
 
-    key1 =  keys[0]
-    key2 = keys[1]
+def getDoctorIdsFromMask(mask, docIds):
+    '''Return the list of doctor ids whose bits are set in mask
 
-    log.debug('Getting shift preferences by week day')
-    '''These two lists will contain an entry for each day of the week. 
+    Args:
+        mask: an int used as a bitset. The bit i represents the doctor
+            docIds[i]
+        docIds: a list of doctor ids
+
+    Returns:
+        A list of doctor ids, in the same order as in docIds
+    '''
+    ids = []
+    while mask:
+        lowestBit = mask & -mask
+        ids.append(docIds[lowestBit.bit_length() - 1])
+        mask ^= lowestBit
+    return ids
+
+def getAllShiftPreferences(*, shiftConfs, dayConfs, keyPairs, daysOfMonth):
+    '''Obtain the shift preferences of several pairs of keys at once
+
+    The result is the same as calling getShiftPreferences once for each
+    pair of keys, but shiftConfs and dayConfs are only traversed once. 
+    The preferences are stored as bitsets with a bit for each doctor: a
+    bitset for each key and week day, and another one for each key and
+    day of the month. Then, the preferences of each day are combined 
+    with bitwise operations
+
+    Keyword Args:
+        shiftConfs, dayConfs, daysOfMonth: see getShiftPreferences
+        keyPairs: an iterable of pairs of str. See the keys argument of
+            getShiftPreferences.
 
-    The first element of shifts1ByWeekDay is a list doctorIds 
-    representing the doctors who would have their key1 shifts on 
-    Mondays, the second element represents doctors who would have their 
-    key1 shifts of Tuesdays, and so on. 
+            Example: [('wantedShifts', 'unwantedShifts'), 
+                      ('mandatoryShifts', 'unavailableShifts')]
 
-    (Idem for the corresponding key2 list)
+    Returns:
+        A dict whose keys are the given pairs (as tuples), and whose 
+        values are the dicts returned by getShiftPreferences for them.
+        The doctor ids of each day are in the order of shiftConfs (and 
+        then dayConfs, for doctors without a shift configuration)
     '''
-    shifts1ByWeekDay = [[] for i in range(7)]
-    shifts2ByWeekDay = [[] for i in range(7)]
+    log = logging.getLogger('scheduler.getShiftPreferences')
+    keyPairs = [tuple(keys) for keys in keyPairs]
+    log.info('Requested the shift preferences: %s', keyPairs)
+    # Checked once, as the per-day messages below are in the hot path
+    debug = log.isEnabledFor(logging.DEBUG)
+    allKeys = {key for keys in keyPairs for key in keys}
+
+    # Each doctor is given a bit in the order they are found
+    docBits = {}
+    docIds = []
+    def getDoctorBit(docId):
+        bit = docBits.get(docId, None)
+        if bit is None:
+            bit = docBits[docId] = 1 << len(docIds)
+            docIds.append(docId)
+        return bit
+
+    log.debug('Getting shift preferences by week day')
+    # For each key, a list with the bitset of each week day
+    maskByWeekDay = {key: [0] * 7 for key in allKeys}
     for shiftConf in shiftConfs:
-        docId = shiftConf['doctorId']
-        for shift1ByWeekDay in shiftConf.get(key1, []):
-            weekday = WEEK_DAY[shift1ByWeekDay['shift']]
-            shifts1ByWeekDay[weekday].append(docId)
-        for shift2ByWeekDay in shiftConf.get(key2, []):
-            weekday = WEEK_DAY[shift2ByWeekDay['shift']]
-            shifts2ByWeekDay[weekday].append(docId)
-    log.debug('{} by week day: {}'.format(key1, shifts1ByWeekDay))
-    log.debug('{} by week day: {}'.format(key2, shifts2ByWeekDay))
-    for i in range(7):
-        intersection = set(shifts1ByWeekDay[i]) & set(shifts2ByWeekDay[i])
-        if len(intersection) != 0:
-            log.warn(('The doctors with id {} have selected the shifts on {} '
-                + 'as both a {} and {}').format(intersection, 
-                DAY_NUM_TO_WEEK_DAY[i], key1, key2))
-
-    shiftPreferences = {}
-    for day, dayConf in zip(daysOfMonth, dayConfs):
-        log.debug('Getting shift preferences information for day {}'
-            .format(day))
-
-        weekday = day.weekday()
-        log.debug('This day is {}'.format(DAY_NUM_TO_WEEK_DAY[weekday]))
-
-        log.debug('Getting high priority shift preferences')
-        shifts1HighPriority = [doctor['id'] for doctor in dayConf.get(key1, [])]
-        shifts2HighPriority = [doctor['id'] for doctor in dayConf.get(key2, [])]
-        log.debug('High priority {} are: {}'.format(key1, 
-            shifts1HighPriority))
-        log.debug('High priority{} are: {}'.format(key2, 
-            shifts2HighPriority))
-
-        intersection = set(shifts1HighPriority) & set(shifts2HighPriority)
-        if (len(intersection) != 0):
-            log.warn(('The doctors with id {intersection} have selected '
-                + 'shift of the day {} as both a {} and {}')
-                .format(intersection, day, key1, key2))
-
-        log.debug('Filtering week day preferences according to high '
-            + 'priority ones')
-        shifts1Filtered = [docId for docId in shifts1ByWeekDay[weekday] 
-            if docId not in shifts2HighPriority]
-        shifts2Filtered = [docId for docId in shifts2ByWeekDay[weekday]
-            if docId not in shifts1HighPriority]
-        log.debug('{} after filtering is: {}'.format(key1, shifts1Filtered))
-        log.debug('{} after filtering is: {}'.format(key2, shifts2Filtered))
-
-        log.debug('Combining filtered shift preferences with high priority '
-            + 'ones')
-        shifts1Combined = list(set(shifts1Filtered) | set(shifts1HighPriority))
-        shifts2Combined = list(set(shifts2Filtered) | set(shifts2HighPriority))
-        log.debug('{} after combining is: {}'.format(key1, shifts1Combined))
-        log.debug('{} after combining is: {}'.format(key2, shifts2Combined))
-
-        shiftPreferences[day.day] = [
-            shifts1Combined,
-            shifts2Combined
-        ]
-
-    log.info('The shift preferences are: {}'.format(shiftPreferences))
-
-    return shiftPreferences
+        docBit = getDoctorBit(shiftConf['doctorId'])
+        for key in allKeys:
+            weekDayMasks = maskByWeekDay[key]
+            for shiftByWeekDay in shiftConf.get(key, []):
+                weekDayMasks[WEEK_DAY[shiftByWeekDay['shift']]] |= docBit
+
+    # For each day, a dict with the bitset of each key
+    maskByDay = []
+    for dayConf in dayConfs:
+        dayMasks = {}
+        for key in allKeys:
+            mask = 0
+            for doctor in dayConf.get(key, []):
+                mask |= getDoctorBit(doctor['id'])
+            dayMasks[key] = mask
+        maskByDay.append(dayMasks)
+
+    allShiftPreferences = {}
+    for key1, key2 in keyPairs:
+        weekDayMasks1 = maskByWeekDay[key1]
+        weekDayMasks2 = maskByWeekDay[key2]
+        for i in range(7):
+            intersection = weekDayMasks1[i] & weekDayMasks2[i]
+            if intersection:
+                log.warning('The doctors with id %s have selected the '
+                    'shifts on %s as both a %s and %s', 
+                    set(getDoctorIdsFromMask(intersection, docIds)),
+                    DAY_NUM_TO_WEEK_DAY[i], key1, key2)
+
+        shiftPreferences = {}
+        for day, dayMasks in zip(daysOfMonth, maskByDay):
+            weekday = day.weekday()
+            highPriority1 = dayMasks[key1]
+            highPriority2 = dayMasks[key2]
+            intersection = highPriority1 & highPriority2
+            if intersection:
+                log.warning('The doctors with id %s have selected shift of '
+                    'the day %s as both a %s and %s', 
+                    set(getDoctorIdsFromMask(intersection, docIds)), day, 
+                    key1, key2)
+
+            # Week day preferences are overridden by high priority ones
+            combined1 = (weekDayMasks1[weekday] & ~highPriority2) \
+                | highPriority1
+            combined2 = (weekDayMasks2[weekday] & ~highPriority1) \
+                | highPriority2
+            shiftPreferences[day.day] = [
+                getDoctorIdsFromMask(combined1, docIds),
+                getDoctorIdsFromMask(combined2, docIds)
+            ]
+            if debug:
+                log.debug('%s and %s of the day %s (%s) are: %s', key1, key2, 
+                    day, DAY_NUM_TO_WEEK_DAY[weekday], 
+                    shiftPreferences[day.day])
+
+        log.info('The shift preferences %s are: %s', (key1, key2), 
+            shiftPreferences)
+        allShiftPreferences[key1, key2] = shiftPreferences
+
+    return allShiftPreferences
 
 def getConfiguration(confDict, key, default=None):
     '''Extract a configuration parameter from the configuration dict
@@ -304,12 +543,1598 @@ def getConfiguration(confDict, key, default=None):
     log = logging.getLogger('scheduler.schedule')
     value = confDict.get(key, {}).get('value', None)
     if value is None:
-        log.error(f'The {key} is not correctly configured. '
-            + f'Using the default {default}')
+        log.error('The %s is not correctly configured. Using the default %s', 
+            key, default)
         value = default
     return value
 
-def schedule(doctors, shiftConfs, calendarDict, schedulerConf):
+def getCgroupCpuQuota():
+    '''Return the number of CPUs this process is allowed to use by its
+    cgroup (e.g. the CPU limit of a container), or None if there is no 
+    limit
+
+    The returned value is a float, as quotas can be fractional. E.g. 1.5
+    '''
+    try:
+        with open(CGROUP_V2_CPU_MAX) as cpuMaxFile:
+            quota, period = cpuMaxFile.read().split()[:2]
+        if quota != 'max':
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(CGROUP_V1_CPU_QUOTA) as quotaFile:
+            quota = int(quotaFile.read())
+        with open(CGROUP_V1_CPU_PERIOD) as periodFile:
+            period = int(periodFile.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def getAvailableCpus():
+    '''Return the number of CPUs available to this process
+
+    Both the CPU affinity of the process and the CPU quota of its cgroup
+    are taken into account. The returned value is at least 1
+    '''
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # sched_getaffinity is not available in all platforms
+        cpus = os.cpu_count() or 1
+    quota = getCgroupCpuQuota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+def setSolverParameters(parameters, values):
+    '''Set the given values in the parameters of a CpSolver
+
+    Invalid parameters are logged as an ERROR and ignored
+
+    Args:
+        parameters: the parameters of a solver. E.g. solver.parameters
+        values: a dict whose keys are the names of the CP-SAT 
+            parameters (as in sat_parameters.proto) and whose values are
+            the values to be set. Enum parameters can be given by name, 
+            and values of repeated parameters are given as lists, whose
+            elements are appended to the parameter.
+            E.g. {'num_search_workers': 4, 'random_seed': 7,
+                  'search_branching': 'FIXED_SEARCH'}
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    for name, value in values.items():
+        try:
+            if isinstance(value, list):
+                getattr(parameters, name).extend(value)
+            else:
+                try:
+                    setattr(parameters, name, value)
+                except TypeError:
+                    if not isinstance(value, str):
+                        raise
+                    # The value is the name of an enum value
+                    setattr(parameters, name, getattr(parameters, value))
+        except (AttributeError, TypeError, ValueError) as e:
+            log.error('The solver parameter %s=%r is not valid (%s). '
+                'Ignoring it', name, value, e)
+
+def getSolverParameters(schedulerConf, overrides=None):
+    '''Return the parameters to be set in the CpSolver
+
+    These are, from lowest to highest precedence:
+      - num_search_workers, which defaults to the number of available
+        CPUs (see getAvailableCpus)
+      - max_time_in_seconds and relative_gap_limit, given by the 
+        maxTimeInSeconds and relativeGapLimit configurations (if they
+        are not zero)
+      - The solverParameters configuration
+      - The given overrides
+
+    Args:
+        schedulerConf: see the getConfiguration function
+        overrides: optional. A dict with the same format as the 
+            solverParameters configuration
+
+    Returns:
+        A dict that can be given to setSolverParameters
+    '''
+    maxTimeInSeconds = getConfiguration(schedulerConf, 'maxTimeInSeconds',
+        default=DEFAULT_MAX_TIME_IN_SECONDS)
+    relativeGapLimit = getConfiguration(schedulerConf, 'relativeGapLimit',
+        default=DEFAULT_RELATIVE_GAP_LIMIT)
+    configuredParameters = getConfiguration(schedulerConf, 'solverParameters',
+        default=DEFAULT_SOLVER_PARAMETERS)
+
+    solverParameters = {'num_search_workers': getAvailableCpus()}
+    if maxTimeInSeconds > 0:
+        solverParameters['max_time_in_seconds'] = maxTimeInSeconds
+    if relativeGapLimit > 0:
+        solverParameters['relative_gap_limit'] = relativeGapLimit
+    solverParameters.update(configuredParameters)
+    if overrides:
+        solverParameters.update(overrides)
+    return solverParameters
+
+def createSchedule(*, year, month, daysOfMonth, dayConfs, cycleShifts, 
+        docIds, workingDays, shiftValues, consultationValues):
+    '''Create the schedule dict corresponding to a solution of the model
+
+    Keyword Args:
+        year, month, daysOfMonth, dayConfs, cycleShifts, workingDays:
+            See the schedule function
+        docIds: the list of the ids of the doctors, in the order of the 
+            shiftConfs
+        shiftValues: a list with a row for each doctor of docIds. Each 
+            row has a bool for each working day, True if the doctor has
+            a shift that day
+        consultationValues: the same for the consultations. The row of 
+            the doctors without consultations is None
+
+    Returns:
+        The schedule dict with the status PENDING_CONFIRMATION. See the
+        schedule function
+    '''
+    schedule = {
+        'month': month,
+        'year': year,
+        'status': 'PENDING_CONFIRMATION',
+        'days': [{
+            'day': day.day, 
+            'isWorkingDay': dayConfs[day.day-1]['isWorkingDay'],
+            'cycle': [{'id': docId} for docId in cycleShifts[day.day]], 
+            'shifts': [], 
+            'consultations':[]
+        } for day in daysOfMonth]
+    }
+    for docId, shiftRow, consultationRow in zip(docIds, shiftValues, 
+            consultationValues):
+        for j, dayNum in enumerate(workingDays):
+            if shiftRow[j]:
+                schedule['days'][dayNum-1]['shifts'].append({'id':docId})
+            if consultationRow is not None and consultationRow[j]:
+                schedule['days'][dayNum-1]['consultations'].append(
+                    {'id':docId})
+    return schedule
+
+def getScheduleHint(shiftVars, hint):
+    '''Get the values of the BoolVars corresponding to the assignments of
+    the given schedule
+
+    Args:
+        shiftVars: see the schedule function
+        hint: a schedule dict, with the same format as the one returned
+            by the schedule function. Only the 'shifts' and 
+            'consultations' of its 'days' are used. Days missing in the
+            hint are not hinted
+
+    Returns:
+        A list of tuples as (BoolVar, bool)
+    '''
+    shifts = {}
+    consultations = {}
+    for day in hint.get('days', []):
+        shifts[day['day']] = {doctor['id'] 
+            for doctor in day.get('shifts', [])}
+        consultations[day['day']] = {doctor['id'] 
+            for doctor in day.get('consultations', [])}
+    hintValues = []
+    for (docId, dayNum), shiftVar in shiftVars.items():
+        if dayNum not in shifts:
+            continue
+        if shiftVar[0] is not None:
+            hintValues.append((shiftVar[0], docId in shifts[dayNum]))
+        if len(shiftVar) > 1 and shiftVar[1] is not None:
+            hintValues.append((shiftVar[1], docId in consultations[dayNum]))
+    return hintValues
+
+def copyModel(model):
+    '''Return a copy of a cp_model.CpModel. The variables of the model 
+    can be used in the copy, as they have the same indexes'''
+    if hasattr(model, 'Clone'):
+        return model.Clone()
+    # Older versions of OR-Tools do not have CpModel.Clone
+    modelCopy = cp_model.CpModel()
+    modelCopy.Proto().CopyFrom(model.Proto())
+    return modelCopy
+
+def dumpModel(directory, model, info):
+    '''Store a built model, so that it can be solved again offline (see 
+    the replay module)
+
+    Args:
+        directory: the path of the directory in which the model is 
+            stored. It is created if needed. The files stored are:
+                MODEL_DUMP_PROTO_FILE_NAME: the CpModelProto, in binary
+                MODEL_DUMP_INFO_FILE_NAME: the info, as JSON
+        model: a cp_model.CpModel
+        info: a JSON serializable dict. See the modelDumpDir argument of
+            the schedule function
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    model.ExportToFile(str(directory / MODEL_DUMP_PROTO_FILE_NAME))
+    storage.writeJsonFile(directory / MODEL_DUMP_INFO_FILE_NAME, info)
+    log.info('The model has been dumped at %s', directory)
+
+def repairScheduleHint(model, hintValues, solverParameters):
+    '''Find the solution of the model closest to the given hint
+
+    The hint may be infeasible (e.g. an administrator changed the number
+    of shifts of a day after the hinted schedule was generated). In that
+    case, the solver would discard it. Instead, the model is solved 
+    maximizing the number of variables that take their hinted value, 
+    and the resulting solution is returned as the new hint.
+
+    The objective of the model is replaced, so it has to be set again 
+    after calling this function
+
+    Args:
+        model: the CpModel
+        hintValues: a list of tuples as (BoolVar, bool). See 
+            getScheduleHint
+        solverParameters: the parameters of the solver, as returned by
+            getSolverParameters. The search is limited to
+            REPAIR_HINT_MAX_TIME_IN_SECONDS
+
+    Returns:
+        A list of tuples as (BoolVar, bool), with the repaired values. 
+        If no solution is found, hintValues is returned
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    model.Maximize(sum(var if value else 1 - var 
+        for var, value in hintValues))
+    for var, value in hintValues:
+        model.AddHint(var, value)
+    repairParameters = dict(solverParameters)
+    repairParameters['max_time_in_seconds'] = min(
+        repairParameters.get('max_time_in_seconds', 
+            REPAIR_HINT_MAX_TIME_IN_SECONDS), 
+        REPAIR_HINT_MAX_TIME_IN_SECONDS)
+    solver = cp_model.CpSolver()
+    setSolverParameters(solver.parameters, repairParameters)
+    status = solver.Solve(model)
+    model.ClearHints()
+    if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+        log.warning('The hint could not be repaired')
+        return hintValues
+    log.info('The repaired hint differs in %d of %d values', 
+        len(hintValues) - int(solver.ObjectiveValue()), len(hintValues))
+    return [(var, solver.BooleanValue(var)) for var, _ in hintValues]
+
+def splitIncrementalRegion(shiftVars, *, numDaysInMonth, changedDays=(), 
+        changedDoctors=(), radius=0):
+    '''Split the variables of the model into the ones inside and outside
+    the region affected by a change
+
+    The affected region contains all the days of the changed doctors, 
+    and all the doctors in the changed days. Each changed day widens the
+    region by radius days before and after it
+
+    Args:
+        shiftVars: see the schedule function
+
+    Keyword Args:
+        numDaysInMonth: the number of days in the month
+        changedDays: an iterable of the numbers of the changed days
+        changedDoctors: an iterable of the ids of the changed doctors
+        radius: an int. The number of days around the changed days that 
+            are also part of the region. Defaults to 0
+
+    Returns:
+        A tuple as (freeVars, fixedVars). Both are dicts with the same 
+        format as shiftVars. freeVars contains the variables inside the
+        region, and fixedVars the rest of them
+    '''
+    affectedDays = {dayNum for changedDay in changedDays
+        for dayNum in range(max(1, changedDay - radius), 
+            min(numDaysInMonth, changedDay + radius) + 1)}
+    affectedDoctors = set(changedDoctors)
+    freeVars = {}
+    fixedVars = {}
+    for (docId, dayNum), shiftVar in shiftVars.items():
+        if docId in affectedDoctors or dayNum in affectedDays:
+            freeVars[docId, dayNum] = shiftVar
+        else:
+            fixedVars[docId, dayNum] = shiftVar
+    return freeVars, fixedVars
+
+def getEquivalentDoctors(*, shiftConfs, preferences, forcedCycleShifts, 
+        absences=()):
+    '''Group the doctors that are interchangeable in the model
+
+    Two doctors are interchangeable if they have the same shift 
+    configuration (apart from their id), the same shift preferences 
+    every day, the same cycle-shifts and the same absences. Swapping 
+    their assignments in any schedule gives another schedule with the 
+    same objective
+
+    Keyword Args:
+        shiftConfs: see the schedule function
+        preferences: the dict returned by getAllShiftPreferences
+        forcedCycleShifts: see getForcedCycleShifts
+        absences: optional. See getAbsences
+
+    Returns:
+        A list of classes of interchangeable doctors. Each class is a 
+        list with the indexes in shiftConfs of at least two doctors
+    '''
+    docIndexes = {shiftConf['doctorId']: i 
+        for i, shiftConf in enumerate(shiftConfs)}
+    # The days of each preference, and of the forced cycle-shifts, of
+    # each doctor
+    doctorDays = [[] for _ in shiftConfs]
+    def addDays(label, docIdsByDay):
+        days = {}
+        for dayNum, docIds in docIdsByDay:
+            for docId in docIds:
+                days.setdefault(docId, []).append(dayNum)
+        for docId, dayNums in days.items():
+            i = docIndexes.get(docId, None)
+            if i is not None:
+                doctorDays[i].append((label, tuple(sorted(dayNums))))
+    for keys, shiftPreferences in preferences.items():
+        for position, key in enumerate(keys):
+            addDays(key, ((dayNum, docIdLists[position]) 
+                for dayNum, docIdLists in shiftPreferences.items()))
+    addDays('cycleShifts', ((dayNum, [docId]) 
+        for docId, dayNum in forcedCycleShifts))
+    addDays('absences', ((dayNum, [docId]) for docId, dayNum in absences))
+
+    classes = {}
+    for i, shiftConf in enumerate(shiftConfs):
+        signature = (shiftConf['minShifts'], shiftConf['maxShifts'], 
+            shiftConf['numConsultations'], shiftConf['doesCycleShifts'], 
+            shiftConf['hasShiftsOnlyWhenCycleShifts'], 
+            tuple(sorted(doctorDays[i])))
+        classes.setdefault(signature, []).append(i)
+    return [doctorClass for doctorClass in classes.values() 
+        if len(doctorClass) > 1]
+
+def expandDoctorCounts(numDoctors, shiftCounts, consultationCounts, *,
+        shiftConf):
+    '''Distribute evenly the shifts and consultations of some 
+    interchangeable doctors
+
+    The number of shifts and consultations each doctor gets is decided 
+    first, so that they differ in one at most, and the total of each 
+    doctor is also even. Then, the shifts and consultations of each day 
+    (starting with the busiest days) are given to the doctors that need
+    the most of them. If the result does not respect the bounds of the 
+    shift configuration, the distribution is solved exactly with CP-SAT
+    (see solveDoctorCounts)
+
+    Args:
+        numDoctors: the number of interchangeable doctors
+        shiftCounts: a list with the number of these doctors having a 
+            shift each working day
+        consultationCounts: the same for consultations, or None if the
+            doctors do not have consultations
+
+    Keyword Args:
+        shiftConf: the shift configuration shared by the doctors
+
+    Returns:
+        A tuple as (shiftRows, consultationRows). shiftRows is a list 
+        with a row for each doctor with a bool for each working day. 
+        consultationRows is the same for the consultations (or None).
+        None is returned instead if the shifts cannot be distributed 
+        within the bounds of the shift configuration
+    '''
+    numDays = len(shiftCounts)
+    if consultationCounts is None:
+        consultationCounts = [0] * numDays
+        hasConsultations = False
+    else:
+        hasConsultations = True
+
+    # The extra shifts are given to the doctors without the extra 
+    # consultation first
+    totalShifts = sum(shiftCounts)
+    totalConsultations = sum(consultationCounts)
+    neededConsultations = [totalConsultations // numDoctors 
+        + (1 if k < totalConsultations % numDoctors else 0) 
+        for k in range(numDoctors)]
+    neededShifts = [totalShifts // numDoctors 
+        + (1 if numDoctors - 1 - k < totalShifts % numDoctors else 0)
+        for k in range(numDoctors)]
+
+    shiftRows = [[False] * numDays for _ in range(numDoctors)]
+    consultationRows = [[False] * numDays for _ in range(numDoctors)]
+    doctors = range(numDoctors)
+    for j in sorted(range(numDays), 
+            key=lambda j: shiftCounts[j] + consultationCounts[j], 
+            reverse=True):
+        byConsultations = sorted(doctors, key=lambda k: (
+            neededConsultations[k], neededConsultations[k] 
+            + neededShifts[k]), reverse=True)
+        for k in byConsultations[:consultationCounts[j]]:
+            consultationRows[k][j] = True
+            neededConsultations[k] -= 1
+        byShifts = sorted((k for k in doctors if not consultationRows[k][j]),
+            key=lambda k: (neededShifts[k], neededConsultations[k] 
+                + neededShifts[k]), reverse=True)
+        for k in byShifts[:shiftCounts[j]]:
+            shiftRows[k][j] = True
+            neededShifts[k] -= 1
+
+    if not isExpansionValid(shiftRows, consultationRows, shiftConf):
+        logging.getLogger('scheduler.schedule').info('Distributing the '
+            'shifts of %d interchangeable doctors with CP-SAT', numDoctors)
+        distribution = solveDoctorCounts(numDoctors, shiftCounts, 
+            consultationCounts, shiftConf=shiftConf, 
+            hint=(shiftRows, consultationRows))
+        if distribution is None:
+            return None
+        shiftRows, consultationRows = distribution
+    return shiftRows, consultationRows if hasConsultations else None
+
+def isExpansionValid(shiftRows, consultationRows, shiftConf):
+    '''Check that the rows of each doctor respect the bounds of their 
+    shift configuration (see expandDoctorCounts)'''
+    if shiftConf['hasShiftsOnlyWhenCycleShifts']:
+        return True
+    for shiftRow, consultationRow in zip(shiftRows, consultationRows):
+        numShifts = sum(shiftRow)
+        numConsultations = sum(consultationRow)
+        if numShifts < shiftConf['minShifts'] \
+                or numShifts + numConsultations > shiftConf['maxShifts'] \
+                or numConsultations > shiftConf['numConsultations']:
+            return False
+    return True
+
+def solveDoctorCounts(numDoctors, shiftCounts, consultationCounts, *, 
+        shiftConf, hint):
+    '''Distribute the shifts and consultations of some interchangeable
+    doctors respecting the bounds of their shift configuration
+
+    Used by expandDoctorCounts when its distribution is not valid. The
+    arguments are the same, and hint is the distribution found by it
+
+    Returns:
+        The same as expandDoctorCounts, but consultationRows is always a
+        list. None if no distribution is found within the bounds
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    numDays = len(shiftCounts)
+    importSolver()
+    model = cp_model.CpModel()
+    shiftVars = [[model.NewBoolVar('') for _ in range(numDays)] 
+        for _ in range(numDoctors)]
+    consultationVars = [[model.NewBoolVar('') for _ in range(numDays)] 
+        for _ in range(numDoctors)]
+    for j in range(numDays):
+        model.Add(cp_model.LinearExpr.Sum([shiftVars[k][j] 
+            for k in range(numDoctors)]) == shiftCounts[j])
+        model.Add(cp_model.LinearExpr.Sum([consultationVars[k][j] 
+            for k in range(numDoctors)]) == consultationCounts[j])
+    for k in range(numDoctors):
+        for j in range(numDays):
+            model.AddAtMostOne([shiftVars[k][j], consultationVars[k][j]])
+            model.AddHint(shiftVars[k][j], hint[0][k][j])
+            model.AddHint(consultationVars[k][j], hint[1][k][j])
+        if not shiftConf['hasShiftsOnlyWhenCycleShifts']:
+            model.Add(cp_model.LinearExpr.Sum(shiftVars[k]) 
+                >= shiftConf['minShifts'])
+            model.Add(cp_model.LinearExpr.Sum(shiftVars[k] 
+                + consultationVars[k]) <= shiftConf['maxShifts'])
+            model.Add(cp_model.LinearExpr.Sum(consultationVars[k]) 
+                <= shiftConf['numConsultations'])
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = REPAIR_HINT_MAX_TIME_IN_SECONDS
+    status = solver.Solve(model)
+    if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+        log.warning('The shifts of %d interchangeable doctors could not be '
+            'distributed within their bounds', numDoctors)
+        return None
+    return ([[solver.BooleanValue(var) for var in row] for row in shiftVars],
+        [[solver.BooleanValue(var) for var in row] 
+            for row in consultationVars])
+
+# Keys of the shift preferences of the shiftConfs and the dayConfigurations
+PREFERENCE_KEYS = ('wantedShifts', 'unwantedShifts', 'mandatoryShifts', 
+    'unavailableShifts', 'wantedConsultations', 'unwantedConsultations')
+
+def isInt(value):
+    # bool is a subclass of int, but True is not a valid number of shifts
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def parseIsoDate(value):
+    '''Return the datetime.date of an ISO str, or None if it is not 
+    valid'''
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        return None
+
+def validateInputs(doctors, shiftConfs, calendarDict):
+    '''Check the structure and the consistency of the inputs of the 
+    schedule function, without building the model
+
+    This function does not need OR-Tools, and it takes milliseconds even
+    for large departments. It does not check whether the schedule can be
+    generated (see checkFeasibility)
+
+    Args:
+        doctors, shiftConfs, calendarDict: see the schedule function
+
+    Returns:
+        A list of dicts, one for each issue found (empty if the inputs 
+        are valid). E.g.
+            [
+                {'level': 'error', 'path': 'shiftConfs[2].maxShifts',
+                 'message': 'maxShifts must be an int >= 0'},
+                {'level': 'warning', 'path': 'doctors[4]',
+                 'message': 'The doctor 7 does not have a shift ...'},
+                ...
+            ]
+        The schedule function raises a ValueError for the inputs with 
+        any issue of level 'error'. Warnings are inputs the schedule 
+        function accepts, but that are likely to be mistakes
+    '''
+    issues = []
+    def addIssue(level, path, message):
+        issues.append({'level': level, 'path': path, 'message': message})
+
+    def checkPreferences(container, path, itemKey, isValidItem, expected):
+        for key in PREFERENCE_KEYS:
+            items = container.get(key, None)
+            if items is None:
+                continue
+            if not isinstance(items, list):
+                addIssue('error', '{}.{}'.format(path, key), 
+                    '{} must be a list'.format(key))
+                continue
+            for i, item in enumerate(items):
+                if not isinstance(item, dict) \
+                        or not isValidItem(item.get(itemKey, None)):
+                    addIssue('error', '{}.{}[{}]'.format(path, key, i),
+                        'Each element of {} must be a dict with the key '
+                        '\'{}\' having {}'.format(key, itemKey, expected))
+
+    if not isinstance(doctors, list):
+        addIssue('error', 'doctors', 'The doctors must be a list')
+        doctors = []
+    if not isinstance(shiftConfs, list):
+        addIssue('error', 'shiftConfs', 'The shiftConfs must be a list')
+        shiftConfs = []
+
+    shiftConfsDict = {}
+    for i, shiftConf in enumerate(shiftConfs):
+        path = 'shiftConfs[{}]'.format(i)
+        if not isinstance(shiftConf, dict):
+            addIssue('error', path, 'Each shiftConf must be a dict')
+            continue
+        docId = shiftConf.get('doctorId', None)
+        if not isInt(docId):
+            addIssue('error', path + '.doctorId', 'doctorId must be an int')
+        elif docId in shiftConfsDict:
+            addIssue('error', path + '.doctorId', 'There are two shift '
+                'configurations for the doctor {}'.format(docId))
+        else:
+            shiftConfsDict[docId] = shiftConf
+        for key in ('numConsultations', 'minShifts', 'maxShifts'):
+            value = shiftConf.get(key, None)
+            if not isInt(value) or value < 0:
+                addIssue('error', '{}.{}'.format(path, key), 
+                    '{} must be an int >= 0'.format(key))
+        for key in ('doesCycleShifts', 'hasShiftsOnlyWhenCycleShifts'):
+            if not isinstance(shiftConf.get(key, None), bool):
+                addIssue('error', '{}.{}'.format(path, key), 
+                    '{} must be a bool'.format(key))
+        minShifts = shiftConf.get('minShifts', None)
+        maxShifts = shiftConf.get('maxShifts', None)
+        if isInt(minShifts) and isInt(maxShifts) and minShifts > maxShifts \
+                and not shiftConf.get('hasShiftsOnlyWhenCycleShifts', False):
+            addIssue('warning', path, 'The doctor {} has at least {} shifts '
+                'but at most {}'.format(docId, minShifts, maxShifts))
+        checkPreferences(shiftConf, path, 'shift', 
+            lambda shift: shift in WEEK_DAY, 'a day of the week')
+
+    docIds = set()
+    for i, doctor in enumerate(doctors):
+        path = 'doctors[{}]'.format(i)
+        if not isinstance(doctor, dict):
+            addIssue('error', path, 'Each doctor must be a dict')
+            continue
+        docId = doctor.get('id', None)
+        if not isInt(docId):
+            addIssue('error', path + '.id', 'The id must be an int')
+        elif docId in docIds:
+            addIssue('error', path + '.id', 
+                'There are two doctors with the id {}'.format(docId))
+        else:
+            docIds.add(docId)
+        shiftConf = shiftConfsDict.get(docId, None)
+        if shiftConf is None and isInt(docId):
+            addIssue('warning', path, 'The doctor {} does not have a shift '
+                'configuration, so they only have cycle-shifts'.format(docId))
+        startDate = doctor.get('startDate', None)
+        if startDate is not None and parseIsoDate(startDate) is None:
+            addIssue('error', path + '.startDate', 
+                'startDate must be a date in ISO format')
+        elif startDate is None and (shiftConf is None 
+                or shiftConf.get('doesCycleShifts', False)):
+            addIssue('error', path + '.startDate', 'startDate is needed to '
+                'know the cycle-shifts of the doctor {}'.format(docId))
+        absence = doctor.get('absence', None)
+        if absence is None:
+            continue
+        if not isinstance(absence, dict):
+            addIssue('error', path + '.absence', 
+                'The absence must be a dict or null')
+            continue
+        start = parseIsoDate(absence.get('start', None))
+        end = parseIsoDate(absence.get('end', None))
+        if start is None or end is None:
+            addIssue('error', path + '.absence', 'The start and end of the '
+                'absence must be dates in ISO format')
+        elif start > end:
+            addIssue('error', path + '.absence', 
+                'The absence ends before it starts')
+    for i, shiftConf in enumerate(shiftConfs):
+        if isinstance(shiftConf, dict) \
+                and isInt(shiftConf.get('doctorId', None)) \
+                and shiftConf['doctorId'] not in docIds:
+            addIssue('warning', 'shiftConfs[{}].doctorId'.format(i), 
+                'There is no doctor with the id {}'.format(
+                    shiftConf['doctorId']))
+
+    if not isinstance(calendarDict, dict):
+        addIssue('error', 'calendar', 'The calendar must be a dict')
+        return issues
+    year = calendarDict.get('year', None)
+    month = calendarDict.get('month', None)
+    if not isInt(year) or not datetime.MINYEAR <= year <= datetime.MAXYEAR:
+        addIssue('error', 'calendar.year', 'The year must be an int')
+        year = None
+    if not isInt(month) or not 1 <= month <= 12:
+        addIssue('error', 'calendar.month', 
+            'The month must be an int between 1 and 12')
+        month = None
+    dayConfs = calendarDict.get('dayConfigurations', None)
+    if not isinstance(dayConfs, list):
+        addIssue('error', 'calendar.dayConfigurations', 
+            'The dayConfigurations must be a list')
+        return issues
+    dayNums = []
+    for i, dayConf in enumerate(dayConfs):
+        path = 'calendar.dayConfigurations[{}]'.format(i)
+        if not isinstance(dayConf, dict):
+            addIssue('error', path, 'Each day configuration must be a dict')
+            continue
+        if not isInt(dayConf.get('day', None)):
+            addIssue('error', path + '.day', 'The day must be an int')
+        else:
+            dayNums.append(dayConf['day'])
+        if not isinstance(dayConf.get('isWorkingDay', None), bool):
+            addIssue('error', path + '.isWorkingDay', 
+                'isWorkingDay must be a bool')
+        for key in ('numShifts', 'numConsultations'):
+            value = dayConf.get(key, None)
+            if not isInt(value) or value < 0:
+                addIssue('error', '{}.{}'.format(path, key), 
+                    '{} must be an int >= 0'.format(key))
+        checkPreferences(dayConf, path, 'id', isInt, 'a doctor id')
+        for key in PREFERENCE_KEYS:
+            items = dayConf.get(key, None)
+            if not isinstance(items, list):
+                continue
+            for item in items:
+                if isinstance(item, dict) and isInt(item.get('id', None)) \
+                        and item['id'] not in shiftConfsDict:
+                    addIssue('warning', '{}.{}'.format(path, key), 'There is '
+                        'no shift configuration for the doctor {}'.format(
+                            item['id']))
+    if year is not None and month is not None \
+            and len(dayNums) == len(dayConfs):
+        numDaysInMonth = calendarLib.monthrange(year, month)[1]
+        if len(dayConfs) != numDaysInMonth:
+            addIssue('error', 'calendar.dayConfigurations', 
+                'The number of expected days for {}-{} is {}, but the number '
+                'of days given was {}'.format(year, month, numDaysInMonth, 
+                    len(dayConfs)))
+        else:
+            missingDays = sorted(set(range(1, numDaysInMonth + 1)) 
+                - set(dayNums))
+            if missingDays:
+                addIssue('error', 'calendar.dayConfigurations', 'Missing the '
+                    'days {} in the day configurations of the calendar'.format(
+                        missingDays))
+    return issues
+
+def checkInputs(doctors, shiftConfs, calendarDict):
+    '''Check the inputs of the schedule function with validateInputs, 
+    logging the warnings found
+
+    Raises:
+        ValueError if there is any issue of level 'error'
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    errors = []
+    for issue in validateInputs(doctors, shiftConfs, calendarDict):
+        if issue['level'] == 'error':
+            errors.append(issue)
+        else:
+            log.warning('%s: %s', issue['path'], issue['message'])
+    if errors:
+        errorMessage = 'The inputs are not valid. ' + '; '.join(
+            '{}: {}'.format(issue['path'], issue['message']) 
+            for issue in errors)
+        log.error(errorMessage)
+        log.error('Raising ValueError')
+        raise ValueError(errorMessage)
+
+def checkWeightSets(weightSets):
+    '''Check the weightSets argument of the schedule function
+
+    Returns:
+        The weightSets as a list
+
+    Raises:
+        ValueError if they are not a non empty list of dicts with the 
+        weight keys of the OBJECTIVE_TERMS
+    '''
+    weightKeys = [weightKey for _, weightKey, _ in OBJECTIVE_TERMS]
+    try:
+        weightSets = list(weightSets)
+    except TypeError:
+        weightSets = []
+    if not weightSets or any(not isinstance(weightSet, dict) 
+            or any(key not in weightKeys for key in weightSet) 
+            for weightSet in weightSets):
+        log = logging.getLogger('scheduler.schedule')
+        errorMessage = ('The weightSets must be a non empty list of dicts'
+            + ' with the keys {}').format(weightKeys)
+        log.error(errorMessage)
+        log.error('Raising ValueError')
+        raise ValueError(errorMessage)
+    return weightSets
+
+def checkAlternatives(alternatives, weightSets=None):
+    '''Check the alternatives argument of the schedule function
+
+    Raises:
+        ValueError if they are not valid, or weightSets are also given
+    '''
+    if not isinstance(alternatives, dict) \
+            or not isInt(alternatives.get('count', None)) \
+            or alternatives['count'] < 1 \
+            or not isInt(alternatives.get('minDistance', None)) \
+            or alternatives['minDistance'] < 1 \
+            or not isinstance(alternatives.get('maxGap', 0), (int, float)) \
+            or alternatives.get('maxGap', 0) < 0 \
+            or weightSets is not None:
+        log = logging.getLogger('scheduler.schedule')
+        errorMessage = ('The alternatives must be a dict with a positive'
+            + ' count and minDistance, and an optional non negative '
+            + 'maxGap. They cannot be given with weightSets')
+        log.error(errorMessage)
+        log.error('Raising ValueError')
+        raise ValueError(errorMessage)
+
+def getDaysOfMonth(year, month, dayConfs):
+    '''Return the days of a month, checking that there is a day
+    configuration for each of them
+
+    Args:
+        year, month: ints
+        dayConfs: the list of dayConfigurations of the calendar, sorted
+            by day number
+
+    Returns:
+        A list with a datetime.date object for each day of the month
+
+    Raises:
+        ValueError if the dayConfs do not match the days of the month
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    # The calendar object will be used to iterate over the days of a month
+    calendar = calendarLib.Calendar()
+
+    # The function itermonthdates will not only return the dates in the
+    # specified month, but also all days before the start of the month or
+    # after the end of the month that are required to get a complete week.
+    # Each elemnt of daysOfMonth will be a datetime.date object
+    daysOfMonth = [day for day in calendar.itermonthdates(year, month)
+                    if day.month == month]
+
+    # Check all needed days are present
+    if len(daysOfMonth) != len(dayConfs):
+        errorMessage = ('The number of expected days for {}-{} is {}, but the '
+            + 'number of days given was {}').format(year, month,
+            len(daysOfMonth), len(dayConfs))
+        log.error(errorMessage)
+        log.error('Raising ValueError')
+        raise ValueError(errorMessage)
+    for day, dayConf in zip(daysOfMonth, dayConfs):
+        if day.day != dayConf['day']:
+            errorMessage = ('Missing the day {} in the day configurations of '
+                + 'the calendar').format(day.day)
+            log.error(errorMessage)
+            log.error('Raising ValueError')
+            raise ValueError(errorMessage)
+    return daysOfMonth
+
+def getAbsences(doctors, daysOfMonth):
+    '''Return the days of the month in which each doctor is absent
+
+    Args:
+        doctors: see the schedule function. The start and end of the 
+            absences are both included
+        daysOfMonth: see getDaysOfMonth
+
+    Returns:
+        A list of tuples as (docId, dayNum)
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    absences = []
+    for doctor in doctors:
+        absence = doctor.get('absence', None)
+        if not absence:
+            continue
+        start = datetime.date.fromisoformat(absence['start'])
+        end = datetime.date.fromisoformat(absence['end'])
+        absentDays = [day.day for day in daysOfMonth if start <= day <= end]
+        if absentDays:
+            log.info('The doctor %s is absent the days %s', doctor['id'], 
+                absentDays)
+        absences.extend((doctor['id'], dayNum) for dayNum in absentDays)
+    return absences
+
+def getCycleShifts(*, doctors, shiftConfsDict, daysOfMonth, cycleShiftRate,
+        absences=()):
+    '''Return the cycle-shifts of the doctors in a month
+
+    Keyword Args:
+        doctors: see the schedule function
+        shiftConfsDict: a dict mapping each doctor id to its shiftConf
+        daysOfMonth: see getDaysOfMonth
+        cycleShiftRate: the number of days between two cycle-shifts of
+            the same doctor
+        absences: optional. See getAbsences. Doctors do not have 
+            cycle-shifts while they are absent
+
+    Returns:
+        A dict mapping each day number to the list of ids of the doctors
+        with a cycle-shift that day
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    debug = log.isEnabledFor(logging.DEBUG)
+    numDaysInMonth = len(daysOfMonth)
+    # TODO Cycle changes need to be taken into account
+    cycleShifts = {day.day: [] for day in daysOfMonth}
+    absences = set(absences)
+    firstDayOfMonth = daysOfMonth[0]
+    for doctor in doctors:
+        docId = doctor['id']
+        shiftConf = shiftConfsDict.get(docId, None)
+        doesCycleShifts = False
+        if shiftConf is None:
+            log.warning('The doctor %s does not have a shift configuration '
+                'assuming the doctor does cycle shifts', docId)
+            doesCycleShifts = True
+        elif shiftConf['doesCycleShifts']:
+            doesCycleShifts = True
+        if doesCycleShifts:
+            startDate = datetime.date.fromisoformat(doctor['startDate'])
+            difference = (firstDayOfMonth - startDate).days % cycleShiftRate
+            if difference == 0:
+                firstCycleShift = firstDayOfMonth
+            else:
+                firstCycleShift = firstDayOfMonth \
+                    + datetime.timedelta(days=cycleShiftRate-difference)
+            if debug:
+                log.debug('The start date of the doctor %s is %s, so their '
+                    'first cycle shift is %s', docId, startDate,
+                    firstCycleShift)
+            # Index used to generate the cycle-shifts of this doctor
+            i = firstCycleShift.day
+            while i <= numDaysInMonth:
+                if (docId, i) not in absences:
+                    cycleShifts[i].append(docId)
+                i += cycleShiftRate
+    return cycleShifts
+
+def getForcedCycleShifts(*, cycleShifts, shiftConfsDict, workingDays):
+    '''Return the cycle-shifts that force a shift in the schedule
+
+    A doctor with a cycle-shift has to have a shift that day, unless 
+    they do not have a shift configuration or do not have 
+    non-cycle-shifts (maxShifts is 0 and hasShiftsOnlyWhenCycleShifts is
+    False)
+
+    Keyword Args:
+        cycleShifts: a dict mapping each day number to the list of ids of
+            the doctors with a cycle-shift that day
+        shiftConfsDict: a dict mapping each doctor id to its shiftConf
+        workingDays: a list of the numbers of the working days
+
+    Returns:
+        A list of tuples as (docId, dayNum)
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    debug = log.isEnabledFor(logging.DEBUG)
+    forcedCycleShifts = []
+    for dayNum in workingDays:
+        for docId in cycleShifts[dayNum]:
+            shiftConf = shiftConfsDict.get(docId, None)
+            doesNonCycleShifts = True
+            if shiftConf is None:
+                log.warning('The doctor %s does not have a shift '
+                    'configuration. Assuming they do NOT have '
+                    'non-cycle-shifts', docId)
+                doesNonCycleShifts = False
+            elif shiftConf['maxShifts'] == 0 \
+                and not shiftConf['hasShiftsOnlyWhenCycleShifts']:
+                if debug:
+                    log.debug('The doctor %s does not have non-cycle-shifts',
+                        docId)
+                doesNonCycleShifts = False
+            if doesNonCycleShifts:
+                forcedCycleShifts.append((docId, dayNum))
+    return forcedCycleShifts
+
+def getFixedAssignments(*, shiftConfsDict, workingDays, required, 
+        forcedCycleShifts, absences):
+    '''Return the shifts and consultations whose value is known before 
+    solving, so that they are constants in the model
+
+    These are:
+        - The cycle-shifts that force a shift, and the mandatory shifts.
+          The doctor has a shift and no consultation
+        - The unavailable shifts. The doctor does not have a shift, but 
+          can have a consultation
+        - The absences. The doctor has neither a shift nor a 
+          consultation
+    Absences take precedence over mandatory shifts, and unavailable 
+    shifts take precedence over mandatory shifts, but not over 
+    cycle-shifts
+
+    Keyword Args:
+        shiftConfsDict: a dict mapping each doctor id to its shiftConf
+        workingDays: a list of the numbers of the working days
+        required: the shift preferences ('mandatoryShifts', 
+            'unavailableShifts'). See getShiftPreferences
+        forcedCycleShifts: see getForcedCycleShifts
+        absences: see getAbsences
+
+    Returns:
+        A tuple as (fixedShifts, fixedConsultations). Both are dicts 
+        mapping (docId, dayNum) to 0 or 1. Only doctors with a shift 
+        configuration are included
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    fixedShifts = {}
+    fixedConsultations = {}
+    workingDaySet = set(workingDays)
+    for docId, dayNum in absences:
+        if dayNum in workingDaySet and docId in shiftConfsDict:
+            fixedShifts[docId, dayNum] = 0
+            fixedConsultations[docId, dayNum] = 0
+    forced = set(forcedCycleShifts)
+    for docId, dayNum in forcedCycleShifts:
+        fixedShifts[docId, dayNum] = 1
+        fixedConsultations[docId, dayNum] = 0
+    for dayNum in workingDays:
+        mandatoryIds, unavailableIds = required[dayNum]
+        for docId in unavailableIds:
+            if (docId, dayNum) in forced:
+                log.warning('The doctor %s is unavailable the day %s, but '
+                    'has a cycle-shift. Ignoring it', docId, dayNum)
+            elif docId in shiftConfsDict:
+                fixedShifts[docId, dayNum] = 0
+        for docId in mandatoryIds:
+            if docId not in shiftConfsDict:
+                log.warning('The doctor %s has a mandatory shift the day %s,'
+                    ' but does not have a shift configuration. Ignoring it',
+                    docId, dayNum)
+                continue
+            value = fixedShifts.get((docId, dayNum), None)
+            if value == 0:
+                log.warning('The doctor %s has a mandatory shift the day %s,'
+                    ' but is unavailable or absent. Ignoring it', docId, 
+                    dayNum)
+                continue
+            fixedShifts[docId, dayNum] = 1
+            fixedConsultations[docId, dayNum] = 0
+    return fixedShifts, fixedConsultations
+
+def checkFeasibility(*, shiftConfs, dayConfs, workingDays, fixedShifts,
+        fixedConsultations):
+    '''Look for inputs that make it impossible to generate a schedule
+
+    This is a fast check that only uses counts, so some infeasible 
+    inputs are not detected (see explainInfeasibility for those). It 
+    checks that:
+        - Each doctor can have between their minShifts and maxShifts,
+          including their cycle-shifts and mandatory shifts, and 
+          excluding the days they are unavailable
+        - Each day has enough available doctors for its shifts and 
+          consultations
+        - The doctors can cover all the shifts and consultations of the
+          month
+
+    Keyword Args:
+        shiftConfs: see the schedule function
+        dayConfs: the list of dayConfigurations, sorted by day number
+        workingDays: a list of the numbers of the working days
+        fixedShifts, fixedConsultations: see getFixedAssignments
+
+    Returns:
+        A list of issues found. Each issue is a dict with the keys 
+        'constraint' (the kind of constraint that cannot be satisfied), 
+        'message', and 'doctorId' or 'day' if the issue is about a 
+        doctor or a day. E.g.
+            {'constraint': 'dayShifts', 'day': 3, 'message': '...'}
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    issues = []
+    numWorkingDays = len(workingDays)
+    # The number of forced and unavailable shifts of each doctor, and the
+    # number of doctors without shifts (or absent) each day
+    numForcedShifts = {}
+    numUnavailableShifts = {}
+    numAbsences = {}
+    unavailableByDay = {}
+    absentByDay = {}
+    for (docId, dayNum), value in fixedShifts.items():
+        if value:
+            numForcedShifts[docId] = numForcedShifts.get(docId, 0) + 1
+            continue
+        numUnavailableShifts[docId] = numUnavailableShifts.get(docId, 0) + 1
+        unavailableByDay[dayNum] = unavailableByDay.get(dayNum, 0) + 1
+        if fixedConsultations.get((docId, dayNum), None) == 0:
+            numAbsences[docId] = numAbsences.get(docId, 0) + 1
+            absentByDay[dayNum] = absentByDay.get(dayNum, 0) + 1
+
+    # The maximum number of shifts and consultations of each doctor
+    capacity = 0
+    consultationCapacity = 0
+    for shiftConf in shiftConfs:
+        docId = shiftConf['doctorId']
+        availableDays = numWorkingDays - numAbsences.get(docId, 0)
+        if shiftConf['hasShiftsOnlyWhenCycleShifts']:
+            # Their number of shifts is not limited
+            capacity += availableDays
+            continue
+        minShifts = shiftConf['minShifts']
+        maxShifts = shiftConf['maxShifts']
+        availableShiftDays = numWorkingDays \
+            - numUnavailableShifts.get(docId, 0)
+        if minShifts > maxShifts:
+            issues.append({'constraint': 'minShifts', 'doctorId': docId,
+                'message': ('The doctor {} has a minShifts of {}, greater '
+                    + 'than their maxShifts of {}').format(docId, minShifts, 
+                    maxShifts)})
+        if minShifts > availableShiftDays:
+            issues.append({'constraint': 'minShifts', 'doctorId': docId,
+                'message': ('The doctor {} has a minShifts of {}, but they '
+                    + 'can only have shifts {} working days').format(docId, 
+                    minShifts, availableShiftDays)})
+        if numForcedShifts.get(docId, 0) > maxShifts:
+            issues.append({'constraint': 'maxShifts', 'doctorId': docId,
+                'message': ('The doctor {} has {} cycle-shifts and mandatory '
+                    + 'shifts, but their maxShifts is {}').format(docId, 
+                    numForcedShifts[docId], maxShifts)})
+        doctorCapacity = max(0, min(maxShifts, availableDays))
+        capacity += doctorCapacity
+        consultationCapacity += min(shiftConf['numConsultations'], 
+            doctorCapacity)
+
+    # Doctors with consultations cannot have a shift the same day
+    numDoctors = len(shiftConfs)
+    numConsultationDoctors = sum(1 for shiftConf in shiftConfs 
+        if shiftConf['numConsultations'] > 0)
+    demand = 0
+    consultationDemand = 0
+    for dayNum in workingDays:
+        dayConf = dayConfs[dayNum-1]
+        numShifts = dayConf['numShifts']
+        numConsultations = dayConf['numConsultations']
+        demand += numShifts + numConsultations
+        consultationDemand += numConsultations
+        numAvailableDoctors = numDoctors - absentByDay.get(dayNum, 0)
+        numShiftDoctors = numDoctors - unavailableByDay.get(dayNum, 0)
+        if numConsultations > numConsultationDoctors:
+            issues.append({'constraint': 'dayConsultations', 'day': dayNum,
+                'message': ('The day {} needs {} consultations, but only {} '
+                    + 'doctors do consultations').format(dayNum, 
+                    numConsultations, numConsultationDoctors)})
+        elif numShifts + numConsultations > numAvailableDoctors:
+            issues.append({'constraint': 'dayShifts', 'day': dayNum,
+                'message': ('The day {} needs {} shifts and {} '
+                    + 'consultations, but there are only {} available '
+                    + 'doctors').format(dayNum, numShifts, numConsultations,
+                    numAvailableDoctors)})
+        elif numShifts > numShiftDoctors:
+            issues.append({'constraint': 'dayShifts', 'day': dayNum,
+                'message': ('The day {} needs {} shifts, but only {} '
+                    + 'doctors can have a shift that day').format(dayNum, 
+                    numShifts, numShiftDoctors)})
+
+    if consultationDemand > consultationCapacity:
+        issues.append({'constraint': 'consultationCapacity',
+            'message': ('The month needs {} consultations, but the doctors '
+                + 'can do at most {}').format(consultationDemand, 
+                consultationCapacity)})
+    if demand > capacity:
+        issues.append({'constraint': 'capacity',
+            'message': ('The month needs {} shifts and consultations, but '
+                + 'the doctors can do at most {}').format(demand, capacity)})
+
+    for issue in issues:
+        log.error('Infeasible inputs: %s', issue['message'])
+    return issues
+
+def explainInfeasibility(model, labeledConstraints, solverParameters, 
+        maxTimeInSeconds):
+    '''Find a minimal set of constraints that cannot be satisfied 
+    together
+
+    Each labeled constraint is enforced by a new literal, and the model
+    is solved assuming all the literals are true. The solver returns a 
+    subset of the literals that is enough to prove the model infeasible,
+    which is then minimized removing one literal at a time. If the model
+    is still infeasible without a literal, it is not needed. 
+
+    The model is modified, so it cannot be used to search for schedules
+    afterwards
+
+    Args:
+        model: the infeasible CpModel
+        labeledConstraints: a list of tuples as (Constraint, issue). The
+            issue is a dict describing the constraint (see 
+            checkFeasibility). Constraints with the same issue object 
+            are enforced by the same literal. The rest of constraints 
+            are assumed to always hold
+        solverParameters: the parameters of the solver, as returned by
+            getSolverParameters
+        maxTimeInSeconds: the maximum time spent in the search. If it is
+            reached, the set found may not be minimal
+
+    Returns:
+        A list with the issues of the conflicting constraints. It is 
+        empty if no conflict among the labeled constraints is found
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    start = time.perf_counter()
+    literals = []
+    issues = {}
+    issueLiterals = {}
+    for constraint, issue in labeledConstraints:
+        literal = issueLiterals.get(id(issue), None)
+        if literal is None:
+            literal = model.NewBoolVar('assumption_{}'.format(len(literals)))
+            issueLiterals[id(issue)] = literal
+            literals.append(literal)
+            issues[literal.Index()] = issue
+        constraint.OnlyEnforceIf(literal)
+    # Any solution proves the assumptions can be satisfied
+    diagnosisParameters = dict(solverParameters)
+    diagnosisParameters['stop_after_first_solution'] = True
+
+    def isInfeasible(assumptions):
+        remainingTime = maxTimeInSeconds - (time.perf_counter() - start)
+        if remainingTime <= 0:
+            return None
+        diagnosisParameters['max_time_in_seconds'] = min(remainingTime,
+            diagnosisParameters.get('max_time_in_seconds', remainingTime))
+        model.ClearAssumptions()
+        model.AddAssumptions(assumptions)
+        solver = cp_model.CpSolver()
+        setSolverParameters(solver.parameters, diagnosisParameters)
+        status = solver.Solve(model)
+        if status != cp_model.INFEASIBLE:
+            return None
+        return set(solver.SufficientAssumptionsForInfeasibility())
+
+    sufficient = isInfeasible(literals)
+    if not sufficient:
+        log.warning('No conflicting constraints found')
+        return []
+    conflict = [literal for literal in literals 
+        if literal.Index() in sufficient]
+    log.info('Minimizing a conflict of %d constraints', len(conflict))
+    i = 0
+    while i < len(conflict):
+        candidate = conflict[:i] + conflict[i+1:]
+        sufficient = isInfeasible(candidate)
+        if sufficient is None:
+            # The constraint is needed (or there was no time to know)
+            i += 1
+        else:
+            # The constraints before i are still needed, so they are kept
+            # even if the solver did not use them. The ones after i are
+            # only kept if they are in the sufficient set, and the next 
+            # one to be tested is now at i
+            conflict = conflict[:i] + [literal for literal in conflict[i+1:]
+                if literal.Index() in sufficient]
+    log.info('Found a conflict of %d constraints in %.3fs', len(conflict), 
+        time.perf_counter() - start)
+    return [issues[literal.Index()] for literal in conflict]
+
+def getDecompositionBlocks(daysOfMonth, workingDays, *, weeksPerBlock):
+    '''Split the working days of a month into blocks of whole weeks
+
+    Blocks with less than DECOMPOSITION_MIN_BLOCK_DAYS working days (e.g.
+    the last days of the month) are merged into the previous block, or
+    into the next one if it is the first block
+
+    Args:
+        daysOfMonth: see getDaysOfMonth
+        workingDays: a list of the numbers of the working days
+
+    Keyword Args:
+        weeksPerBlock: the number of calendar weeks of each block
+
+    Returns:
+        A list of blocks. Each block is a list of day numbers
+    '''
+    weekOfDay = {day.day: (day.toordinal() - daysOfMonth[0].toordinal() 
+        + daysOfMonth[0].weekday()) // 7 for day in daysOfMonth}
+    blocks = []
+    currentBlock = None
+    for dayNum in workingDays:
+        blockNum = weekOfDay[dayNum] // weeksPerBlock
+        if currentBlock is None or currentBlock[0] != blockNum:
+            currentBlock = (blockNum, [])
+            blocks.append(currentBlock)
+        currentBlock[1].append(dayNum)
+    blocks = [block for _, block in blocks]
+    i = 0
+    while len(blocks) > 1 and i < len(blocks):
+        if len(blocks[i]) >= DECOMPOSITION_MIN_BLOCK_DAYS:
+            i += 1
+        elif i == 0:
+            blocks[1] = blocks[0] + blocks[1]
+            del blocks[0]
+        else:
+            blocks[i-1] += blocks[i]
+            del blocks[i]
+    return blocks
+
+def prorate(total, sizes, offset=0):
+    '''Split total into integer shares proportional to sizes
+
+    The shares add up to total. The units left after rounding down are
+    given to the largest remainders, breaking ties starting from the 
+    share offset, so that different offsets get their extra units in
+    different shares
+
+    Returns:
+        A list of ints, one for each size
+    '''
+    totalSize = sum(sizes)
+    if totalSize == 0:
+        return [0] * len(sizes)
+    shares = [total * size // totalSize for size in sizes]
+    order = sorted(range(len(sizes)), key=lambda b: 
+        (-(total * sizes[b] % totalSize), (b - offset) % len(sizes)))
+    for b in order[:total - sum(shares)]:
+        shares[b] += 1
+    return shares
+
+def getBlockShiftConfs(shiftConfs, blocks, forcedShifts):
+    '''Prorate the monthly bounds of each doctor among the blocks
+
+    The minShifts, maxShifts and numConsultations of each doctor are 
+    split in proportion to the working days of each block (see prorate),
+    so that schedules respecting the bounds of every block also respect
+    the monthly ones. The maxShifts of a block is raised when needed to 
+    fit its minShifts and the forced shifts of the doctor in it
+
+    Args:
+        shiftConfs: see the schedule function
+        blocks: see getDecompositionBlocks
+        forcedShifts: a list of tuples as (docId, dayNum) with the 
+            cycle-shifts and mandatory shifts. See getFixedAssignments
+
+    Returns:
+        A list with the list of shiftConfs of each block
+    '''
+    sizes = [len(block) for block in blocks]
+    blockOfDay = {dayNum: b for b, block in enumerate(blocks) 
+        for dayNum in block}
+    numForcedShifts = {}
+    for docId, dayNum in forcedShifts:
+        key = (docId, blockOfDay[dayNum])
+        numForcedShifts[key] = numForcedShifts.get(key, 0) + 1
+    blockShiftConfs = [[] for _ in blocks]
+    for i, shiftConf in enumerate(shiftConfs):
+        docId = shiftConf['doctorId']
+        minShifts = prorate(shiftConf['minShifts'], sizes, i)
+        maxShifts = prorate(shiftConf['maxShifts'], sizes, i)
+        numConsultations = prorate(shiftConf['numConsultations'], sizes, i)
+        for b in range(len(blocks)):
+            blockMaxShifts = maxShifts[b]
+            if shiftConf['maxShifts'] > 0:
+                blockMaxShifts = max(blockMaxShifts, minShifts[b], 
+                    numForcedShifts.get((docId, b), 0))
+            blockShiftConfs[b].append(dict(shiftConf, 
+                minShifts=minShifts[b], maxShifts=blockMaxShifts, 
+                numConsultations=numConsultations[b]))
+    return blockShiftConfs
+
+def getBlockCalendar(calendarDict, block):
+    '''Return a copy of the calendarDict where only the days of the block
+    are working days'''
+    blockDays = set(block)
+    return dict(calendarDict, dayConfigurations=[
+        dict(dayConf, isWorkingDay=dayConf['isWorkingDay'] 
+            and dayConf['day'] in blockDays)
+        for dayConf in calendarDict['dayConfigurations']])
+
+def stitchBlockSchedules(blockSchedules, blocks, dayConfs):
+    '''Join the schedules of the blocks into the schedule of the month
+
+    Args:
+        blockSchedules: a list with the schedule dict of each block
+        blocks: see getDecompositionBlocks
+        dayConfs: the dayConfigurations of the month, sorted by day
+
+    Returns:
+        A schedule dict. Each working day is taken from the schedule of
+        its block, and the rest of days from the first schedule
+    '''
+    blockOfDay = {dayNum: b for b, block in enumerate(blocks) 
+        for dayNum in block}
+    stitched = dict(blockSchedules[0])
+    stitched['days'] = [dict(
+        blockSchedules[blockOfDay.get(dayConf['day'], 0)]['days'][i], 
+        isWorkingDay=dayConf['isWorkingDay']) 
+        for i, dayConf in enumerate(dayConfs)]
+    return stitched
+
+def getBoundViolations(schedule, shiftConfs):
+    '''Return the ids of the doctors whose number of shifts or 
+    consultations in the schedule is not within their bounds
+
+    Only the minShifts, maxShifts and numConsultations of the doctors are
+    checked. See the schedule function
+    '''
+    numShifts = {}
+    numConsultations = {}
+    for day in schedule['days']:
+        for doctor in day['shifts']:
+            numShifts[doctor['id']] = numShifts.get(doctor['id'], 0) + 1
+        for doctor in day['consultations']:
+            numConsultations[doctor['id']] = \
+                numConsultations.get(doctor['id'], 0) + 1
+    violations = []
+    for shiftConf in shiftConfs:
+        if shiftConf['hasShiftsOnlyWhenCycleShifts']:
+            continue
+        docId = shiftConf['doctorId']
+        shifts = numShifts.get(docId, 0)
+        consultations = numConsultations.get(docId, 0)
+        if shifts < shiftConf['minShifts'] \
+                or shifts + consultations > shiftConf['maxShifts'] \
+                or consultations > shiftConf['numConsultations']:
+            violations.append(docId)
+    return violations
+
+def isOptimal(stats):
+    '''Return whether the stats of a schedule (see the collectStats 
+    argument of the schedule function) show that it is optimal
+
+    Heuristic and decomposed schedules are never optimal, as the month 
+    as a whole is not solved to optimality (a decomposed schedule can be
+    worse than the one of the whole month even if all of its blocks are
+    optimal)
+    '''
+    if stats.get('heuristic', False) or 'decomposition' in stats:
+        return False
+    return stats['status'] == 'OPTIMAL'
+
+def scheduleDecomposed(doctors, shiftConfs, calendarDict, schedulerConf, *,
+        decomposition, onSolution=None, solverParameters=None, 
+        collectStats=False, stopEvent=None):
+    '''Generate a schedule solving each block of weeks of the month as an
+    independent problem
+
+    The blocks are solved in parallel in a pool of processes, with the 
+    monthly bounds of the doctors prorated among them (see 
+    getBlockShiftConfs). A block that cannot be solved with its prorated
+    bounds is solved again with the monthly ones (only its minShifts is
+    removed). The schedules of the blocks are then stitched together 
+    and, if some doctors do not respect their monthly bounds, their 
+    shifts are re-scheduled keeping the rest of the stitched schedule 
+    (see the incremental argument of the schedule function). If that 
+    fails, the whole month is solved using the stitched schedule as a 
+    repaired hint.
+
+    Args:
+        doctors, shiftConfs, calendarDict, schedulerConf: see the 
+            schedule function
+
+    Keyword Args:
+        decomposition: a dict with the optional keys:
+            weeksPerBlock: the number of weeks of each block. Defaults
+                to DEFAULT_DECOMPOSITION_WEEKS_PER_BLOCK
+            processes: the number of processes solving blocks at the 
+                same time. Defaults to the number of blocks, limited to
+                the available CPUs. With 1, the blocks are solved in 
+                this process
+        onSolution: see the schedule function. Only the solutions of the
+            final repair are reported
+        solverParameters, collectStats: see the schedule function. 
+            Unless num_search_workers is given, the available CPUs are 
+            split among the processes
+        stopEvent: see the schedule function. It only stops the solves
+            done in this process (the blocks solved in a pool of 
+            processes run until their own limits)
+
+    Returns:
+        See the schedule function. If collectStats is True, the 'stats'
+        have the phases 'decomposition', 'blocks', 'stitching' and 
+        'repair' (the latter only if needed). The model size and search
+        counters are added over all the solves, the bestBound and gap 
+        are None (the decomposition does not prove any bound), and an 
+        additional key 'decomposition' has the keys:
+            blocks: the list of day numbers of each block
+            blockStatuses: the status of the solve of each block
+            relaxedBlocks: the indexes of the blocks solved again with 
+                the monthly bounds
+            repairedDoctors: the ids of the doctors re-scheduled after 
+                stitching
+    '''
+    log = logging.getLogger('scheduler.schedule')
+    timer = statsLib.PhaseTimer()
+    timer.startPhase('decomposition')
+    checkInputs(doctors, shiftConfs, calendarDict)
+    dayConfs = sorted(calendarDict['dayConfigurations'], 
+                        key=lambda day: day['day'])
+    daysOfMonth = getDaysOfMonth(calendarDict['year'], calendarDict['month'],
+        dayConfs)
+    cycleShiftRate = getConfiguration(schedulerConf, 'cycleShiftRate',
+        default=DEFAULT_CYCLE_SHIFT_RATE)
+    shiftConfsDict = {shiftConf['doctorId']: shiftConf 
+        for shiftConf in shiftConfs}
+    absences = getAbsences(doctors, daysOfMonth)
+    cycleShifts = getCycleShifts(doctors=doctors, 
+        shiftConfsDict=shiftConfsDict, daysOfMonth=daysOfMonth, 
+        cycleShiftRate=cycleShiftRate, absences=absences)
+    workingDays = [dayConf['day'] for dayConf in dayConfs 
+        if dayConf['isWorkingDay']]
+    forcedCycleShifts = getForcedCycleShifts(cycleShifts=cycleShifts, 
+        shiftConfsDict=shiftConfsDict, workingDays=workingDays)
+    required = getShiftPreferences(shiftConfs=shiftConfs, dayConfs=dayConfs,
+        keys=('mandatoryShifts', 'unavailableShifts'), 
+        daysOfMonth=daysOfMonth)
+    fixedShifts, _ = getFixedAssignments(shiftConfsDict=shiftConfsDict, 
+        workingDays=workingDays, required=required, 
+        forcedCycleShifts=forcedCycleShifts, absences=absences)
+    blocks = getDecompositionBlocks(daysOfMonth, workingDays, 
+        weeksPerBlock=decomposition.get('weeksPerBlock', 
+            DEFAULT_DECOMPOSITION_WEEKS_PER_BLOCK))
+    if len(blocks) < 2:
+        log.info('The month cannot be split into blocks. Solving it as a '
+            'whole')
+        return schedule(doctors, shiftConfs, calendarDict, schedulerConf,
+            onSolution=onSolution, solverParameters=solverParameters,
+            collectStats=collectStats, stopEvent=stopEvent)
+    blockShiftConfs = getBlockShiftConfs(shiftConfs, blocks, 
+        [key for key, value in fixedShifts.items() if value])
+    blockCalendars = [getBlockCalendar(calendarDict, block) 
+        for block in blocks]
+    cpus = getAvailableCpus()
+    processes = decomposition.get('processes', None) \
+        or min(len(blocks), cpus)
+    # Failures of the blocks and of the repair are handled here, so their
+    # infeasibility is not diagnosed
+    blockConf = dict(schedulerConf, 
+        infeasibilityDiagnosisMaxTimeInSeconds={'value': 0})
+    blockParameters = dict(solverParameters or {})
+    blockParameters.setdefault('num_search_workers', 
+        max(1, cpus // processes))
+    log.info('Solving %d blocks in %d processes with %d CP-SAT workers '
+        'each', len(blocks), processes, blockParameters['num_search_workers'])
+
+    timer.startPhase('blocks')
+    if processes == 1:
+        blockSchedules = [schedule(doctors, blockShiftConfs[b], 
+            blockCalendars[b], blockConf, 
+            solverParameters=blockParameters, collectStats=collectStats,
+            stopEvent=stopEvent) 
+            for b in range(len(blocks))]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=processes) as pool:
+            futures = [pool.submit(schedule, doctors, blockShiftConfs[b], 
+                blockCalendars[b], blockConf, 
+                solverParameters=blockParameters, collectStats=collectStats)
+                for b in range(len(blocks))]
+            blockSchedules = [future.result() for future in futures]
+    relaxedBlocks = []
+    for b, blockSchedule in enumerate(blockSchedules):
+        if blockSchedule['status'] != 'GENERATION_ERROR':
+            continue
+        log.warning('The block %d (days %s) could not be solved with its '
+            'prorated bounds. Solving it with the monthly bounds', b, 
+            blocks[b])
+        relaxedBlocks.append(b)
+        blockSchedules[b] = schedule(doctors, [dict(shiftConf, minShifts=0)
+            for shiftConf in shiftConfs], blockCalendars[b], blockConf,
+            solverParameters=blockParameters, collectStats=collectStats,
+            stopEvent=stopEvent)
+        if blockSchedules[b]['status'] == 'GENERATION_ERROR':
+            log.error('The block %d (days %s) cannot be solved. Solving the '
+                'month as a whole', b, blocks[b])
+            return schedule(doctors, shiftConfs, calendarDict, schedulerConf,
+                onSolution=onSolution, solverParameters=solverParameters,
+                collectStats=collectStats, stopEvent=stopEvent)
+
+    timer.startPhase('stitching')
+    generatedSchedule = stitchBlockSchedules(blockSchedules, blocks, 
+        dayConfs)
+    blockStats = [blockSchedule.pop('stats', None) 
+        for blockSchedule in blockSchedules]
+    generatedSchedule.pop('stats', None)
+    repairedDoctors = getBoundViolations(generatedSchedule, shiftConfs)
+    if repairedDoctors:
+        timer.startPhase('repair')
+        log.info('Re-scheduling %d doctors out of their monthly bounds', 
+            len(repairedDoctors))
+        stitchedSchedule = generatedSchedule
+        generatedSchedule = schedule(doctors, shiftConfs, calendarDict, 
+            blockConf, onSolution=onSolution, 
+            solverParameters=solverParameters, collectStats=collectStats, 
+            incremental={'schedule': stitchedSchedule, 
+                'doctors': repairedDoctors}, stopEvent=stopEvent)
+        if generatedSchedule['status'] == 'GENERATION_ERROR':
+            log.warning('The doctors could not be re-scheduled. Solving the '
+                'month with the stitched schedule as a hint')
+            generatedSchedule = schedule(doctors, shiftConfs, calendarDict, 
+                schedulerConf, onSolution=onSolution, 
+                solverParameters=solverParameters, 
+                collectStats=collectStats, hint=stitchedSchedule, 
+                repairHint=True, stopEvent=stopEvent)
+    timer.stop()
+
+    if collectStats:
+        solveStats = [stats for stats in blockStats if stats is not None]
+        repairStats = generatedSchedule.pop('stats', None)
+        if repairStats is not None:
+            solveStats.append(repairStats)
+            status = repairStats['status']
+            objective = repairStats['objective']
+        else:
+            status = 'FEASIBLE'
+            # The objective is a sum over the days, so it is the sum of 
+            # the objectives of the blocks
+            objective = sum(stats['objective'] for stats in blockStats)
+        generatedSchedule['stats'] = {
+            'phases': timer.toDict(),
+            'status': status,
+            'objective': objective,
+            'bestBound': None,
+            'gap': None,
+            'decomposition': {
+                'blocks': blocks,
+                'blockStatuses': [stats['status'] for stats in blockStats],
+                'relaxedBlocks': relaxedBlocks,
+                'repairedDoctors': repairedDoctors
+            }
+        }
+        for key in ('numVariables', 'numConstraints', 'numSolutions', 
+                'numConflicts', 'numBranches'):
+            generatedSchedule['stats'][key] = sum(stats[key] 
+                for stats in solveStats)
+        log.info('Schedule stats: %s', generatedSchedule['stats'])
+    return generatedSchedule
+
+def schedule(doctors, shiftConfs, calendarDict, schedulerConf, *,
+        onSolution=None, solverParameters=None, collectStats=False, 
+        hint=None, repairHint=False, incremental=None, cache=None, 
+        decomposition=None, stopEvent=None, weightSets=None, 
+        modelDumpDir=None, alternatives=None):
     '''Returns the schedule shifts using the given information
 
     Args:
@@ -322,7 +2147,9 @@ def schedule(doctors, shiftConfs, calendarDict, schedulerConf):
 
                 absence: A dict with two keys 'start' and 'end', each
                     having as a value an str represeting a date in ISO 
-                    format. The absence can be None.
+                    format. The absence can be None. The doctor has no
+                    shifts, consultations or cycle-shifts between both
+                    dates (included).
 
             NOTE: All doctors in this list will be assigned 
             cycle-shifts and non-cycle-shifts (according to their 
@@ -371,6 +2198,9 @@ def schedule(doctors, shiftConfs, calendarDict, schedulerConf):
                             {'shift': 'Thursday'},
                             {'shift': 'Tuesday'}
                          ]
+                    Mandatory shifts are always assigned, and 
+                    unavailable shifts are never assigned (unless they
+                    are cycle-shifts). See getFixedAssignments
                 wantedConsultations:
                     Idem as shift preferences, but refer to 
                     consultations.
@@ -429,6 +2259,170 @@ def schedule(doctors, shiftConfs, calendarDict, schedulerConf):
         schedulerConf:
             See the documentation of the getConfiguration function
 
+    Keyword Args:
+        onSolution:
+            Optional. A callable that will be called with each improving
+            schedule found while the search continues. See the
+            ScheduleSolutionCallback class. The search is limited by the
+            maxTimeInSeconds and relativeGapLimit configurations
+
+        solverParameters:
+            Optional. A dict of CP-SAT parameters used only for this 
+            call. They take precedence over the solverParameters 
+            configuration. See the getSolverParameters function.
+            E.g. {'num_search_workers': 2}
+
+        collectStats:
+            Optional. If True, the returned schedule will have an 
+            additional 'stats' key. Defaults to False
+
+        hint:
+            Optional. A schedule dict for the same month (e.g. the 
+            previous schedule, or a draft edited by an administrator), 
+            with the same format as the one returned by this function.
+            Its shifts and consultations are used as the starting point
+            of the search. See the getScheduleHint function
+
+        repairHint:
+            Optional. If True and a hint is given, the hint is first 
+            replaced by the closest feasible schedule, so that it is not
+            discarded by the solver when it is infeasible. See the 
+            repairScheduleHint function. Defaults to False
+
+        incremental:
+            Optional. A dict to re-schedule only the region of the month
+            affected by some changes. All the assignments of the 
+            confirmed schedule outside the region are kept, and only the
+            ones inside it are optimized again (see the 
+            splitIncrementalRegion function). It has the keys:
+                schedule: the confirmed schedule dict for the same month
+                days: optional. A list of the numbers of the changed 
+                    days. E.g. a sick day or a changed 
+                    dayConfiguration
+                doctors: optional. A list of the ids of the changed 
+                    doctors
+                radius: optional. The number of days around the changed
+                    days that can also be changed. Defaults to 0
+                maxRadius: optional. If no schedule is found, the radius
+                    is widened up to this value before giving up. 
+                    Defaults to the radius
+            E.g. {'schedule': confirmedSchedule, 'days': [12], 
+                  'radius': 1, 'maxRadius': 7}
+            If no hint is given, the confirmed schedule is used as the 
+            hint of the region
+
+        cache:
+            Optional. A cache.MemoryScheduleCache or 
+            cache.DiskScheduleCache. If a schedule was already generated
+            for the same inputs, configuration and keyword arguments, it
+            is returned without solving the problem again. Otherwise, 
+            the generated schedule is stored in it if it is optimal (see
+            isOptimal). The search progress is not reported to 
+            onSolution for cached schedules
+
+        decomposition:
+            Optional. A dict to solve each block of weeks of the month 
+            as a separate problem, in parallel processes, and stitch 
+            their schedules together. Useful for departments too large 
+            to be solved as a whole. It is ignored when a hint or 
+            incremental is given. See the scheduleDecomposed function.
+            E.g. {'weeksPerBlock': 1, 'processes': 4}
+
+        stopEvent:
+            Optional. A threading.Event. When it is set (e.g. from 
+            another thread), the search is stopped and the best schedule
+            found so far is returned (with the GENERATION_ERROR status 
+            if none was found, as the heuristicFallback configuration is
+            not used when the stop is requested). Schedules of stopped 
+            searches are not stored in the cache
+
+        weightSets:
+            Optional. A list of dicts, each with some of the weights of 
+            the configuration (wantedShiftWeight, unwantedShiftWeight, 
+            wantedConsultationWeight, allShiftWeight and 
+            consultationWeight). The missing weights are taken from the
+            configuration. The model is built once, and the objective 
+            of each weight set is solved in parallel, splitting the 
+            CP-SAT workers among them. Then, a list is returned instead
+            of a schedule, with a dict for each weight set:
+                {
+                    'weights': {'wantedShiftWeight': 3, ...},
+                    'schedule': {...},
+                    'objectiveTerms': {
+                        'shifts': {'count': 40, 'weight': 1, 
+                                   'contribution': -40},
+                        'wantedShifts': {...},
+                        ...
+                    }
+                }
+            Where the schedule is the one described below, and the 
+            objectiveTerms are the number of assignments counted by 
+            each term of the objective (see OBJECTIVE_TERMS) and their 
+            contribution to it (None if no schedule was found). The 
+            cache, the decomposition and onSolution are not used.
+            E.g. [{'wantedShiftWeight': 1}, {'wantedShiftWeight': 10}]
+
+        modelDumpDir:
+            Optional. The path of a directory in which the built model 
+            is stored before solving it (see the dumpModel function), so
+            that it can be investigated offline with the replay module.
+            The info stored with it is a dict with the keys:
+                year, month: the ones of the calendar
+                weights: the weights of the objective
+                weightSets: the weightSets argument
+                solverParameters: the CP-SAT parameters used
+                variables: a list with a dict for each variable of the 
+                    grid of assignments. E.g.
+                        {'index': 12, 'type': 'shift', 'day': 3, 
+                         'doctorIds': [5]}
+                    Where the type is 'shift' or 'consultation', and the
+                    variable is the number of the doctors with that 
+                    assignment the day (several doctors when they are 
+                    interchangeable, see getEquivalentDoctors)
+                solve: None, and, once the solve finishes, a dict with 
+                    its status, objective, bestBound, wallTime, 
+                    numConflicts and numBranches
+            No input data other than the ids of the doctors is stored.
+            Nothing is stored if the schedule is taken from the cache,
+            and the decomposition is not used
+
+        alternatives:
+            Optional. A dict to generate several near-optimal schedules
+            that differ from each other, for the administrators to 
+            choose from. It has the keys:
+                count: the maximum number of schedules
+                minDistance: the minimum number of assignments (shifts
+                    and consultations of a doctor a day) in which each 
+                    schedule differs from each other
+                maxGap: optional. The maximum relative gap between the
+                    objective of each schedule and the one of the first
+                    (|first - objective| / max(1, |first|)). Defaults to
+                    no limit
+            The model is built once and solved again for each schedule,
+            adding a constraint to be at least minDistance assignments 
+            away from the schedules already found. Each solve is limited
+            by the maxTimeInSeconds and relativeGapLimit configurations,
+            and interchangeable doctors are not aggregated (see 
+            getEquivalentDoctors). Then, a list is returned instead of a
+            schedule, with a dict for each schedule found, in the order
+            they are found:
+                {
+                    'schedule': {...},
+                    'objective': 52.0,
+                    'gap': 0.04,
+                    'distance': 12
+                }
+            Where the schedule is the one described below, the gap is 
+            the relative gap between its objective and the one of the
+            first schedule, and the distance is the minimum number of
+            assignments in which it differs from the previous schedules
+            (None for the first one). Fewer schedules are returned if 
+            no more are found. If none is found, the list only has the
+            GENERATION_ERROR schedule, with None as the objective and 
+            the gap. The cache, the decomposition and onSolution are not
+            used, nor can weightSets be given.
+            E.g. {'count': 3, 'minDistance': 10, 'maxGap': 0.05}
+
     Returns:
         A dict with the following structure (If there has been an error 
         during the generation, STATUS will be GENERATION_ERROR, and 
@@ -476,14 +2470,143 @@ def schedule(doctors, shiftConfs, calendarDict, schedulerConf):
                 ...
             ]
         }
+
+        If STATUS is GENERATION_ERROR, the dict will also contain the 
+        key 'issues', with a list of the constraints that cannot be 
+        satisfied together. It is found by checkFeasibility before 
+        building the model or, if the solver proves there is no 
+        schedule, by explainInfeasibility (limited by the 
+        infeasibilityDiagnosisMaxTimeInSeconds configuration). E.g.
+            'issues': [
+                {'constraint': 'maxShifts', 'doctorId': 3, 
+                 'message': 'The doctor 3 has at most 4 shifts and ...'},
+                {'constraint': 'dayShifts', 'day': 12, 
+                 'message': 'The day 12 has at least 5 shifts'},
+                ...
+            ]
+
+        If the solver found no schedule (e.g. it reached its time limit,
+        or OR-Tools is not installed) and the heuristicFallback 
+        configuration is enabled, the schedule is generated by the 
+        heuristic module instead, and the dict will also contain the key
+        'heuristic' with the value True. These schedules are feasible, 
+        but usually not optimal, and they are not stored in the cache
+
+        If collectStats is True, the dict will also contain the key:
+            'stats': {
+                'phases': {
+                    'validation': {'wallTime': 0.001, 'cpuTime': 0.001},
+                    'preferences': {'wallTime': 0.01, 'cpuTime': 0.01},
+                    'cycleShifts': {...},
+                    'precheck': {...},
+                    'symmetry': {...},
+                    'variables': {...},
+                    'constraints': {...},
+                    'objective': {...},
+                    'solve': {...},
+                    'extraction': {...}
+                },
+                'numVariables': 1200,
+                'numConstraints': 1450,
+                'status': 'OPTIMAL',
+                'objective': 54.0,
+                'bestBound': 54.0,
+                'gap': 0.0,
+                'objectiveTerms': {...},
+                'numSolutions': 7,
+                'numConflicts': 120,
+                'numBranches': 3400
+            }
+        Where each phase has the wall and CPU seconds it took, and the
+        objective, bestBound and gap are None if no solution was found.
+        The objectiveTerms are described in the weightSets argument.
+        If a cache is given, the stats also have the key 'cacheHit'. 
+        When it is True, the stats only contain the 'cache' phase. With
+        a decomposition, the stats are described in scheduleDecomposed
     '''
     log = logging.getLogger('scheduler.schedule')
-    log.debug(('Request to schedule with doctors: {}, shiftConfs: {} '
-        + 'and calendarDict: {}').format(doctors, shiftConfs, calendarDict))
+    if weightSets is not None:
+        weightSets = checkWeightSets(weightSets)
+        if cache is not None or decomposition is not None \
+                or onSolution is not None:
+            log.warning('The cache, the decomposition and onSolution are '
+                'not used with weightSets')
+        cache = decomposition = onSolution = None
+    if alternatives is not None:
+        checkAlternatives(alternatives, weightSets)
+        if cache is not None or decomposition is not None \
+                or onSolution is not None:
+            log.warning('The cache, the decomposition and onSolution are '
+                'not used with alternatives')
+        cache = decomposition = onSolution = None
+    if cache is not None:
+        timer = statsLib.PhaseTimer()
+        timer.startPhase('cache')
+        # The rest of keyword args change the schedule generated
+        cacheKey = cacheLib.getCacheKey(doctors, shiftConfs, calendarDict, 
+            schedulerConf, options={
+                'solverParameters': solverParameters,
+                'hint': hint,
+                'repairHint': repairHint,
+                'incremental': incremental,
+                'decomposition': decomposition
+            })
+        cachedSchedule = cache.get(cacheKey)
+        if cachedSchedule is not None:
+            timer.stop()
+            log.info('Schedule found in the cache with key %s', cacheKey)
+            if collectStats:
+                cachedSchedule['stats'] = {'phases': timer.toDict(), 
+                    'cacheHit': True}
+            return cachedSchedule
+        log.info('Schedule not found in the cache with key %s', cacheKey)
+        # The stats are always collected, as they tell whether the 
+        # schedule is optimal
+        generatedSchedule = schedule(doctors, shiftConfs, calendarDict, 
+            schedulerConf, onSolution=onSolution, 
+            solverParameters=solverParameters, collectStats=True,
+            hint=hint, repairHint=repairHint, incremental=incremental,
+            decomposition=decomposition, stopEvent=stopEvent, 
+            modelDumpDir=modelDumpDir)
+        stopped = stopEvent is not None and stopEvent.is_set()
+        # The schedules found before a time limit (including the 
+        # heuristic ones) could be improved, so they are not stored
+        if generatedSchedule['status'] != 'GENERATION_ERROR' and not stopped \
+                and isOptimal(generatedSchedule['stats']):
+            cachedSchedule = dict(generatedSchedule)
+            # The stats are the ones of this call only
+            cachedSchedule.pop('stats', None)
+            cache.put(cacheKey, cachedSchedule)
+        if collectStats:
+            generatedSchedule['stats']['cacheHit'] = False
+        else:
+            generatedSchedule.pop('stats', None)
+        return generatedSchedule
+
+    if decomposition is not None and modelDumpDir is not None:
+        log.warning('The decomposition is not used when the model is '
+            'dumped')
+        decomposition = None
+    if decomposition is not None:
+        if hint is None and incremental is None:
+            return scheduleDecomposed(doctors, shiftConfs, calendarDict, 
+                schedulerConf, decomposition=decomposition, 
+                onSolution=onSolution, solverParameters=solverParameters,
+                collectStats=collectStats, stopEvent=stopEvent)
+        log.warning('The decomposition is not used with a hint or an '
+            'incremental re-schedule')
+
+    timer = statsLib.PhaseTimer()
+    timer.startPhase('validation')
+    # Checked once, as some messages below are in the hot path
+    debug = log.isEnabledFor(logging.DEBUG)
+    log.debug('Request to schedule with doctors: %s, shiftConfs: %s and '
+        'calendarDict: %s', doctors, shiftConfs, calendarDict)
+    checkInputs(doctors, shiftConfs, calendarDict)
 
     year = calendarDict['year']
     month = calendarDict['month']
-    log.info('Generating schedule for {}-{}'.format(year, month))
+    log.info('Generating schedule for %s-%s', year, month)
 
     # Extract the configuration
     cycleShiftRate = getConfiguration(schedulerConf, 'cycleShiftRate',
@@ -498,312 +2621,853 @@ def schedule(doctors, shiftConfs, calendarDict, schedulerConf):
         default=DEFAULT_ALL_SHIFT_WEIGHT)
     consultationWeight = getConfiguration(schedulerConf, 'consultationWeight',
         default=DEFAULT_CONSULTATION_WEIGHT)
-    log.debug(('The values extracted from the configuration are: '
-        + 'cycleShiftRate={}, wantedShiftWeight={}, unwantedShiftWeight={}, '
-        + 'wantedConsultationWeight={}, allShiftWeight={}, '
-        + 'consultationWeight={}').format(cycleShiftRate, wantedShiftWeight, 
-        unwantedShiftWeight, wantedConsultationWeight, allShiftWeight, 
-        consultationWeight))
+    # The weights of the OBJECTIVE_TERMS
+    weights = {
+        'wantedShiftWeight': wantedShiftWeight,
+        'unwantedShiftWeight': unwantedShiftWeight,
+        'wantedConsultationWeight': wantedConsultationWeight,
+        'allShiftWeight': allShiftWeight,
+        'consultationWeight': consultationWeight
+    }
+    diagnosisMaxTimeInSeconds = getConfiguration(schedulerConf, 
+        'infeasibilityDiagnosisMaxTimeInSeconds', 
+        default=DEFAULT_INFEASIBILITY_DIAGNOSIS_MAX_TIME_IN_SECONDS)
+    aggregateEquivalentDoctors = getConfiguration(schedulerConf, 
+        'aggregateEquivalentDoctors', 
+        default=DEFAULT_AGGREGATE_EQUIVALENT_DOCTORS)
+    heuristicFallback = getConfiguration(schedulerConf, 'heuristicFallback',
+        default=DEFAULT_HEURISTIC_FALLBACK)
+    heuristicHint = getConfiguration(schedulerConf, 'heuristicHint',
+        default=DEFAULT_HEURISTIC_HINT)
+    solverParameters = getSolverParameters(schedulerConf, solverParameters)
+    log.debug('The values extracted from the configuration are: '
+        'cycleShiftRate=%s, wantedShiftWeight=%s, unwantedShiftWeight=%s, '
+        'wantedConsultationWeight=%s, allShiftWeight=%s, '
+        'consultationWeight=%s, solverParameters=%s', cycleShiftRate, 
+        wantedShiftWeight, unwantedShiftWeight, wantedConsultationWeight, 
+        allShiftWeight, consultationWeight, solverParameters)
 
     # The list of dayConfigurations sorted by day number
     dayConfs = sorted(calendarDict['dayConfigurations'], 
                         key=lambda day: day['day'])
-    log.debug('dayConfs after being sorted is {}'.format(dayConfs))
+    log.debug('dayConfs after being sorted is %s', dayConfs)
 
-    # The calendar object will be used to iterate over the days of a month
-    calendar = calendarLib.Calendar()
-
-    # The function itermonthdates will not only return the dates in the 
-    # specified month, but also all days before the start of the month or 
-    # after the end of the month that are required to get a complete week.
-    # Each elemnt of daysOfMonth will be a datetime.date object
-    daysOfMonth = [day for day in calendar.itermonthdates(year, month) 
-                    if day.month == month]
+    daysOfMonth = getDaysOfMonth(year, month, dayConfs)
     numDaysInMonth = len(daysOfMonth)
-    log.debug('The days in this month are {}'.format(daysOfMonth))
-
-    # Check all needed days are present
-    if numDaysInMonth != len(dayConfs):
-        errorMessage = ('The number of expected days for {}-{} is {}, but the '
-            + 'number of days given was {}').format(year, month, 
-            numDaysInMonth, len(dayConfs))
-        log.error(errorMessage)
-        log.error('Raising ValueError')
-        raise ValueError(errorMessage)
-    for day, dayConf in zip(daysOfMonth, dayConfs):
-        if day.day != dayConf['day']:
-            errorMessage = ('Missing the day {} in the day configurations of '
-                + 'the calendar').format(day.day)
-            log.error(errorMessage)
-            log.error('Raising ValueError')
-            raise ValueError(errorMessage)
-
-    # TODO check that, with the given information, a schedule can be 
-    # generated. This is, for example, that the sum of the maxShifts of
-    # all doctors is greater than the sum of the number of shifts there
-    # has to be each day
+    log.debug('The days in this month are %s', daysOfMonth)
 
     # Extract shift preferences
-    requests = getShiftPreferences(shiftConfs=shiftConfs, dayConfs=dayConfs, 
-            keys=('wantedShifts', 'unwantedShifts'), daysOfMonth=daysOfMonth)
-    log.debug('Requested shifts are: {}'.format(requests))
-    required = getShiftPreferences(shiftConfs=shiftConfs, dayConfs=dayConfs, 
-            keys=('mandatoryShifts', 'unavailableShifts'), 
-            daysOfMonth=daysOfMonth)
-    log.debug('Required shifts are: {}'.format(required))
-    requestConsultations = getShiftPreferences(shiftConfs=shiftConfs, 
-            dayConfs=dayConfs, 
-            keys=('wantedConsultations', 'unwantedConsultations'), 
-            daysOfMonth=daysOfMonth)
-    log.debug('Requested consultations are: {}'.format(requestConsultations))
-
+    timer.startPhase('preferences')
+    requestKeys = ('wantedShifts', 'unwantedShifts')
+    requiredKeys = ('mandatoryShifts', 'unavailableShifts')
+    consultationKeys = ('wantedConsultations', 'unwantedConsultations')
+    preferences = getAllShiftPreferences(shiftConfs=shiftConfs, 
+        dayConfs=dayConfs, 
+        keyPairs=(requestKeys, requiredKeys, consultationKeys), 
+        daysOfMonth=daysOfMonth)
+    requests = preferences[requestKeys]
+    log.debug('Requested shifts are: %s', requests)
+    required = preferences[requiredKeys]
+    log.debug('Required shifts are: %s', required)
+    requestConsultations = preferences[consultationKeys]
+    log.debug('Requested consultations are: %s', requestConsultations)
+
+    timer.startPhase('cycleShifts')
     # Generate a dict to relate a doctor's id with their shiftConf
     shiftConfsDict = {shiftConf['doctorId']: shiftConf 
         for shiftConf in shiftConfs}
-    log.debug('The shift configuration dict is: {}'.format(shiftConfs))
+    log.debug('The shift configuration dict is: %s', shiftConfsDict)
 
     # First, generate the cycle shifts
-    # TODO Cycle changes need to be taken into account
-    cycleShifts = {day.day: [] for day in daysOfMonth}
-    firstDayOfMonth = daysOfMonth[0]
-    for doctor in doctors:
-        docId = doctor['id']
-        shiftConf = shiftConfsDict.get(docId, None)
-        doesCycleShifts = False
-        if shiftConf is None:
-            log.warn(f'The doctor {docId} does not have a shift configuration'
-                + ' assuming the doctor does cycle shifts')
-            doesCycleShifts = True 
-        elif shiftConf['doesCycleShifts']:
-            doesCycleShifts = True
-        if doesCycleShifts:
-            startDate = datetime.date.fromisoformat(doctor['startDate'])
-            log.debug('The start date of the doctor {} is {}'
-                .format(docId, startDate))
-            difference = (firstDayOfMonth - startDate).days % cycleShiftRate
-            log.debug('The difference is: {}'.format(difference))
-            if difference == 0:
-                firstCycleShift = firstDayOfMonth
-                day = 0
-            else:
-                firstCycleShift = firstDayOfMonth \
-                    + datetime.timedelta(days=cycleShiftRate-difference)
-            log.debug('The first cycle shift of doctor {} is {}'
-                .format(docId, firstCycleShift))
-            # Index used to generate the cycle-shifts of this doctor
-            i = firstCycleShift.day
-            while i <= numDaysInMonth:
-                cycleShifts[i].append(docId)
-                i += cycleShiftRate
-    log.debug('The cycle shifts are: {}'.format(cycleShifts))
-
-    # TODO add doctors with Absences as unavailable
+    absences = getAbsences(doctors, daysOfMonth)
+    cycleShifts = getCycleShifts(doctors=doctors, 
+        shiftConfsDict=shiftConfsDict, daysOfMonth=daysOfMonth, 
+        cycleShiftRate=cycleShiftRate, absences=absences)
+    log.debug('The cycle shifts are: %s', cycleShifts)
 
     workingDays = [dayConf['day'] for dayConf in dayConfs if dayConf['isWorkingDay']]
-    log.debug('The working days of the month are: {}'.format(workingDays))
-
+    log.debug('The working days of the month are: %s', workingDays)
+    forcedCycleShifts = getForcedCycleShifts(cycleShifts=cycleShifts, 
+        shiftConfsDict=shiftConfsDict, workingDays=workingDays)
+    # These are constants in the model instead of variables
+    fixedShifts, fixedConsultations = getFixedAssignments(
+        shiftConfsDict=shiftConfsDict, workingDays=workingDays, 
+        required=required, forcedCycleShifts=forcedCycleShifts, 
+        absences=absences)
+    log.debug('The fixed shifts are: %s, and the fixed consultations are: '
+        '%s', fixedShifts, fixedConsultations)
+
+    # Check that, with the given information, a schedule can be generated
+    timer.startPhase('precheck')
+    issues = checkFeasibility(shiftConfs=shiftConfs, dayConfs=dayConfs, 
+        workingDays=workingDays, fixedShifts=fixedShifts, 
+        fixedConsultations=fixedConsultations)
+    if issues:
+        timer.stop()
+        generatedSchedule = {
+            'month': month,
+            'year': year,
+            'status': 'GENERATION_ERROR',
+            'days': [],
+            'issues': issues
+        }
+        if collectStats:
+            generatedSchedule['stats'] = {
+                'phases': timer.toDict(),
+                'numVariables': 0,
+                'numConstraints': 0,
+                'status': 'INFEASIBLE',
+                'objective': None,
+                'bestBound': None,
+                'gap': None,
+                'objectiveTerms': None,
+                'numSolutions': 0,
+                'numConflicts': 0,
+                'numBranches': 0
+            }
+        if weightSets is not None:
+            return [{'weights': dict(weights, **weightSet), 
+                    'schedule': copy.deepcopy(generatedSchedule), 
+                    'objectiveTerms': None} 
+                for weightSet in weightSets]
+        if alternatives is not None:
+            return [{'schedule': generatedSchedule, 'objective': None, 
+                'gap': None, 'distance': None}]
+        return generatedSchedule
+
+    # Interchangeable doctors make the solver explore many equivalent 
+    # schedules. Instead, each class of them shares a row of integer 
+    # variables with the number of them having a shift each day. It is 
+    # not done when assignments are given (as hints or fixed values), or
+    # when the assignments of different schedules are compared
+    timer.startPhase('symmetry')
+    doctorClasses = []
+    if aggregateEquivalentDoctors and hint is None and incremental is None \
+            and alternatives is None:
+        doctorClasses = getEquivalentDoctors(shiftConfs=shiftConfs, 
+            preferences=preferences, forcedCycleShifts=forcedCycleShifts,
+            absences=absences)
+        log.info('Found %d classes of interchangeable doctors, with %d '
+            'doctors in total', len(doctorClasses), 
+            sum(len(doctorClass) for doctorClass in doctorClasses))
+    # The indexes in shiftConfs of the doctors of each row
+    rowDoctors = sorted(doctorClasses + [[i] for i in range(len(shiftConfs))
+        if not any(i in doctorClass for doctorClass in doctorClasses)])
+
+    def getHeuristicSchedule(collectHeuristicStats):
+        # Imported here, as the heuristic module imports this one
+        import heuristic
+        return heuristic.schedule(doctors, shiftConfs, calendarDict, 
+            schedulerConf, collectStats=collectHeuristicStats)
+
+    # The fallback is only used when a single schedule is generated from
+    # scratch
+    useHeuristicFallback = heuristicFallback and incremental is None \
+        and weightSets is None and alternatives is None
+
+    timer.startPhase('variables')
+    # Only imported when there is a model to solve
+    try:
+        importSolver()
+    except ImportError:
+        if not useHeuristicFallback:
+            raise
+        log.warning('Generating the schedule with the heuristic, as '
+            'OR-Tools is not available')
+        return getHeuristicSchedule(collectStats)
     model = cp_model.CpModel()
 
-    log.debug('Starting the generation of the boolean variables')
-    '''shiftVars is a dictionary that will contain the BoolVars used in the 
-    model.
-
-    The keys of the dictionary will be tuples as (doctorId, dayNumber)
-
-    The values of the dictionary will be lists of size 1 or 2:
-      - The first element of the list will always be a BoolVar that 
-        represents whether the doctor with id doctorId has a shift the day
-        dayNumber
-      - The second element is optinal. It will only be present if the doctor
-        does consultations. In that case, the element will be another BoolVar
-        that will represent whether the doctor has consultations this 
-        daynumber
+    log.debug('Starting the generation of the variables')
+    '''The variables are laid out densely, with a row for each doctor (or
+    class of interchangeable doctors, see rowDoctors) and a column for 
+    each working day:
+        - shiftGrid[r][j] is a variable that represents how many of the
+          doctors of the row r have a shift the day workingDays[j]. It 
+          is a BoolVar if the row has a single doctor
+        - consultationGrid[r] is None if the doctors of the row r do not
+          do consultations. Otherwise, consultationGrid[r][j] is a 
+          variable that represents how many of them have consultations 
+          the day workingDays[j]
+    The cells whose value is known (see getFixedAssignments), and the
+    consultations of the days without consultations, are int constants
+    instead of variables
+
+    shiftVars is a dictionary with the BoolVars of the rows with a 
+    single doctor, used to look them up by doctor id and day number.
+        The keys of the dictionary will be tuples as (doctorId, dayNumber)
+
+        The values of the dictionary will be lists of size 1 or 2:
+          - The first element of the list will always be a BoolVar that 
+            represents whether the doctor with id doctorId has a shift 
+            the day dayNumber
+          - The second element is optinal. It will only be present if the
+            doctor does consultations. In that case, the element will be
+            the BoolVar that represents whether the doctor has 
+            consultations this daynumber
+        Elements that are constants in the model are None
     '''
+    docIds = [shiftConf['doctorId'] for shiftConf in shiftConfs]
+    docIndexes = {docId: i for i, docId in enumerate(docIds)}
+    docRows = {i: r for r, doctorIndexes in enumerate(rowDoctors) 
+        for i in doctorIndexes}
+    dayIndexes = {dayNum: j for j, dayNum in enumerate(workingDays)}
+    rowSizes = [len(doctorIndexes) for doctorIndexes in rowDoctors]
+    rowConfs = [shiftConfs[doctorIndexes[0]] for doctorIndexes in rowDoctors]
+    shiftGrid = []
+    consultationGrid = []
     shiftVars = {}
-    for shiftConf in shiftConfs:
-        for dayConf in dayConfs:
-            log.debug(('Generating the boolean variables for shiftConfig: '
-                + '{} and dayConfig: {}').format(shiftConf, dayConf))
-            if not dayConf['isWorkingDay']:
-                log.debug('The day is not a working day. Skipping it')
-            else:
-                log.debug('The day is a working day')
-                docId = shiftConf['doctorId']
-                dayNum = dayConf['day']
-                doctorVars = []
-                doctorVars.append(
-                    model.NewBoolVar(f'shift_doc{docId}_day{dayNum}_{SHIFT}')
-                )
-                if shiftConf['numConsultations'] > 0:
-                    doctorVars.append(
-                        model.NewBoolVar(f'shift_doc{docId}_day{dayNum}_{CONSULT}')
-                    )
-                shiftVars[docId, dayNum] = doctorVars
-    log.debug('The shiftVars are: {}'.format(shiftVars))
-
-    for shiftVar in shiftVars.values():
-        log.debug(('A doctor cannot have a shift and a consultation the same '
-            + 'day. Adding the restriction sum({}) <= 1').format(shiftVar))
-        model.Add(sum(shiftVar) <= 1)
-
-    # If a doctor has a cycle-shift, they have to have a shift that day
-    log.debug('Starting the generation of the cycle-shift restrictions')
-    for dayNum in workingDays:
-        for docId in cycleShifts[dayNum]:
-            log.debug('Analyzing the cycle-shifts of doctor {}'.format(docId))
-            shiftConf = shiftConfsDict.get(docId, None)
-            doesNonCycleShifts = True
-            if shiftConf is None:
-                log.warn(('The doctor {} does not have a shift configuration. '
-                    + 'Assuming they do NOT have non-cycle-shifts')
-                    .format(docId))
-                doesNonCycleShifts = False
-            elif shiftConf['maxShifts'] == 0 \
-                and not shiftConf['hasShiftsOnlyWhenCycleShifts']:
-                log.debug('The doctor {} does not have non-cycle-shifts'
-                    .format(docId))
-                doesNonCycleShifts = False
-            if doesNonCycleShifts:
-                log.debug(('The doctor {} has a cycle shift on day {} adding '
-                    + 'the restriction {} == 1').format(docId, dayNum, 
-                    shiftVars[docId, dayNum][0]))
-                model.Add(shiftVars[docId, dayNum][0] == 1)
+    # The doctors of a row have the same fixed values, so the ones of its
+    # first doctor are used for the whole row
+    def newRowCell(rowSize, fixedValue, name):
+        if fixedValue is not None:
+            return fixedValue * rowSize
+        if rowSize == 1:
+            return model.NewBoolVar(name)
+        return model.NewIntVar(0, rowSize, name)
+    consultationDays = {dayNum for dayNum in workingDays 
+        if dayConfs[dayNum-1]['numConsultations'] > 0}
+    for doctorIndexes, rowSize, shiftConf in zip(rowDoctors, rowSizes, 
+            rowConfs):
+        docId = shiftConf['doctorId']
+        rowName = 'doc' + '_'.join(str(docIds[i]) for i in doctorIndexes)
+        shiftRow = [newRowCell(rowSize, fixedShifts.get((docId, dayNum)), 
+                f'shift_{rowName}_day{dayNum}_{SHIFT}')
+            for dayNum in workingDays]
+        consultationRow = None
+        if shiftConf['numConsultations'] > 0:
+            consultationRow = [newRowCell(rowSize, 
+                    fixedConsultations.get((docId, dayNum), 
+                        None if dayNum in consultationDays else 0), 
+                    f'shift_{rowName}_day{dayNum}_{CONSULT}')
+                for dayNum in workingDays]
+        shiftGrid.append(shiftRow)
+        consultationGrid.append(consultationRow)
+        if rowSize > 1:
+            continue
+        for j, dayNum in enumerate(workingDays):
+            cells = [shiftRow[j]] if consultationRow is None \
+                else [shiftRow[j], consultationRow[j]]
+            shiftVars[docId, dayNum] = [None if isinstance(cell, int) 
+                else cell for cell in cells]
+    log.debug('The shiftVars are: %s', shiftVars)
+    numFixedCells = sum(1 for row in shiftGrid + consultationGrid 
+        if row is not None for cell in row if isinstance(cell, int))
+    log.info('%d cells of the model are constants', numFixedCells)
+
+    def describeRow(r):
+        '''Return a tuple as (ids, subject). ids is a dict with the 
+        doctor ids of the row r, and subject is a str used in the 
+        messages of the issues'''
+        rowDocIds = [docIds[i] for i in rowDoctors[r]]
+        if len(rowDocIds) == 1:
+            return ({'doctorId': rowDocIds[0]}, 
+                'The doctor {}'.format(rowDocIds[0]))
+        return ({'doctorIds': rowDocIds}, 'Each of the doctors {}'.format(
+            ', '.join(str(docId) for docId in rowDocIds)))
+
+    timer.startPhase('constraints')
+    # A doctor cannot have a shift and a consultation the same day. It 
+    # already holds when any of them is a constant
+    for shiftRow, consultationRow, rowSize in zip(shiftGrid, 
+            consultationGrid, rowSizes):
+        if consultationRow is not None:
+            for shiftVar, consultationVar in zip(shiftRow, consultationRow):
+                if isinstance(shiftVar, int) \
+                        or isinstance(consultationVar, int):
+                    continue
+                if rowSize == 1:
+                    model.AddAtMostOne([shiftVar, consultationVar])
+                else:
+                    model.Add(shiftVar + consultationVar <= rowSize)
+
+    # The constraints that come from the inputs are labeled with a 
+    # description, used to explain why no schedule can be generated (see
+    # explainInfeasibility)
+    labeledConstraints = []
 
     # Each doctor has a maximum and a minimum number of shifts
     log.debug('Starting the generation of maximum and minimum number of '
         + 'shifts per doctor')
-    for docId, shiftConf in shiftConfsDict.items():
+    for r, (shiftConf, shiftRow, consultationRow) in enumerate(zip(rowConfs,
+            shiftGrid, consultationGrid)):
+        ids, subject = describeRow(r)
+        rowSize = rowSizes[r]
         if shiftConf['hasShiftsOnlyWhenCycleShifts']:
-            log.debug(('Doctor {} only has shifts when cycle-shifts, so no '
-                + 'need to add its maximum and minimum restrictions')
-            .format(docId))
+            if debug:
+                log.debug('%s only has shifts when cycle-shifts, so no need '
+                    'to add its maximum and minimum restrictions', subject)
         else:
-            log.debug(('Creating maximum and minimum shift restrictions for '
-                + 'doctor {} with shiftConf {}').format(docId, shiftConf))
-
-            doctorShiftVars = [shiftVars[docId, dayNum][0] 
-                for dayNum in workingDays]
-            log.debug(('Minimum number of shifts: sum({}) >= {}')
-                .format(doctorShiftVars, shiftConf['minShifts']))
-            model.Add(sum(doctorShiftVars) >= shiftConf['minShifts'])
-
-            # The maximum number of shifts also includes consultations
-            allDoctorVars = [var for dayNum in workingDays 
-                for var in shiftVars[docId, dayNum]]
-            log.debug(('Maximum number of shifts: sum({}) <= {}')
-                .format(allDoctorVars, shiftConf['maxShifts']))
-            model.Add(sum(allDoctorVars) <= shiftConf['maxShifts'])
-
-            # If the doctor has consultations, restrict the number of 
-            # consultations it can have
-            if shiftConf['numConsultations'] > 0:
-                doctorConsultationVars = [shiftVars[docId, dayNum][1] 
-                    for dayNum in workingDays]
-                log.debug(('Minimum number of consultations: sum({}) >= {}')
-                    .format(doctorConsultationVars, 
-                        shiftConf['numConsultations']))
-                model.Add(sum(doctorConsultationVars) 
-                    <= shiftConf['numConsultations'])
+            if debug:
+                log.debug('%s must have between %s and %s shifts, and at '
+                    'most %s consultations', subject, shiftConf['minShifts'],
+                    shiftConf['maxShifts'], shiftConf['numConsultations'])
+            constraint = model.Add(cp_model.LinearExpr.Sum(shiftRow) 
+                >= shiftConf['minShifts'] * rowSize)
+            labeledConstraints.append((constraint, dict(ids, 
+                constraint='minShifts', 
+                message='{} has at least {} shifts'.format(subject, 
+                    shiftConf['minShifts']))))
+
+            # The maximum number of shifts also includes consultations, 
+            # and if the doctor has consultations, restrict the number
+            # of consultations it can have
+            if consultationRow is None:
+                constraint = model.Add(cp_model.LinearExpr.Sum(shiftRow) 
+                    <= shiftConf['maxShifts'] * rowSize)
+            else:
+                constraint = model.Add(cp_model.LinearExpr.Sum(
+                    shiftRow + consultationRow) 
+                    <= shiftConf['maxShifts'] * rowSize)
+                consultationConstraint = model.Add(
+                    cp_model.LinearExpr.Sum(consultationRow) 
+                    <= shiftConf['numConsultations'] * rowSize)
+                labeledConstraints.append((consultationConstraint, dict(ids,
+                    constraint='numConsultations', 
+                    message='{} has at most {} consultations'.format(
+                        subject, shiftConf['numConsultations']))))
+            labeledConstraints.append((constraint, dict(ids, 
+                constraint='maxShifts', 
+                message='{} has at most {} shifts and consultations'.format(
+                    subject, shiftConf['maxShifts']))))
 
     # Each day there is a minimum number of shifts and consultations
     log.debug('Starting the generation of maximum and minimum number of '
         + 'shifts per day')
-    for dayNum in workingDays:
-        dayShiftVars = [shiftVars[docId, dayNum][0] for docId in shiftConfsDict]
-        log.debug('Minimum number of shifts on day {}: sum({}) >= {}'
-            .format(dayNum, dayShiftVars, dayConfs[dayNum-1]['numShifts']))
-        model.Add(sum(dayShiftVars) >= dayConfs[dayNum-1]['numShifts'])
-
-        dayConsultationsVar = [shiftVars[docId, dayNum][1] 
-            for docId in shiftConfsDict 
-            if len(shiftVars[docId, dayNum]) > 1]
-        log.debug('Minimum number of consultations on day {}: sum({}) >= {}'
-            .format(dayNum, dayConsultationsVar, 
-                dayConfs[dayNum-1]['numConsultations']))
-        model.Add(sum(dayConsultationsVar) >= dayConfs[dayNum-1]['numConsultations'])
-
+    consultationRows = [consultationRow 
+        for consultationRow in consultationGrid if consultationRow is not None]
+    for j, dayNum in enumerate(workingDays):
+        if debug:
+            log.debug('Day %s must have at least %s shifts and %s '
+                'consultations', dayNum, dayConfs[dayNum-1]['numShifts'], 
+                dayConfs[dayNum-1]['numConsultations'])
+        constraint = model.Add(cp_model.LinearExpr.Sum([shiftRow[j] 
+            for shiftRow in shiftGrid]) >= dayConfs[dayNum-1]['numShifts'])
+        labeledConstraints.append((constraint, {'constraint': 'dayShifts', 
+            'day': dayNum, 'message': 'The day {} has at least {} '
+                'shifts'.format(dayNum, dayConfs[dayNum-1]['numShifts'])}))
+        if dayNum not in consultationDays:
+            continue
+        constraint = model.Add(cp_model.LinearExpr.Sum([consultationRow[j] 
+            for consultationRow in consultationRows]) 
+            >= dayConfs[dayNum-1]['numConsultations'])
+        labeledConstraints.append((constraint, {
+            'constraint': 'dayConsultations', 'day': dayNum, 
+            'message': 'The day {} has at least {} consultations'.format(
+                dayNum, dayConfs[dayNum-1]['numConsultations'])}))
+
+    timer.startPhase('objective')
     log.debug('Starting the construction of the objective function')
-    # Wanted shifts contribute positively to the objective function
-    wantedShiftContribution = \
-        sum(wantedShiftWeight * shiftVars[docId, dayNum][0] 
-            for dayNum in workingDays 
-            for docId in requests[dayNum][0])
-    # Unwanted shifts contribute negatively to the objective function
-    unwantedShiftContribution = \
-        - sum(unwantedShiftWeight * shiftVars[docId, dayNum][0] 
-            for dayNum in workingDays 
-            for docId in requests[dayNum][1])
-    # Wanted consultations contribute positively
-    wantedConsultationContribution = \
-        sum(wantedConsultationWeight * shiftVars[docId, dayNum][1]
-            for dayNum in workingDays 
-            for docId in requestConsultations[dayNum][0])
-    # All shifts contribute negatively (to minimize the number of 
-    # shifts scheduled)
-    allShiftContribution = - sum(allShiftWeight * shiftVar[0] 
-                                for shiftVar in shiftVars.values())
-    # Consultations contribute positively (to give preference to a 
-    # consultation over a regular shift)
-    consultationContribution = sum(consultationWeight * shiftVar[1] 
-                                    for shiftVar in shiftVars.values() 
-                                        if len(shiftVar) > 1)
-
-    objectiveFunction = wantedShiftContribution + unwantedShiftContribution \
-        + wantedConsultationContribution + allShiftContribution \
-        + consultationContribution
+    # The objective is a weighted sum of the OBJECTIVE_TERMS. The 
+    # coefficients of each term are laid out as the variables, and the 
+    # doctors of a row have the same preferences, so the ones of its 
+    # first doctor are used for the whole row
+    termCoefficients = {term: ([[0] * len(workingDays) for _ in shiftGrid],
+        [None if consultationRow is None else [0] * len(workingDays)
+            for consultationRow in consultationGrid])
+        for term, _, _ in OBJECTIVE_TERMS}
+    termCoefficients['shifts'] = ([[1] * len(workingDays) 
+        for _ in shiftGrid], termCoefficients['shifts'][1])
+    termCoefficients['consultations'] = (termCoefficients['consultations'][0],
+        [None if consultationRow is None else [1] * len(workingDays)
+            for consultationRow in consultationGrid])
+    for dayNum in workingDays:
+        j = dayIndexes[dayNum]
+        for docIdList, term in ((requests[dayNum][0], 'wantedShifts'),
+                (requests[dayNum][1], 'unwantedShifts')):
+            for docId in docIdList:
+                i = docIndexes.get(docId, None)
+                if i is None:
+                    log.warning('The doctor %s has shift preferences, but '
+                        'does not have a shift configuration. Ignoring '
+                        'them', docId)
+                    continue
+                r = docRows[i]
+                if rowDoctors[r][0] == i:
+                    termCoefficients[term][0][r][j] += 1
+        for docId in requestConsultations[dayNum][0]:
+            i = docIndexes.get(docId, None)
+            r = None if i is None else docRows[i]
+            consultationCoefficients = termCoefficients[
+                'wantedConsultations'][1]
+            if r is None or consultationCoefficients[r] is None:
+                log.warning('The doctor %s wants consultations the day %s, '
+                    'but does not do consultations. Ignoring it', docId, 
+                    dayNum)
+                continue
+            if rowDoctors[r][0] == i:
+                consultationCoefficients[r][j] += 1
+
+    # Each term as a list of (var, coefficient) and an offset. The terms
+    # of the constants are added up as the offset, so that the value of 
+    # the term does not change
+    termExpressions = {}
+    for term, (shiftCoefficients, consultationCoefficients) in \
+            termCoefficients.items():
+        termVars = []
+        termOffset = 0
+        for varRow, coefficientRow in zip(shiftGrid + consultationGrid, 
+                shiftCoefficients + consultationCoefficients):
+            if varRow is None:
+                continue
+            for var, coefficient in zip(varRow, coefficientRow):
+                if isinstance(var, int):
+                    termOffset += coefficient * var
+                elif coefficient != 0:
+                    termVars.append((var, coefficient))
+        termExpressions[term] = (termVars, termOffset)
+    del termCoefficients
+
+    def getObjective(weights):
+        # A single weighted sum with a term for each variable
+        coefficients = {}
+        objectiveOffset = 0
+        for term, weightKey, sign in OBJECTIVE_TERMS:
+            weight = sign * weights[weightKey]
+            termVars, termOffset = termExpressions[term]
+            objectiveOffset += weight * termOffset
+            for var, coefficient in termVars:
+                index = var.Index()
+                if index in coefficients:
+                    coefficients[index][1] += weight * coefficient
+                else:
+                    coefficients[index] = [var, weight * coefficient]
+        objectiveVars = []
+        objectiveCoefficients = []
+        for var, coefficient in coefficients.values():
+            if coefficient != 0:
+                objectiveVars.append(var)
+                objectiveCoefficients.append(coefficient)
+        return cp_model.LinearExpr.WeightedSum(objectiveVars, 
+            objectiveCoefficients) + objectiveOffset
+
+    def getObjectiveTerms(value, weights):
+        # The count and the contribution to the objective of each term 
+        # in a solution
+        objectiveTerms = {}
+        for term, weightKey, sign in OBJECTIVE_TERMS:
+            termVars, termOffset = termExpressions[term]
+            count = termOffset + sum(coefficient * value(var) 
+                for var, coefficient in termVars)
+            objectiveTerms[term] = {'count': count, 
+                'weight': weights[weightKey], 
+                'contribution': sign * weights[weightKey] * count}
+        return objectiveTerms
+
+    objectiveFunction = getObjective(weights)
 
     model.Maximize(objectiveFunction)
 
+    hintValues = []
+    if hint is not None:
+        if hint.get('year') != year or hint.get('month') != month:
+            log.warning('The hint is for %s-%s, but the schedule is for '
+                '%s-%s. Ignoring it', hint.get('year'), hint.get('month'), 
+                year, month)
+        else:
+            hintValues = getScheduleHint(shiftVars, hint)
+
+    if incremental is not None:
+        timer.startPhase('incremental')
+        confirmed = incremental['schedule']
+        if confirmed.get('year') != year or confirmed.get('month') != month:
+            errorMessage = ('The confirmed schedule is for {}-{}, but the '
+                + 'schedule is for {}-{}').format(confirmed.get('year'), 
+                confirmed.get('month'), year, month)
+            log.error(errorMessage)
+            log.error('Raising ValueError')
+            raise ValueError(errorMessage)
+        freeVars, fixedVars = splitIncrementalRegion(shiftVars, 
+            numDaysInMonth=numDaysInMonth, 
+            changedDays=incremental.get('days', []), 
+            changedDoctors=incremental.get('doctors', []), 
+            radius=incremental.get('radius', 0))
+        fixedValues = getScheduleHint(fixedVars, confirmed)
+        # The kept assignments of each doctor are labeled together
+        fixedDoctors = {var.Index(): docId 
+            for (docId, _), doctorVars in fixedVars.items() 
+            for var in doctorVars if var is not None}
+        fixedIssues = {}
+        for var, value in fixedValues:
+            docId = fixedDoctors[var.Index()]
+            issue = fixedIssues.get(docId, None)
+            if issue is None:
+                issue = fixedIssues[docId] = {
+                    'constraint': 'confirmedSchedule', 'doctorId': docId,
+                    'message': ('The confirmed schedule of the doctor {} is '
+                        + 'kept outside the re-scheduled region').format(
+                        docId)}
+            labeledConstraints.append((model.Add(var == value), issue))
+        log.info('Re-scheduling incrementally with radius %s: %d variables '
+            'fixed', incremental.get('radius', 0), len(fixedValues))
+        if hint is None:
+            hintValues = getScheduleHint(freeVars, confirmed)
+
+    if hintValues:
+        if repairHint:
+            timer.startPhase('repairHint')
+            hintValues = repairScheduleHint(model, hintValues, 
+                solverParameters)
+            model.Maximize(objectiveFunction)
+        for var, value in hintValues:
+            model.AddHint(var, value)
+        log.info('Added %d hints', len(hintValues))
+
+    if heuristicHint and hint is None and incremental is None \
+            and not (stopEvent is not None and stopEvent.is_set()):
+        timer.startPhase('heuristic')
+        heuristicSchedule = getHeuristicSchedule(False)
+        if heuristicSchedule['status'] != 'GENERATION_ERROR':
+            # Each cell is hinted with the number of the doctors of its 
+            # row with that assignment, so aggregated rows are hinted too
+            numHints = 0
+            for grid, key in ((shiftGrid, 'shifts'), 
+                    (consultationGrid, 'consultations')):
+                assigned = {(doctor['id'], day['day']) 
+                    for day in heuristicSchedule['days'] 
+                    for doctor in day[key]}
+                for r, row in enumerate(grid):
+                    if row is None:
+                        continue
+                    for j, cell in enumerate(row):
+                        if isinstance(cell, int):
+                            continue
+                        model.AddHint(cell, sum(1 for i in rowDoctors[r] 
+                            if (docIds[i], workingDays[j]) in assigned))
+                        numHints += 1
+            log.info('Added %d hints from the heuristic schedule', numHints)
+
+
+    if modelDumpDir is not None:
+        timer.startPhase('dump')
+        dumpInfo = {
+            'year': year,
+            'month': month,
+            'weights': weights,
+            'weightSets': weightSets,
+            'solverParameters': solverParameters,
+            'variables': [{'index': cell.Index(), 'type': cellType, 
+                    'day': workingDays[j], 
+                    'doctorIds': [docIds[i] for i in rowDoctors[r]]}
+                for grid, cellType in ((shiftGrid, 'shift'), 
+                    (consultationGrid, 'consultation'))
+                for r, row in enumerate(grid) if row is not None
+                for j, cell in enumerate(row) if not isinstance(cell, int)],
+            'solve': None
+        }
+        dumpModel(modelDumpDir, model, dumpInfo)
 
     # Solve the problem
-    solver = cp_model.CpSolver()
-    solver.parameters.num_search_workers = 8
-    log.info('Starting the solver')
-    status = solver.Solve(model)
-    optimalOrFeasibleSolutionFound = status == cp_model.OPTIMAL \
-        or status == cp_model.FEASIBLE
-    if optimalOrFeasibleSolutionFound:
-        log.info('The solution found is optimal or feasible')
-    else:
+    timer.startPhase('solve')
+    if collectStats:
+        modelProto = model.Proto()
+        numVariables = len(modelProto.variables)
+        numConstraints = len(modelProto.constraints)
+
+    def createScheduleFromSolution(value):
+        # The counts of the rows with several doctors are distributed 
+        # among them. Returns None if the counts of a row cannot be 
+        # distributed within the bounds of its doctors
+        def cellValue(cell):
+            return cell if isinstance(cell, int) else value(cell)
+        shiftValues = [None] * len(docIds)
+        consultationValues = [None] * len(docIds)
+        for doctorIndexes, shiftRow, consultationRow, shiftConf in zip(
+                rowDoctors, shiftGrid, consultationGrid, rowConfs):
+            shiftCounts = [cellValue(cell) for cell in shiftRow]
+            consultationCounts = None if consultationRow is None \
+                else [cellValue(cell) for cell in consultationRow]
+            if len(doctorIndexes) == 1:
+                shiftRows = [shiftCounts]
+                consultationRows = None if consultationCounts is None \
+                    else [consultationCounts]
+            else:
+                distribution = expandDoctorCounts(len(doctorIndexes), 
+                    shiftCounts, consultationCounts, shiftConf=shiftConf)
+                if distribution is None:
+                    return None
+                shiftRows, consultationRows = distribution
+            for k, i in enumerate(doctorIndexes):
+                shiftValues[i] = shiftRows[k]
+                if consultationRows is not None:
+                    consultationValues[i] = consultationRows[k]
+        return createSchedule(year=year, month=month, 
+            daysOfMonth=daysOfMonth, dayConfs=dayConfs, 
+            cycleShifts=cycleShifts, docIds=docIds, workingDays=workingDays,
+            shiftValues=shiftValues, consultationValues=consultationValues)
+
+    def solve(solveModel, parameters, onSolution):
+        # Returns a tuple as (solver, status, solutionCallback). The 
+        # callback is None if it was not needed
+        solver = cp_model.CpSolver()
+        setSolverParameters(solver.parameters, parameters)
+        solutionCallback = None
+        searchFinished = None
+        if stopEvent is not None:
+            searchFinished = startSearchStopper(solver, stopEvent)
+        try:
+            if onSolution is None and not collectStats and stopEvent is None:
+                status = solver.Solve(solveModel)
+            else:
+                solutionCallback = getScheduleSolutionCallbackClass()(
+                    createScheduleFromSolution, onSolution, stopEvent)
+                status = solver.Solve(solveModel, solutionCallback)
+        finally:
+            if searchFinished is not None:
+                searchFinished.set()
+        return solver, status, solutionCallback
+
+    def isSolutionFound(status):
+        return status == cp_model.OPTIMAL or status == cp_model.FEASIBLE
+
+    def extractSchedule(solver, status):
+        # None if the solution cannot be turned into a schedule (see 
+        # createScheduleFromSolution)
+        if isSolutionFound(status):
+            log.info('The solution found is %s', solver.StatusName(status))
+            return createScheduleFromSolution(solver.Value)
         log.error('No solution found')
+        return {
+            'month': month,
+            'year': year,
+            'status': 'GENERATION_ERROR',
+            'days': [],
+            'issues': []
+        }
 
-    # This is the schedule that is going to be returned
-    schedule = {
-        'month': month,
-        'year': year,
-        'status': 'PENDING_CONFIRMATION',
-        'days': [{
-            'day': day.day, 
-            'isWorkingDay': False,
-            'cycle': [], 
-            'shifts': [], 
-            'consultations':[]
-        } for day in daysOfMonth]
-    }
-    log.debug('The empty schedule to be filled is: {}'.format(schedule))
-
-    # If the optimal solution was found
-    if optimalOrFeasibleSolutionFound:
-        log.debug('Assigned shifts are: ')
-        for (docId, dayNum), shiftVar in shiftVars.items():
-            if solver.BooleanValue(shiftVar[0]):
-                log.debug('Doctor {} has a shift on day {}'
-                    .format(docId, dayNum))
-                schedule['days'][dayNum-1]['shifts'].append({'id':docId})
-            if len(shiftVar) > 1 and solver.BooleanValue(shiftVar[1]):
-                log.debug('Doctor {} has a consultation on day {}'
-                    .format(docId, dayNum))
-                schedule['days'][dayNum-1]['consultations'].append({'id':docId})
-        for day in daysOfMonth:
-            schedule['days'][day.day-1]['cycle'] = \
-                [{'id': docId} for docId in cycleShifts[day.day]]
-            if dayConfs[day.day-1]['isWorkingDay']:
-                schedule['days'][day.day-1]['isWorkingDay'] = True
-    else:
-        schedule['status'] = 'GENERATION_ERROR'
-        schedule['days'] = []
-    log.debug(solver.ResponseStats())
+    def widenIncrementalRadius():
+        # Returns the result of solving again with a wider radius, or 
+        # None if the radius cannot be widened
+        radius = incremental.get('radius', 0)
+        maxRadius = incremental.get('maxRadius', radius)
+        if radius >= maxRadius \
+                or (stopEvent is not None and stopEvent.is_set()):
+            return None
+        widenedRadius = min(maxRadius, 2 * radius + 1)
+        log.warning('No schedule found with radius %s. Widening it to '
+            '%s', radius, widenedRadius)
+        widened = dict(incremental)
+        widened['radius'] = widenedRadius
+        return schedule(doctors, shiftConfs, calendarDict, 
+            schedulerConf, onSolution=onSolution, 
+            solverParameters=solverParameters, collectStats=collectStats,
+            hint=hint, repairHint=repairHint, incremental=widened, 
+            stopEvent=stopEvent, weightSets=weightSets, 
+            modelDumpDir=modelDumpDir, alternatives=alternatives)
+
+    def scheduleWithoutAggregation():
+        # Returns the result of solving again with a row for each doctor,
+        # as the counts of an aggregated row could not be distributed 
+        # among its doctors
+        log.warning('Solving again without aggregating the interchangeable '
+            'doctors')
+        unaggregatedConf = dict(schedulerConf, 
+            aggregateEquivalentDoctors={'value': False})
+        return schedule(doctors, shiftConfs, calendarDict, unaggregatedConf, 
+            onSolution=onSolution, solverParameters=solverParameters, 
+            collectStats=collectStats, stopEvent=stopEvent, 
+            weightSets=weightSets, modelDumpDir=modelDumpDir)
+
+    def diagnoseInfeasibility():
+        timer.startPhase('diagnosis')
+        log.info('Looking for the constraints that cannot be satisfied')
+        issues = explainInfeasibility(model, labeledConstraints, 
+            solverParameters, diagnosisMaxTimeInSeconds)
+        for issue in issues:
+            log.error('Conflicting constraint: %s', issue['message'])
+        return issues
+
+    def getSolveStats(solver, status, solutionCallback, solveWeights):
+        objective = bestBound = gap = objectiveTerms = None
+        if isSolutionFound(status):
+            objective = solver.ObjectiveValue()
+            bestBound = solver.BestObjectiveBound()
+            gap = statsLib.getRelativeGap(objective, bestBound)
+            objectiveTerms = getObjectiveTerms(solver.Value, solveWeights)
+        return {
+            'phases': timer.toDict(),
+            'numVariables': numVariables,
+            'numConstraints': numConstraints,
+            'status': solver.StatusName(status),
+            'objective': objective,
+            'bestBound': bestBound,
+            'gap': gap,
+            'objectiveTerms': objectiveTerms,
+            'numSolutions': solutionCallback.numSolutions,
+            'numConflicts': solver.NumConflicts(),
+            'numBranches': solver.NumBranches()
+        }
 
-    log.debug('The generated schedule is: {}'.format(schedule))
+    if weightSets is not None:
+        # Each weight set is solved in a thread (the solver releases the
+        # GIL) with a copy of the model, splitting the CP-SAT workers
+        setsWeights = [dict(weights, **weightSet) for weightSet in weightSets]
+        numWorkers = solverParameters.get('num_search_workers', 0) \
+            or getAvailableCpus()
+        setParameters = dict(solverParameters, 
+            num_search_workers=max(1, numWorkers // len(setsWeights)))
+        log.info('Solving %d weight sets with %d CP-SAT workers each', 
+            len(setsWeights), setParameters['num_search_workers'])
+        def solveWeightSet(setWeights):
+            setModel = copyModel(model)
+            setModel.Maximize(getObjective(setWeights))
+            return solve(setModel, setParameters, None)
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(setsWeights)) as pool:
+            solves = list(pool.map(solveWeightSet, setsWeights))
+        timer.startPhase('extraction')
+        portfolio = [{'weights': setWeights, 
+                'schedule': extractSchedule(solver, status),
+                'objectiveTerms': getObjectiveTerms(solver.Value, setWeights)
+                    if isSolutionFound(status) else None}
+            for setWeights, (solver, status, _) in zip(setsWeights, solves)]
+        if any(entry['schedule'] is None for entry in portfolio):
+            return scheduleWithoutAggregation()
+        if incremental is not None and not any(isSolutionFound(status) 
+                for _, status, _ in solves):
+            widenedPortfolio = widenIncrementalRadius()
+            if widenedPortfolio is not None:
+                return widenedPortfolio
+        # The weight sets share the constraints, so the diagnosis is the
+        # same for all of them
+        if diagnosisMaxTimeInSeconds > 0 and any(
+                status == cp_model.INFEASIBLE for _, status, _ in solves):
+            issues = diagnoseInfeasibility()
+            for entry in portfolio:
+                if entry['schedule']['status'] == 'GENERATION_ERROR':
+                    entry['schedule']['issues'] = list(issues)
+        timer.stop()
+        if collectStats:
+            for entry, (solver, status, solutionCallback) in zip(portfolio,
+                    solves):
+                entry['schedule']['stats'] = getSolveStats(solver, status,
+                    solutionCallback, entry['weights'])
+        return portfolio
+
+    if alternatives is not None:
+        # Without aggregated rows, each variable is an assignment of a 
+        # doctor. The constants are the same in every schedule
+        assignmentVars = [cell for row in shiftGrid + consultationGrid 
+            if row is not None for cell in row if not isinstance(cell, int)]
+        solves = []
+        foundValues = []
+        bestObjective = None
+        while len(solves) < alternatives['count']:
+            log.info('Looking for the alternative schedule %d', 
+                len(solves) + 1)
+            solver, status, solutionCallback = solve(model, 
+                solverParameters, None)
+            if not isSolutionFound(status):
+                break
+            solves.append((solver, status, solutionCallback))
+            values = [solver.Value(var) for var in assignmentVars]
+            foundValues.append(values)
+            if stopEvent is not None and stopEvent.is_set():
+                break
+            # A no-good cut: the number of assignments that change is 
+            # the number of 0s that become 1, plus the 1s that become 0
+            zeros = [var for var, value in zip(assignmentVars, values) 
+                if value == 0]
+            ones = [var for var, value in zip(assignmentVars, values) 
+                if value == 1]
+            model.Add(cp_model.LinearExpr.Sum(zeros) 
+                - cp_model.LinearExpr.Sum(ones) + len(ones) 
+                >= alternatives['minDistance'])
+            if bestObjective is None:
+                bestObjective = solver.ObjectiveValue()
+                if alternatives.get('maxGap', None) is not None:
+                    model.Add(objectiveFunction >= math.ceil(bestObjective
+                        - alternatives['maxGap'] * max(1, abs(bestObjective))))
+        log.info('Found %d alternative schedules', len(solves))
+        timer.startPhase('extraction')
+        if not solves:
+            if incremental is not None:
+                widenedAlternatives = widenIncrementalRadius()
+                if widenedAlternatives is not None:
+                    return widenedAlternatives
+            generatedSchedule = extractSchedule(solver, status)
+            if status == cp_model.INFEASIBLE and diagnosisMaxTimeInSeconds > 0:
+                generatedSchedule['issues'] = diagnoseInfeasibility()
+            timer.stop()
+            if collectStats:
+                generatedSchedule['stats'] = getSolveStats(solver, status, 
+                    solutionCallback, weights)
+            return [{'schedule': generatedSchedule, 'objective': None, 
+                'gap': None, 'distance': None}]
+        found = []
+        for k, (solver, status, _) in enumerate(solves):
+            objective = solver.ObjectiveValue()
+            found.append({
+                'schedule': extractSchedule(solver, status),
+                'objective': objective,
+                'gap': statsLib.getRelativeGap(bestObjective, objective),
+                'distance': min((sum(1 for value, otherValue in zip(
+                        foundValues[k], otherValues) if value != otherValue)
+                    for otherValues in foundValues[:k]), default=None)
+            })
+        timer.stop()
+        if collectStats:
+            for entry, (solver, status, solutionCallback) in zip(found, 
+                    solves):
+                entry['schedule']['stats'] = getSolveStats(solver, status,
+                    solutionCallback, weights)
+        return found
 
-    return schedule
+    log.info('Starting the solver')
+    solver, status, solutionCallback = solve(model, solverParameters, 
+        onSolution)
+    if modelDumpDir is not None:
+        dumpInfo['solve'] = {
+            'status': solver.StatusName(status),
+            'objective': solver.ObjectiveValue() 
+                if isSolutionFound(status) else None,
+            'bestBound': solver.BestObjectiveBound() 
+                if isSolutionFound(status) else None,
+            'wallTime': solver.WallTime(),
+            'numConflicts': solver.NumConflicts(),
+            'numBranches': solver.NumBranches()
+        }
+        storage.writeJsonFile(Path(modelDumpDir) / MODEL_DUMP_INFO_FILE_NAME,
+            dumpInfo)
+    timer.startPhase('extraction')
+    generatedSchedule = extractSchedule(solver, status)
+    if generatedSchedule is None:
+        return scheduleWithoutAggregation()
+
+    # The search reached its time limit before finding a schedule. The 
+    # heuristic is not used when the stop was requested (e.g. the job was
+    # cancelled), as the schedule is no longer awaited
+    stopRequested = stopEvent is not None and stopEvent.is_set()
+    if status == cp_model.UNKNOWN and useHeuristicFallback \
+            and not stopRequested:
+        timer.startPhase('heuristic')
+        log.warning('Generating the schedule with the heuristic, as the '
+            'solver did not find any')
+        heuristicSchedule = getHeuristicSchedule(collectStats)
+        if heuristicSchedule['status'] != 'GENERATION_ERROR':
+            generatedSchedule = heuristicSchedule
+
+    if incremental is not None and not isSolutionFound(status):
+        widenedSchedule = widenIncrementalRadius()
+        if widenedSchedule is not None:
+            return widenedSchedule
+
+    if status == cp_model.INFEASIBLE and diagnosisMaxTimeInSeconds > 0:
+        generatedSchedule['issues'] = diagnoseInfeasibility()
+    timer.stop()
+    if debug:
+        log.debug(solver.ResponseStats())
+
+    if collectStats:
+        heuristicStats = generatedSchedule.get('stats', None)
+        generatedSchedule['stats'] = getSolveStats(solver, status, 
+            solutionCallback, weights)
+        if generatedSchedule.get('heuristic', False):
+            # The objective is the one of the heuristic schedule
+            generatedSchedule['stats'].update(heuristic=True, 
+                objective=heuristicStats['objective'], 
+                objectiveTerms=heuristicStats['objectiveTerms'])
+        log.info('Schedule stats: %s', generatedSchedule['stats'])
+
+    log.debug('The generated schedule is: %s', generatedSchedule)
+
+    return generatedSchedule
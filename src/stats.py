@@ -0,0 +1,66 @@
+'''The stats module contains the helpers used to measure the performance
+of the scheduler
+
+Author: miggoncan
+'''
+
+import time
+
+
+class PhaseTimer:
+    '''Measures the wall and CPU time of consecutive phases
+
+    Phases are started one after the other. Starting a phase finishes
+    the previous one, and stop finishes the current phase. If a phase is
+    started several times, its times are accumulated.
+
+    Example:
+        timer = PhaseTimer()
+        timer.startPhase('build')
+        ...
+        timer.startPhase('solve')
+        ...
+        timer.stop()
+        timer.toDict()
+        # {'build': {'wallTime': 0.12, 'cpuTime': 0.11},
+        #  'solve': {'wallTime': 1.5, 'cpuTime': 5.8}}
+
+    The CPU time is the one of the whole process, so it includes the
+    time of the threads of the solver
+    '''
+    def __init__(self):
+        self.phases = {}
+        self.currentPhase = None
+        self.wallStart = None
+        self.cpuStart = None
+
+    def startPhase(self, name):
+        self.stop()
+        self.currentPhase = name
+        self.wallStart = time.perf_counter()
+        self.cpuStart = time.process_time()
+
+    def stop(self):
+        if self.currentPhase is None:
+            return
+        phase = self.phases.setdefault(self.currentPhase,
+            {'wallTime': 0.0, 'cpuTime': 0.0})
+        phase['wallTime'] += time.perf_counter() - self.wallStart
+        phase['cpuTime'] += time.process_time() - self.cpuStart
+        self.currentPhase = None
+
+    def toDict(self):
+        '''Return a dict whose keys are the names of the phases, and whose
+        values are dicts with the keys 'wallTime' and 'cpuTime' (seconds)
+        '''
+        return {name: dict(times) for name, times in self.phases.items()}
+
+
+def getRelativeGap(objective, bestBound):
+    '''Return the relative gap between an objective value and the best
+    bound known for it
+
+    The gap is computed as CP-SAT does for its relative_gap_limit. This
+    is, |objective - bestBound| / max(1, |objective|)
+    '''
+    return abs(objective - bestBound) / max(1, abs(objective))
@@ -0,0 +1,56 @@
+'''The storage module contains helpers to read and write the JSON files
+used by the scheduler
+
+Author: miggoncan
+'''
+
+import json
+import os
+import tempfile
+
+
+def readJsonFile(path):
+    '''Return the content of the JSON file in the given path'''
+    with open(path) as file:
+        return json.loads(file.read())
+
+
+def writeJsonFile(path, content, *, indent=None):
+    '''Store content as JSON in the given path
+
+    The file is written atomically (see writeTextFile), which is needed
+    when the file is rewritten several times (e.g. with the intermediate
+    schedules)
+
+    Args:
+        path: the path of the file. A str or a Path
+        content: a JSON serializable object
+
+    Keyword Args:
+        indent: optional. The indent of the JSON, for files meant to be
+            edited by hand. Defaults to a compact JSON
+    '''
+    writeTextFile(path, json.dumps(content, indent=indent))
+
+
+def writeTextFile(path, text):
+    '''Store the text in the given path
+
+    The text is first written to a temporary file in the same directory,
+    which then replaces the given path. This way, readers of the file 
+    never see a partially written content
+
+    Args:
+        path: the path of the file. A str or a Path
+        text: a str
+    '''
+    path = os.fspath(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmpPath = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, mode='w') as file:
+            file.write(text)
+        os.replace(tmpPath, path)
+    except BaseException:
+        os.unlink(tmpPath)
+        raise
@@ -0,0 +1,334 @@
+#!/usr/bin/python3.7
+'''The tune module searches the CP-SAT parameters that solve a corpus of
+scheduling models the fastest
+
+The corpus is made of models dumped by the scheduler (see the
+--dumpModel argument of the main module) and of synthetic workloads
+(see the generator module). Each setting of the search space is tried
+on every model of the corpus with a time limit, and it is scored by:
+    timeToOptimal: the mean seconds taken to prove the optimal
+        solution. Runs that do not finish count as twice the time limit
+    primalIntegral: the mean primal integral of the runs, this is, the
+        integral over the time limit of the relative gap between the
+        best solution found so far and the best solution known for the
+        model (1 before the first solution). It rewards finding good
+        solutions early even when the optimal is not proven
+The settings are ranked by one of them, breaking ties with the other.
+The setting {} (the parameters the models were dumped with) is always
+tried, as the reference to improve on.
+
+The winner can be written as a scheduler configuration, with the
+solverParameters configuration updated and the rest unchanged:
+    python3.7 src/tune.py --dumps /tmp/slowSchedule/ --sizes 50 100 \
+        --search random --samples 20 --timeLimit 30 \
+        --output /tmp/scheduler.json
+
+Author: miggoncan
+'''
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+from pathlib import Path
+
+import generator
+import replay
+import scheduler
+import storage
+
+DEFAULT_CONFIG_FILE = Path(__file__).resolve().parent.parent \
+    / 'config' / 'scheduler.json'
+
+# The values tried for each CP-SAT parameter, unless a search space is
+# given. The values of num_search_workers above the available CPUs are
+# not tried
+DEFAULT_SEARCH_SPACE = {
+    'num_search_workers': [1, 2, 4, 8],
+    'search_branching': ['AUTOMATIC_SEARCH', 'FIXED_SEARCH',
+        'PORTFOLIO_SEARCH', 'PSEUDO_COST_SEARCH'],
+    'cp_model_presolve': [True, False],
+    'cp_model_probing_level': [0, 1, 2],
+    'symmetry_level': [0, 1, 2],
+    'linearization_level': [0, 1, 2]
+}
+
+DEFAULT_TIME_LIMIT_IN_SECONDS = 10
+
+# The parameters of the dumped models that are replaced by the time
+# limit of the tuning, so that the runs are comparable
+REPLACED_PARAMETERS = ('max_time_in_seconds', 'relative_gap_limit')
+
+RANKING_MEASURES = ('timeToOptimal', 'primalIntegral')
+
+
+def getSettings(searchSpace, *, search='grid', samples=None, seed=None):
+    '''Return the settings to be tried
+
+    Args:
+        searchSpace: a dict mapping the names of CP-SAT parameters to the
+            list of values to be tried
+
+    Keyword Args:
+        search: 'grid' to try every combination of the values, or
+            'random' to try a random sample of them
+        samples: the number of combinations of the random search.
+            Ignored in the grid search
+        seed: the seed of the random search
+
+    Returns:
+        A list of dicts of CP-SAT parameters. The first one is always {}
+    '''
+    names = sorted(searchSpace)
+    combinations = [dict(zip(names, values)) for values in
+        itertools.product(*(searchSpace[name] for name in names))]
+    if search == 'random':
+        rng = random.Random(seed)
+        combinations = rng.sample(combinations,
+            min(samples, len(combinations)))
+    return [{}] + combinations
+
+
+def loadCorpus(*, dumpDirs=(), sizes=(), schedulerConf, seed=0):
+    '''Load the models to be tuned on
+
+    Keyword Args:
+        dumpDirs: an iterable with the paths of dumped models
+        sizes: an iterable with the number of doctors of each synthetic
+            workload. The workloads rejected by the feasibility pre-check
+            of the scheduler are skipped
+        schedulerConf: the scheduler configuration used to build the
+            models of the synthetic workloads
+        seed: the seed of the synthetic workloads
+
+    Returns:
+        A list of tuples as (name, model, parameters), with the
+        parameters the model was dumped with (without the
+        REPLACED_PARAMETERS)
+    '''
+    log = logging.getLogger('tune')
+    corpus = []
+    for dumpDir in dumpDirs:
+        model, info = replay.loadModelDump(dumpDir)
+        corpus.append((str(dumpDir), model, info['solverParameters']))
+    for size in sizes:
+        workload = generator.generateWorkload(size, 2020, 6, seed=seed)
+        conf = dict(schedulerConf)
+        conf.update(workload['schedulerConf'])
+        with tempfile.TemporaryDirectory() as dumpDir:
+            # The model is only built and dumped
+            generatedSchedule = scheduler.schedule(workload['doctors'],
+                workload['shiftConfs'], workload['calendar'], conf,
+                solverParameters={'max_time_in_seconds': 0},
+                modelDumpDir=dumpDir)
+            # The inputs rejected by the pre-check have no model
+            if not (Path(dumpDir)
+                    / scheduler.MODEL_DUMP_PROTO_FILE_NAME).exists():
+                log.warning('The workload of %d doctors has no model to be '
+                    'tuned on. Skipping it: %s', size,
+                    generatedSchedule.get('issues', []))
+                continue
+            model, info = replay.loadModelDump(dumpDir)
+        corpus.append(('{} doctors'.format(size), model,
+            info['solverParameters']))
+    for i, (name, model, parameters) in enumerate(corpus):
+        corpus[i] = (name, model, {key: value
+            for key, value in parameters.items()
+            if key not in REPLACED_PARAMETERS})
+        log.info('Loaded the model %s with %d variables', name,
+            len(model.Proto().variables))
+    return corpus
+
+
+def getPrimalGap(objective, reference):
+    '''Return the relative gap between an objective and the best one
+    known, between 0 and 1. It is 1 if there is no objective'''
+    if objective is None or objective * reference < 0:
+        return 1
+    if objective == reference:
+        return 0
+    return abs(reference - objective) / max(abs(reference), abs(objective))
+
+
+def getPrimalIntegral(solutions, reference, timeLimit):
+    '''Return the integral over the timeLimit of the primal gap
+
+    Args:
+        solutions: a list of [wallTime, objective] of the improving
+            solutions found. See replay.solveModel
+        reference: the best objective known
+        timeLimit: the seconds the integral spans
+    '''
+    integral = 0
+    lastTime = 0
+    gap = 1
+    for wallTime, objective in solutions:
+        wallTime = min(wallTime, timeLimit)
+        integral += gap * (wallTime - lastTime)
+        lastTime = wallTime
+        gap = getPrimalGap(objective, reference)
+    return integral + gap * (timeLimit - lastTime)
+
+
+def tune(corpus, settings, *, timeLimit=DEFAULT_TIME_LIMIT_IN_SECONDS,
+        rankBy='timeToOptimal'):
+    '''Run each setting over the corpus and rank them
+
+    Args:
+        corpus: see loadCorpus
+        settings: see getSettings
+
+    Keyword Args:
+        timeLimit: the seconds each run is limited to
+        rankBy: the measure used to rank the settings. One of
+            RANKING_MEASURES. The other one breaks the ties
+
+    Returns:
+        A list with a dict for each setting, from the best to the worst:
+            {
+                'parameters': {'symmetry_level': 0, ...},
+                'timeToOptimal': 2.5,
+                'primalIntegral': 0.3,
+                'runs': [
+                    {'model': '100 doctors', 'status': 'OPTIMAL',
+                     'wallTime': 2.1, 'objective': 40.0,
+                     'timeToOptimal': 2.1, 'primalIntegral': 0.2},
+                    ...
+                ]
+            }
+    '''
+    log = logging.getLogger('tune')
+    if rankBy not in RANKING_MEASURES:
+        errorMessage = 'rankBy must be one of {}'.format(RANKING_MEASURES)
+        log.error(errorMessage)
+        log.error('Raising ValueError')
+        raise ValueError(errorMessage)
+    results = [{'parameters': setting, 'runs': []} for setting in settings]
+    for result in results:
+        for name, model, parameters in corpus:
+            runParameters = dict(parameters, **result['parameters'])
+            runParameters['max_time_in_seconds'] = timeLimit
+            run = replay.solveModel(model, runParameters,
+                trackSolutions=True)
+            run['model'] = name
+            result['runs'].append(run)
+        log.info('Tried %s', result['parameters'])
+
+    # The models of the scheduler are maximized, so the best objective
+    # known is the highest one found
+    references = {}
+    for result in results:
+        for run in result['runs']:
+            if run['objective'] is not None:
+                references[run['model']] = max(run['objective'],
+                    references.get(run['model'], run['objective']))
+    for result in results:
+        runs = []
+        for run in result['runs']:
+            solved = run['status'] in ('OPTIMAL', 'INFEASIBLE')
+            runs.append({
+                'model': run['model'],
+                'status': run['status'],
+                'wallTime': run['wallTime'],
+                'objective': run['objective'],
+                'timeToOptimal': run['wallTime'] if solved
+                    else 2 * timeLimit,
+                'primalIntegral': getPrimalIntegral(run['solutions'],
+                    references.get(run['model'], 0), timeLimit)
+            })
+        result['runs'] = runs
+        for measure in RANKING_MEASURES:
+            result[measure] = statistics.mean(run[measure] for run in runs)
+    otherMeasure = [measure for measure in RANKING_MEASURES
+        if measure != rankBy][0]
+    results.sort(key=lambda result: (result[rankBy], result[otherMeasure]))
+    return results
+
+
+def writeConfiguration(schedulerConf, parameters, path):
+    '''Store a copy of the scheduler configuration with the parameters
+    added to its solverParameters configuration
+
+    Args:
+        schedulerConf: the scheduler configuration dict
+        parameters: a dict of CP-SAT parameters
+        path: the path of the file to be written
+    '''
+    schedulerConf = dict(schedulerConf)
+    solverParametersConf = schedulerConf.get('solverParameters', None)
+    if isinstance(solverParametersConf, dict) \
+            and 'value' in solverParametersConf:
+        schedulerConf['solverParameters'] = dict(solverParametersConf,
+            value=dict(solverParametersConf['value'], **parameters))
+    else:
+        schedulerConf['solverParameters'] = {'value': parameters}
+    # Written atomically, as the service may load it at any time
+    storage.writeJsonFile(path, schedulerConf, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Search the CP-SAT parameters that solve a corpus of '
+            'scheduling models the fastest')
+    parser.add_argument('--dumps', type=Path, nargs='+', default=[],
+        help='directories of models dumped with --dumpModel')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[],
+        help='number of doctors of each synthetic workload')
+    parser.add_argument('--seed', type=int, default=0,
+        help='seed of the synthetic workloads and the random search')
+    parser.add_argument('--space', type=Path, default=None,
+        help='JSON file mapping each CP-SAT parameter to the list of '
+            'values to be tried. Defaults to DEFAULT_SEARCH_SPACE')
+    parser.add_argument('--search', choices=('grid', 'random'),
+        default='random')
+    parser.add_argument('--samples', type=int, default=20,
+        help='number of settings of the random search')
+    parser.add_argument('--timeLimit', type=float,
+        default=DEFAULT_TIME_LIMIT_IN_SECONDS, help='seconds of each run')
+    parser.add_argument('--rankBy', choices=RANKING_MEASURES,
+        default='timeToOptimal')
+    parser.add_argument('--schedulerConf', type=Path,
+        default=DEFAULT_CONFIG_FILE)
+    parser.add_argument('--output', type=Path, default=None,
+        help='store the scheduler configuration with the winning '
+            'parameters in this file')
+    parser.add_argument('--save', type=Path, default=None,
+        help='store the results in this file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING'))
+    # The progress of the tuning is always shown
+    logging.getLogger('tune').setLevel(logging.INFO)
+    if not args.dumps and not args.sizes:
+        parser.error('at least one of --dumps or --sizes is needed')
+
+    schedulerConf = storage.readJsonFile(args.schedulerConf)
+    if args.space:
+        searchSpace = storage.readJsonFile(args.space)
+    else:
+        cpus = scheduler.getAvailableCpus()
+        searchSpace = dict(DEFAULT_SEARCH_SPACE, num_search_workers=[
+            workers for workers in DEFAULT_SEARCH_SPACE['num_search_workers']
+            if workers <= cpus] or [1])
+    settings = getSettings(searchSpace, search=args.search,
+        samples=args.samples, seed=args.seed)
+    corpus = loadCorpus(dumpDirs=args.dumps, sizes=args.sizes,
+        schedulerConf=schedulerConf, seed=args.seed)
+    logging.getLogger('tune').info('Trying %d settings over %d models',
+        len(settings), len(corpus))
+    results = tune(corpus, settings, timeLimit=args.timeLimit,
+        rankBy=args.rankBy)
+    print(json.dumps(results, indent=2))
+    if args.save:
+        storage.writeJsonFile(args.save, results)
+    if args.output:
+        writeConfiguration(schedulerConf, results[0]['parameters'],
+            args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,507 @@
+'''The worker module keeps the scheduler running as a long-lived process
+
+Starting a new interpreter for each schedule means paying for the
+import of OR-Tools, the logging configuration and the parsing of the
+scheduler configuration on every request. In worker mode all of this is
+done once, and then schedule requests are read from an input stream
+until it is closed.
+
+The protocol is JSON-RPC 2.0, with one JSON object per line. Requests
+are read from the input stream and responses are written (also one per
+line) to the output stream. The supported methods are:
+
+    schedule:
+        Generates a schedule. The params must be a dict with either the
+        keys 'doctors', 'shiftConfs' and 'calendar' (the same dicts
+        accepted by scheduler.schedule), or the keys 'doctorsFile',
+        'shiftConfsFile' and 'calendarFile' (paths to JSON files with
+        that content). Optionally, 'scheduleFile' can be given, in which
+        case the generated schedule will also be stored in that path.
+        'solverParameters' can be given to override the CP-SAT 
+        parameters for this request (see scheduler.getSolverParameters).
+        If 'stats' is true, the schedule will contain performance 
+        information (see scheduler.schedule). A previous schedule can be
+        given as 'hint' (or 'hintFile') to warm-start the search, and
+        'repairHint' can be set to true to repair it if it is infeasible.
+        'incremental' can be given to only re-schedule the region 
+        affected by some changes (see scheduler.schedule). Its confirmed
+        schedule can be given as 'schedule' or 'scheduleFile'.
+        'decomposition' can be given to solve the month by blocks of 
+        weeks (see scheduler.schedule).
+        If 'heuristic' is true, the schedule is generated by the greedy
+        heuristic of the heuristic module instead of the solver (see the
+        --heuristic argument of the main module), and the other 
+        generation params are ignored.
+        'weightSets' can be given to solve several weightings of the 
+        objective at once, and 'alternatives' to generate several 
+        diverse schedules. The result is then the list described in 
+        scheduler.schedule instead of a schedule.
+        If the worker has a cache (see the --cacheDir and --memoryCache
+        arguments of the main module), the schedules are taken from it
+        when possible. 'cache' can be set to false to skip it.
+        If the worker exports metrics (see the --metricsFile and 
+        --metricsPort arguments of the main module), the ones of each 
+        schedule are added to them.
+        If 'progress' is true, a progress notification is sent for each
+        improving schedule found while the search continues:
+            {"jsonrpc": "2.0", "method": "progress",
+             "params": {"id": 1, "schedule": {...}, 
+                        "progress": {"solution": 1, "objective": 10, 
+                                     "bestBound": 12, "wallTime": 0.5}}}
+
+        The result is the generated schedule
+
+        Example request:
+            {"jsonrpc": "2.0", "id": 1, "method": "schedule",
+             "params": {"doctorsFile": "doctors.json",
+                        "shiftConfsFile": "shiftConfs.json",
+                        "calendarFile": "calendar.json"}}
+
+    reloadConfiguration:
+        Reads the scheduler configuration again. The result is true
+
+    cacheCounters:
+        The result is a dict with the hits, misses and entries of the
+        cache of the worker (see the cache module), or null if the 
+        worker has no cache
+
+    shutdown:
+        Stops the worker after sending the response. The result is true
+
+Requests without an 'id' are notifications, and no response is sent for
+them. Errors follow the JSON-RPC 2.0 specification, e.g.:
+    {"jsonrpc": "2.0", "id": 1,
+     "error": {"code": -32602, "message": "Missing the day 3 ..."}}
+The params of a schedule request are checked before generating the 
+schedule (see checkScheduleParams), and only those checks give an 
+INVALID_PARAMS error. Any other failure gives an INTERNAL_ERROR, and its
+traceback is logged
+
+There is also a streaming mode without the JSON-RPC envelope (see 
+streamJobs), meant to pipe many jobs through one process. Each line read
+is a job record with the params of a schedule request and an optional 
+'id' (the line number by default):
+    {"id": "cardiology", "doctorsFile": "cardiology/doctors.json", 
+     "shiftConfsFile": "cardiology/shiftConfs.json", 
+     "calendarFile": "cardiology/calendar.json",
+     "scheduleFile": "cardiology/schedule.json"}
+and one result record is written as soon as each job finishes:
+    {"id": "cardiology", "status": "PENDING_CONFIRMATION", 
+     "scheduleFile": "cardiology/schedule.json"}
+The schedule is included in the record (as 'schedule') only if no 
+scheduleFile was given. Jobs that cannot be run get a record with an 
+'error' message instead of a 'status'
+
+Author: miggoncan
+'''
+
+import json
+import logging
+import traceback
+
+import heuristic
+import scheduler
+import storage
+
+JSON_RPC_VERSION = '2.0'
+
+# Error codes defined by the JSON-RPC 2.0 specification
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+# The types of the params of a schedule request. A None value is the 
+# same as not giving the param
+SCHEDULE_PARAM_TYPES = {
+    'doctors': list,
+    'shiftConfs': list,
+    'calendar': dict,
+    'doctorsFile': str,
+    'shiftConfsFile': str,
+    'calendarFile': str,
+    'scheduleFile': str,
+    'solverParameters': dict,
+    'stats': bool,
+    'hint': dict,
+    'hintFile': str,
+    'repairHint': bool,
+    'incremental': dict,
+    'decomposition': dict,
+    'heuristic': bool,
+    'weightSets': list,
+    'alternatives': dict,
+    'cache': bool,
+    'progress': bool
+}
+
+
+class JsonRpcError(Exception):
+    '''Raised while handling a request to send an error response'''
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def readParamFile(params, key):
+    '''Read the JSON file whose path is the given param
+
+    Raises:
+        JsonRpcError if the file cannot be read
+    '''
+    if not isinstance(params[key], str):
+        raise JsonRpcError(INVALID_PARAMS, 
+            'The param {} must be a string'.format(key))
+    try:
+        return storage.readJsonFile(params[key])
+    except (OSError, ValueError) as e:
+        raise JsonRpcError(INVALID_PARAMS, 
+            'The param {} is not a readable JSON file: {}'.format(key, e))
+
+
+def getScheduleInputs(params):
+    '''Extract the doctors, shiftConfs and calendar dicts from the params
+    of a schedule request
+
+    Each of them can be given inline, or as the path of a JSON file (see
+    the documentation of this module)
+
+    Returns:
+        A tuple as (doctors, shiftConfs, calendarDict)
+
+    Raises:
+        JsonRpcError if any of them is missing or cannot be read
+    '''
+    inputs = []
+    for key in ('doctors', 'shiftConfs', 'calendar'):
+        if params.get(key, None) is not None:
+            inputs.append(params[key])
+        elif params.get(key + 'File', None) is not None:
+            inputs.append(readParamFile(params, key + 'File'))
+        else:
+            raise JsonRpcError(INVALID_PARAMS,
+                'Missing the param {0} or {0}File'.format(key))
+    return tuple(inputs)
+
+
+def checkParamTypes(params):
+    '''Check the types of the params of a schedule request (see 
+    SCHEDULE_PARAM_TYPES)
+
+    Raises:
+        JsonRpcError with the INVALID_PARAMS code if any of them has 
+        another type
+    '''
+    for key, paramType in SCHEDULE_PARAM_TYPES.items():
+        value = params.get(key, None)
+        if value is not None and not isinstance(value, paramType):
+            raise JsonRpcError(INVALID_PARAMS, 'The param {} must be {}'
+                .format(key, {list: 'an array', dict: 'an object', 
+                    str: 'a string', bool: 'a boolean'}[paramType]))
+
+
+def checkScheduleParams(params, doctors, shiftConfs, calendarDict):
+    '''Check the params of a schedule request before generating the 
+    schedule, so that the failures of the scheduler are not taken for 
+    invalid params
+
+    The inputs are checked (see scheduler.validateInputs), as well as 
+    the weightSets, the alternatives and the month of the incremental 
+    schedule. The types are checked before reading the inputs (see 
+    checkParamTypes)
+
+    Args:
+        params: the params of the request, with the incremental schedule
+            already read (if given as a file)
+        doctors, shiftConfs, calendarDict: the inputs of the request (see
+            getScheduleInputs)
+
+    Raises:
+        JsonRpcError with the INVALID_PARAMS code if any of the checks 
+        fails
+    '''
+    errors = [issue for issue in scheduler.validateInputs(doctors, 
+        shiftConfs, calendarDict) if issue['level'] == 'error']
+    if errors:
+        raise JsonRpcError(INVALID_PARAMS, 'The inputs are not valid. ' 
+            + '; '.join('{}: {}'.format(issue['path'], issue['message']) 
+                for issue in errors))
+    try:
+        if params.get('weightSets', None) is not None:
+            scheduler.checkWeightSets(params['weightSets'])
+        if params.get('alternatives', None) is not None:
+            scheduler.checkAlternatives(params['alternatives'], 
+                params.get('weightSets', None))
+    except ValueError as e:
+        raise JsonRpcError(INVALID_PARAMS, str(e))
+    incremental = params.get('incremental', None)
+    if incremental is not None:
+        confirmed = incremental.get('schedule', None)
+        if not isinstance(confirmed, dict) \
+                or confirmed.get('year') != calendarDict['year'] \
+                or confirmed.get('month') != calendarDict['month']:
+            raise JsonRpcError(INVALID_PARAMS, 'The param '
+                'incremental.schedule must be a schedule of {}-{}'.format(
+                    calendarDict['year'], calendarDict['month']))
+
+
+class Worker:
+    '''Serves the requests described in the documentation of this module
+
+    Attributes:
+        schedulerConf: the scheduler configuration used for all the
+            schedules. See scheduler.getConfiguration
+        cache: the cache of schedules, or None
+        running: a bool. It will be False once a shutdown request has
+            been handled
+    '''
+    def __init__(self, loadConfiguration, send, cache=None, metrics=None):
+        '''
+        Args:
+            loadConfiguration: a callable without arguments returning the
+                scheduler configuration dict. It is called now and
+                whenever a reloadConfiguration request is received
+            send: a callable receiving a dict that has to be sent to the
+                output stream. Used for the progress notifications
+            cache: optional. The cache of schedules used for all the 
+                requests. See the cache argument of scheduler.schedule
+            metrics: optional. A metrics.ScheduleMetrics to which the 
+                metrics of each generated schedule are added. Its 
+                textfile is written after each schedule
+        '''
+        self.log = logging.getLogger('worker')
+        self.loadConfiguration = loadConfiguration
+        self.send = send
+        self.cache = cache
+        self.metrics = metrics
+        self.schedulerConf = loadConfiguration()
+        self.running = True
+        self.methods = {
+            'schedule': self.schedule,
+            'reloadConfiguration': self.reloadConfiguration,
+            'cacheCounters': self.cacheCounters,
+            'shutdown': self.shutdown
+        }
+
+    def schedule(self, requestId, params):
+        checkParamTypes(params)
+        doctors, shiftConfs, calendarDict = getScheduleInputs(params)
+        hint = params.get('hint', None)
+        if hint is None and params.get('hintFile', None) is not None:
+            hint = readParamFile(params, 'hintFile')
+        incremental = params.get('incremental', None)
+        if incremental is not None and 'schedule' not in incremental:
+            if 'scheduleFile' not in incremental:
+                raise JsonRpcError(INVALID_PARAMS, 'Missing the param '
+                    'incremental.schedule or incremental.scheduleFile')
+            incremental = dict(incremental)
+            incremental['schedule'] = readParamFile(incremental, 
+                'scheduleFile')
+            params = dict(params, incremental=incremental)
+        checkScheduleParams(params, doctors, shiftConfs, calendarDict)
+        onSolution = None
+        if params.get('progress', False):
+            def onSolution(schedule, progress):
+                self.send({'jsonrpc': JSON_RPC_VERSION, 'method': 'progress',
+                    'params': {'id': requestId, 'schedule': schedule, 
+                        'progress': progress}})
+        collectStats = params.get('stats', False)
+        # The metrics are taken from the stats
+        if params.get('heuristic', False):
+            schedule = heuristic.schedule(doctors, shiftConfs, 
+                calendarDict, self.schedulerConf, 
+                collectStats=collectStats or self.metrics is not None)
+        else:
+            schedule = scheduler.schedule(doctors, shiftConfs, 
+                calendarDict, self.schedulerConf, onSolution=onSolution,
+                solverParameters=params.get('solverParameters', None),
+                collectStats=collectStats or self.metrics is not None, 
+                hint=hint,
+                repairHint=params.get('repairHint', False),
+                incremental=incremental, 
+                cache=None if params.get('cache', None) is False 
+                    else self.cache,
+                decomposition=params.get('decomposition', None),
+                weightSets=params.get('weightSets', None),
+                alternatives=params.get('alternatives', None))
+        if self.metrics is not None:
+            # With weightSets or alternatives, a list is returned
+            generatedSchedules = [entry['schedule'] for entry in schedule] \
+                if isinstance(schedule, list) else [schedule]
+            for generatedSchedule in generatedSchedules:
+                self.metrics.observeSchedule(generatedSchedule, 
+                    len(shiftConfs))
+                if not collectStats:
+                    generatedSchedule.pop('stats', None)
+            self.metrics.writeTextfile()
+        scheduleFilePath = params.get('scheduleFile', None)
+        if scheduleFilePath:
+            self.log.debug('Storing the schedule at: %s', scheduleFilePath)
+            storage.writeJsonFile(scheduleFilePath, schedule)
+        return schedule
+
+    def reloadConfiguration(self, requestId, params):
+        self.log.info('Reloading the scheduler configuration')
+        self.schedulerConf = self.loadConfiguration()
+        return True
+
+    def cacheCounters(self, requestId, params):
+        if self.cache is None:
+            return None
+        return self.cache.counters()
+
+    def shutdown(self, requestId, params):
+        self.log.info('Shutdown requested')
+        self.running = False
+        return True
+
+    def handleLine(self, line):
+        '''Handle one line read from the input stream
+
+        Returns:
+            The response dict to be sent, or None if no response has to
+            be sent
+        '''
+        requestId = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise JsonRpcError(PARSE_ERROR, 'Parse error: {}'.format(e))
+            if not isinstance(request, dict) \
+                    or not isinstance(request.get('method', None), str):
+                raise JsonRpcError(INVALID_REQUEST, 'Invalid request')
+            requestId = request.get('id', None)
+            method = self.methods.get(request['method'], None)
+            if method is None:
+                raise JsonRpcError(METHOD_NOT_FOUND,
+                    'Method not found: {}'.format(request['method']))
+            params = request.get('params', {})
+            if not isinstance(params, dict):
+                raise JsonRpcError(INVALID_PARAMS, 'params must be an object')
+            self.log.info('Handling the request %s (%s)', requestId,
+                request['method'])
+            result = method(requestId, params)
+            if 'id' not in request:
+                return None
+            return {'jsonrpc': JSON_RPC_VERSION, 'id': requestId,
+                'result': result}
+        except JsonRpcError as e:
+            self.log.error('Request %s failed: %s', requestId, e.message)
+            return {'jsonrpc': JSON_RPC_VERSION, 'id': requestId,
+                'error': {'code': e.code, 'message': e.message}}
+        except Exception as e:
+            self.log.error('An unexpected exception occurred: %s',
+                traceback.format_exc())
+            return {'jsonrpc': JSON_RPC_VERSION, 'id': requestId,
+                'error': {'code': INTERNAL_ERROR,
+                    'message': '{}: {}'.format(type(e).__name__, e)}}
+
+
+def streamJobs(inStream, outStream, loadConfiguration, cache=None, 
+        metrics=None):
+    '''Run each job read from inStream, writing its result record to 
+    outStream as soon as it finishes
+
+    The records are described in the documentation of this module. The
+    jobs are read one line at a time and nothing is kept after writing
+    their result, so the memory used does not grow with the number of 
+    jobs (apart from the cache, which is bounded). Progress is not 
+    reported in this mode, and weightSets and alternatives are ignored
+
+    Args:
+        inStream: a text file object from which the jobs are read
+        outStream: a text file object to which the results are written
+        loadConfiguration, cache, metrics: see Worker.__init__
+
+    Returns:
+        A tuple as (numJobs, numFailed), where numFailed is the number 
+        of jobs that could not be run
+    '''
+    log = logging.getLogger('worker')
+
+    def send(message):
+        outStream.write(json.dumps(message) + '\n')
+        outStream.flush()
+
+    worker = Worker(loadConfiguration, send, cache, metrics)
+    numJobs = 0
+    numFailed = 0
+    for lineNum, line in enumerate(inStream, start=1):
+        if not line.strip():
+            continue
+        numJobs += 1
+        jobId = lineNum
+        try:
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                raise JsonRpcError(PARSE_ERROR, 'Parse error: {}'.format(e))
+            if not isinstance(job, dict):
+                raise JsonRpcError(INVALID_REQUEST, 'A job must be an object')
+            jobId = job.get('id', lineNum)
+            log.info('Running the job %s', jobId)
+            params = dict(job)
+            # Each job generates a single schedule
+            params.pop('progress', None)
+            params.pop('weightSets', None)
+            params.pop('alternatives', None)
+            schedule = worker.schedule(jobId, params)
+            result = {'id': jobId, 'status': schedule['status']}
+            if params.get('scheduleFile', None):
+                result['scheduleFile'] = params['scheduleFile']
+            else:
+                result['schedule'] = schedule
+        except JsonRpcError as e:
+            log.error('The job %s failed: %s', jobId, e.message)
+            result = {'id': jobId, 'error': e.message}
+        except Exception as e:
+            log.error('The job %s failed: %s', jobId, traceback.format_exc())
+            result = {'id': jobId, 
+                'error': '{}: {}'.format(type(e).__name__, e)}
+        if 'error' in result:
+            numFailed += 1
+        send(result)
+        # Released before reading the next job
+        schedule = result = None
+    log.info('%d jobs finished, %d failed', numJobs, numFailed)
+    return numJobs, numFailed
+
+
+def serve(inStream, outStream, loadConfiguration, cache=None, 
+        metrics=None):
+    '''Serve requests read from inStream until it is closed or a
+    shutdown request is received
+
+    Args:
+        inStream: a text file object from which the requests are read
+        outStream: a text file object to which the responses are written
+        loadConfiguration, cache, metrics: see Worker.__init__
+    '''
+    log = logging.getLogger('worker')
+
+    def send(message):
+        outStream.write(json.dumps(message) + '\n')
+        outStream.flush()
+
+    worker = Worker(loadConfiguration, send, cache, metrics)
+    # OR-Tools is imported before the first request, so that it does not
+    # pay for the import
+    try:
+        scheduler.importSolver()
+    except ImportError:
+        log.warning('Could not preload OR-Tools. The schedules will only be '
+            'generated if the heuristicFallback configuration is enabled')
+    log.info('Worker ready')
+    for line in inStream:
+        if not line.strip():
+            continue
+        response = worker.handleLine(line)
+        if response is not None:
+            send(response)
+        if not worker.running:
+            break
+    log.info('Worker stopped')
@@ -0,0 +1,80 @@
+import itertools
+
+import pytest
+
+import generator
+import scheduler
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+def scheduleAlternatives(workload, alternatives):
+    return scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], workload['schedulerConf'],
+        solverParameters=SOLVER_PARAMETERS, collectStats=True,
+        alternatives=alternatives)
+
+
+def getAssignments(generatedSchedule):
+    return {(doctor['id'], day['day'], kind)
+        for day in generatedSchedule['days']
+        for kind in ('shifts', 'consultations')
+        for doctor in day[kind]}
+
+
+def getDistance(schedule1, schedule2):
+    return len(getAssignments(schedule1) ^ getAssignments(schedule2))
+
+
+def test_alternativesAreAtTheMinDistance():
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    found = scheduleAlternatives(workload, {'count': 4, 'minDistance': 6})
+    assert len(found) == 4
+    assert found[0]['gap'] == 0
+    assert found[0]['distance'] is None
+    assert found[0]['objective'] == found[0]['schedule']['stats']['objective']
+    for entry in found:
+        assert entry['schedule']['status'] == 'PENDING_CONFIRMATION'
+        assert entry['objective'] <= found[0]['objective']
+    for entry1, entry2 in itertools.combinations(found, 2):
+        assert getDistance(entry1['schedule'], entry2['schedule']) >= 6
+    for k, entry in enumerate(found[1:], start=1):
+        assert entry['distance'] == min(getDistance(entry['schedule'],
+            other['schedule']) for other in found[:k])
+
+
+def test_alternativesWithinTheMaxGap():
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    found = scheduleAlternatives(workload, {'count': 3, 'minDistance': 2,
+        'maxGap': 0})
+    assert found
+    for entry in found:
+        assert entry['objective'] == found[0]['objective']
+        assert entry['gap'] == 0
+
+
+def test_alternativesOfAnInfeasibleProblem():
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    for shiftConf in workload['shiftConfs']:
+        shiftConf.update(maxShifts=0, hasShiftsOnlyWhenCycleShifts=False,
+            doesCycleShifts=False)
+    found = scheduleAlternatives(workload, {'count': 2, 'minDistance': 1})
+    assert len(found) == 1
+    assert found[0]['schedule']['status'] == 'GENERATION_ERROR'
+    assert found[0]['objective'] is None
+
+
+@pytest.mark.parametrize('alternatives, weightSets', [
+    ({'count': 0, 'minDistance': 1}, None),
+    ({'count': 2, 'minDistance': 0}, None),
+    ({'count': 2, 'minDistance': 1, 'maxGap': -1}, None),
+    ({'count': 2}, None),
+    ([2, 1], None),
+    ({'count': 2, 'minDistance': 1}, [{}])
+])
+def test_checkAlternatives(alternatives, weightSets):
+    with pytest.raises(ValueError):
+        scheduler.checkAlternatives(alternatives, weightSets)
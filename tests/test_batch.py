@@ -0,0 +1,130 @@
+import concurrent.futures
+import json
+import logging
+
+import pytest
+
+import batch
+import generator
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+@pytest.mark.parametrize('cpus, numJobs, kwargs, expected', [
+    (32, 10, {}, (4, 8)),
+    (32, 2, {}, (2, 16)),
+    (4, 10, {}, (1, 4)),
+    (32, 10, {'workersPerJob': 2}, (10, 2)),
+    (32, 10, {'poolWidth': 8}, (8, 4)),
+    (32, 10, {'poolWidth': 3, 'workersPerJob': 2}, (3, 2)),
+    (8, 0, {}, (1, 8))
+])
+def test_splitCpus(cpus, numJobs, kwargs, expected):
+    assert batch.splitCpus(cpus, numJobs, **kwargs) == expected
+
+
+def writeManifest(directory, jobs):
+    manifestPath = directory / 'manifest.json'
+    manifestPath.write_text(json.dumps({'jobs': jobs}))
+    return manifestPath
+
+
+def test_readManifestMakesThePathsAbsolute(tmp_path):
+    manifestPath = writeManifest(tmp_path, [
+        {'name': 'june', 'doctorsFile': 'doctors.json',
+            'shiftConfsFile': 'shiftConfs.json',
+            'calendarFile': '/calendars/june.json',
+            'scheduleFile': 'out/june.json'},
+        {'doctorsFile': 'doctors.json', 'shiftConfsFile': 'shiftConfs.json',
+            'calendarFile': 'july.json', 'scheduleFile': 'july.json'}
+    ])
+    jobs = batch.readManifest(manifestPath)
+    assert [job['name'] for job in jobs] == ['june', '1']
+    assert jobs[0]['doctorsFile'] == str(tmp_path / 'doctors.json')
+    assert jobs[0]['calendarFile'] == '/calendars/june.json'
+    assert jobs[0]['scheduleFile'] == str(tmp_path / 'out' / 'june.json')
+
+
+def test_readManifestRequiresTheFiles(tmp_path):
+    manifestPath = writeManifest(tmp_path, [
+        {'name': 'june', 'doctorsFile': 'doctors.json',
+            'shiftConfsFile': 'shiftConfs.json',
+            'calendarFile': 'june.json'}
+    ])
+    with pytest.raises(ValueError, match='scheduleFile'):
+        batch.readManifest(manifestPath)
+
+
+def writeJob(directory, name, workload):
+    job = {'name': name}
+    for key, content in (('doctorsFile', workload['doctors']),
+            ('shiftConfsFile', workload['shiftConfs']),
+            ('calendarFile', workload['calendar'])):
+        job[key] = str(directory / '{}-{}.json'.format(name, key))
+        (directory / '{}-{}.json'.format(name, key)).write_text(
+            json.dumps(content))
+    job['scheduleFile'] = str(directory / '{}-schedule.json'.format(name))
+    return job
+
+
+def test_runJobCatchesTheErrors(tmp_path, monkeypatch):
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    monkeypatch.setattr(batch, 'processSchedulerConf',
+        workload['schedulerConf'])
+    job = writeJob(tmp_path, 'june', workload)
+    job['doctorsFile'] = str(tmp_path / 'missing.json')
+    summary = batch.runJob(job, SOLVER_PARAMETERS)
+    assert summary['status'] == 'FAILED'
+    assert summary['error'].startswith('FileNotFoundError')
+    assert not (tmp_path / 'june-schedule.json').exists()
+
+
+def writeConfigDir(directory, schedulerConf):
+    '''Write a configuration directory whose file handler is queued, as
+    in the default configuration. Returns the path of the log file'''
+    directory.mkdir()
+    logPath = directory / 'batch.log'
+    (directory / 'logging.json').write_text(json.dumps({'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {'file': {'class': 'logging.FileHandler',
+            'filename': str(logPath)}},
+        'queuedHandlers': ['file'],
+        'loggers': {'batch': {'level': 'INFO', 'handlers': ['file']}}}))
+    (directory / 'scheduler.json').write_text(json.dumps(schedulerConf))
+    return logPath
+
+
+def getBatchHandlerNames():
+    return [type(handler).__name__
+        for handler in logging.getLogger('batch').handlers]
+
+
+def test_initProcessDoesNotQueueTheHandlers(tmp_path):
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    configDir = tmp_path / 'config'
+    writeConfigDir(configDir, workload['schedulerConf'])
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1,
+            initializer=batch.initProcess, initargs=(configDir,)) as pool:
+        assert pool.submit(getBatchHandlerNames).result() == ['FileHandler']
+
+
+def test_runBatch(tmp_path):
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    configDir = tmp_path / 'config'
+    logPath = writeConfigDir(configDir, workload['schedulerConf'])
+    jobs = [writeJob(tmp_path, 'june', workload),
+        writeJob(tmp_path, 'broken', workload)]
+    jobs[1]['calendarFile'] = str(tmp_path / 'missing.json')
+
+    summaries = batch.runBatch(jobs, configDir, cpus=2,
+        solverParameters={'max_time_in_seconds': 60})
+    assert [summary['name'] for summary in summaries] == ['june', 'broken']
+    assert summaries[0]['status'] == 'PENDING_CONFIRMATION'
+    assert summaries[1]['status'] == 'FAILED'
+    schedule = json.loads((tmp_path / 'june-schedule.json').read_text())
+    assert schedule['status'] == 'PENDING_CONFIRMATION'
+    # The last records of the processes of the pool are not lost
+    logs = logPath.read_text()
+    assert 'Finished the job june with status PENDING_CONFIRMATION' in logs
+    assert 'Finished the job broken with status FAILED' in logs
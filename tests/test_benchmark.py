@@ -0,0 +1,60 @@
+import pytest
+
+import benchmark
+import generator
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+def makeResults(total, phases, status='OPTIMAL', size='100'):
+    return {'results': {size: {'total': total, 'phases': phases,
+        'status': status}}}
+
+
+def test_compareResultsWithinTheTolerance():
+    baseline = makeResults(1.0, {'solve': 0.8})
+    results = makeResults(1.1, {'solve': 0.9})
+    assert benchmark.compareResults(results, baseline, 0.2) == []
+
+
+def test_compareResultsReportsTheSlowerMeasures():
+    baseline = makeResults(1.0, {'solve': 0.8, 'preferences': 0.1})
+    results = makeResults(1.5, {'solve': 0.8, 'preferences': 0.2})
+    regressions = benchmark.compareResults(results, baseline, 0.2)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('100 doctors, total: 1.500s')
+    assert regressions[1].startswith('100 doctors, preferences: 0.200s')
+
+
+def test_compareResultsIgnoresTheNoise():
+    baseline = makeResults(0.01, {'solve': 0.001})
+    results = makeResults(0.04, {'solve': 0.03, 'objective': 5})
+    assert benchmark.compareResults(results, baseline, 0.2) == []
+
+
+def test_compareResultsIgnoresTheSizesNotInTheBaseline():
+    baseline = makeResults(1.0, {}, size='10')
+    results = makeResults(5.0, {}, size='100')
+    assert benchmark.compareResults(results, baseline, 0.2) == []
+
+
+def test_compareResultsReportsTheStatusChanges():
+    baseline = makeResults(1.0, {})
+    results = makeResults(1.0, {}, status='FEASIBLE')
+    assert benchmark.compareResults(results, baseline, 0.2) == [
+        '100 doctors: the status is FEASIBLE, but it was OPTIMAL in the '
+        'baseline']
+
+
+def test_runBenchmark():
+    pytest.importorskip('ortools')
+    schedulerConf = generator.generateWorkload(10, 2020, 6)['schedulerConf']
+    results = benchmark.runBenchmark([10, 15], schedulerConf=schedulerConf,
+        repetitions=2, solverParameters=SOLVER_PARAMETERS)
+    assert list(results['results']) == ['10', '15']
+    assert results['parameters']['repetitions'] == 2
+    for result in results['results'].values():
+        assert result['status'] == 'OPTIMAL'
+        assert result['total'] >= result['phases']['solve']
+        assert result['numVariables'] > 0
+    assert benchmark.compareResults(results, results, 0) == []
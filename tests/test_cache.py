@@ -0,0 +1,146 @@
+import os
+
+import pytest
+
+import cache
+import generator
+import scheduler
+
+
+@pytest.fixture
+def workload():
+    return generator.generateWorkload(10, 2020, 6, seed=0)
+
+
+def getKey(workload, schedulerConf=None, options=None):
+    return cache.getCacheKey(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], schedulerConf or {}, options)
+
+
+def test_getCacheKeyIgnoresTheOrderOfTheDoctors(workload):
+    key = getKey(workload)
+    workload['doctors'].reverse()
+    workload['shiftConfs'].reverse()
+    workload['calendar']['dayConfigurations'].reverse()
+    assert getKey(workload) == key
+
+
+def test_getCacheKeyKeepsTheOrderOfOtherLists(workload):
+    key = getKey(workload, options={'solverParameters': {
+        'subsolvers': ['core', 'no_lp']}})
+    assert key != getKey(workload, options={'solverParameters': {
+        'subsolvers': ['no_lp', 'core']}})
+    shiftConf = workload['shiftConfs'][0]
+    shiftConf['wantedShifts'] = [{'shift': 'Monday'}, {'shift': 'Friday'}]
+    key = getKey(workload)
+    shiftConf['wantedShifts'].reverse()
+    assert getKey(workload) != key
+
+
+def test_getCacheKeyDependsOnTheInputs(workload):
+    key = getKey(workload)
+    workload['shiftConfs'][0]['maxShifts'] += 1
+    assert getKey(workload) != key
+
+
+def test_getCacheKeyOnlyUsesTheConfigurationValues(workload):
+    key = getKey(workload, {'maxTimeInSeconds': {'value': 10,
+        'description': ['A']}})
+    assert getKey(workload, {'maxTimeInSeconds': {'value': 10,
+        'description': ['B']}, 'cacheMaxEntries': {'value': 5}}) == key
+    assert getKey(workload, {'maxTimeInSeconds': {'value': 20}}) != key
+
+
+def test_getCacheKeyWithInvalidInputs():
+    # The inputs are validated after the cache is checked
+    assert cache.getCacheKey([{'id': 'a'}, {'id': 1}, 3], None, {}, {})
+
+
+def test_memoryCacheEvictsTheLeastRecentlyUsed():
+    memoryCache = cache.MemoryScheduleCache(maxEntries=2)
+    memoryCache.put('a', {'value': 1})
+    memoryCache.put('b', {'value': 2})
+    assert memoryCache.get('a') == {'value': 1}
+    memoryCache.put('c', {'value': 3})
+    assert memoryCache.get('b') is None
+    assert memoryCache.get('c') == {'value': 3}
+    assert memoryCache.counters() == {'hits': 2, 'misses': 1, 'entries': 2}
+
+
+def test_memoryCacheReturnsCopies():
+    memoryCache = cache.MemoryScheduleCache()
+    memoryCache.put('a', {'days': []})
+    memoryCache.get('a')['days'].append(1)
+    assert memoryCache.get('a') == {'days': []}
+
+
+def test_diskCacheEvictsTheLeastRecentlyUsed(tmp_path):
+    diskCache = cache.DiskScheduleCache(tmp_path, maxEntries=2)
+    diskCache.put('a', {'value': 1})
+    diskCache.put('b', {'value': 2})
+    # The modification time is the last access time
+    os.utime(diskCache.getEntryPath('a'), (1, 1))
+    os.utime(diskCache.getEntryPath('b'), (2, 2))
+    assert diskCache.get('a') == {'value': 1}
+    diskCache.put('c', {'value': 3})
+    assert diskCache.get('b') is None
+    assert diskCache.get('a') == {'value': 1}
+    counters = diskCache.counters()
+    assert (counters['hits'], counters['misses'], counters['entries']) \
+        == (2, 1, 2)
+
+
+def test_diskCacheIsSharedByItsInstances(tmp_path):
+    cache.DiskScheduleCache(tmp_path).put('a', {'value': 1})
+    assert cache.DiskScheduleCache(tmp_path).get('a') == {'value': 1}
+
+
+def test_diskCacheEvictsByBytes(tmp_path):
+    diskCache = cache.DiskScheduleCache(tmp_path, maxBytes=100)
+    diskCache.put('a', {'value': 'x' * 80})
+    os.utime(diskCache.getEntryPath('a'), (1, 1))
+    diskCache.put('b', {'value': 'y' * 80})
+    assert diskCache.get('a') is None
+    assert diskCache.get('b') is not None
+
+
+@pytest.mark.parametrize('stats, optimal', [
+    ({'status': 'OPTIMAL'}, True),
+    ({'status': 'FEASIBLE'}, False),
+    ({'status': 'UNKNOWN', 'heuristic': True}, False),
+    ({'status': 'FEASIBLE', 'decomposition': {
+        'blockStatuses': ['OPTIMAL', 'OPTIMAL'], 'repairedDoctors': []}},
+        False),
+    ({'status': 'FEASIBLE', 'decomposition': {
+        'blockStatuses': ['OPTIMAL', 'FEASIBLE'], 'repairedDoctors': []}},
+        False),
+    ({'status': 'FEASIBLE', 'decomposition': {
+        'blockStatuses': ['OPTIMAL', 'OPTIMAL'], 'repairedDoctors': [3]}},
+        False)
+])
+def test_isOptimal(stats, optimal):
+    assert scheduler.isOptimal(stats) is optimal
+
+
+def scheduleWithCache(workload, memoryCache, solverParameters):
+    return scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], workload['schedulerConf'], cache=memoryCache,
+        solverParameters=solverParameters)
+
+
+def test_scheduleOnlyCachesOptimalSchedules(workload):
+    pytest.importorskip('ortools')
+    memoryCache = cache.MemoryScheduleCache()
+    # The solver finds no schedule, so the heuristic one is returned
+    generatedSchedule = scheduleWithCache(workload, memoryCache,
+        {'max_time_in_seconds': 0})
+    assert generatedSchedule['heuristic'] is True
+    assert 'stats' not in generatedSchedule
+    assert memoryCache.counters()['entries'] == 0
+    solverParameters = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+    generatedSchedule = scheduleWithCache(workload, memoryCache,
+        solverParameters)
+    assert memoryCache.counters()['entries'] == 1
+    assert scheduleWithCache(workload, memoryCache, solverParameters) \
+        == generatedSchedule
+    assert memoryCache.counters()['hits'] == 1
@@ -0,0 +1,128 @@
+import datetime
+
+import pytest
+
+import cache
+import generator
+import scheduler
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+def getDays(year, month, numDays):
+    return [datetime.date(year, month, day) for day in range(1, numDays + 1)]
+
+
+def test_getDecompositionBlocksMergesTheLastDays():
+    # June 2020 starts on Monday, so the 29th and the 30th are a short week
+    daysOfMonth = getDays(2020, 6, 30)
+    blocks = scheduler.getDecompositionBlocks(daysOfMonth, list(range(1, 31)),
+        weeksPerBlock=1)
+    assert blocks == [list(range(1, 8)), list(range(8, 15)),
+        list(range(15, 22)), list(range(22, 31))]
+    blocks = scheduler.getDecompositionBlocks(daysOfMonth, list(range(1, 31)),
+        weeksPerBlock=2)
+    assert blocks == [list(range(1, 15)), list(range(15, 31))]
+
+
+def test_getDecompositionBlocksMergesTheFirstDays():
+    # November 2020 starts on Sunday. Only the weekdays are working days
+    daysOfMonth = getDays(2020, 11, 30)
+    workingDays = [day.day for day in daysOfMonth if day.weekday() < 5]
+    blocks = scheduler.getDecompositionBlocks(daysOfMonth, workingDays,
+        weeksPerBlock=1)
+    assert blocks == [[2, 3, 4, 5, 6], [9, 10, 11, 12, 13],
+        [16, 17, 18, 19, 20], [23, 24, 25, 26, 27, 30]]
+    assert scheduler.getDecompositionBlocks(daysOfMonth, [1, 2],
+        weeksPerBlock=1) == [[1, 2]]
+
+
+@pytest.mark.parametrize('total, sizes, shares', [
+    (10, [5, 5], [5, 5]),
+    (9, [7, 7, 9], [3, 3, 3]),
+    (4, [7, 7, 7, 9], [1, 1, 1, 1]),
+    (5, [10, 5], [3, 2]),
+    (3, [0, 0], [0, 0]),
+    (0, [7, 7], [0, 0])
+])
+def test_prorate(total, sizes, shares):
+    assert scheduler.prorate(total, sizes) == shares
+
+
+def test_prorateSpreadsTheExtraUnitsWithTheOffset():
+    sizes = [7, 7, 7, 7]
+    extraShares = [scheduler.prorate(1, sizes, offset).index(1)
+        for offset in range(4)]
+    assert sorted(extraShares) == [0, 1, 2, 3]
+    for offset in range(4):
+        assert sum(scheduler.prorate(6, sizes, offset)) == 6
+
+
+def makeDay(dayNum, docIds):
+    return {'day': dayNum, 'isWorkingDay': True, 'cycle': [],
+        'shifts': [{'id': docId} for docId in docIds], 'consultations': []}
+
+
+def test_stitchBlockSchedules():
+    dayConfs = [{'day': dayNum, 'isWorkingDay': dayNum != 3}
+        for dayNum in range(1, 5)]
+    blockSchedules = [{'year': 2020, 'month': 6,
+            'status': 'PENDING_CONFIRMATION',
+            'days': [makeDay(dayNum, [b]) for dayNum in range(1, 5)]}
+        for b in range(2)]
+    stitched = scheduler.stitchBlockSchedules(blockSchedules, [[1, 2], [4]],
+        dayConfs)
+    assert stitched['status'] == 'PENDING_CONFIRMATION'
+    assert [day['shifts'] for day in stitched['days']] == [[{'id': 0}],
+        [{'id': 0}], [{'id': 0}], [{'id': 1}]]
+    assert [day['isWorkingDay'] for day in stitched['days']] \
+        == [True, True, False, True]
+    # The block schedules are not modified
+    assert all(day['isWorkingDay'] for day in blockSchedules[0]['days'])
+
+
+def scheduleDecomposed(workload, **kwargs):
+    return scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], workload['schedulerConf'],
+        solverParameters=SOLVER_PARAMETERS, collectStats=True,
+        decomposition={'processes': 1}, **kwargs)
+
+
+def test_scheduleDecomposed():
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(30, 2020, 6, seed=0)
+    generatedSchedule = scheduleDecomposed(workload)
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert len(generatedSchedule['days']) == 30
+    assert scheduler.getBoundViolations(generatedSchedule,
+        workload['shiftConfs']) == []
+    stats = generatedSchedule['stats']
+    assert len(stats['decomposition']['blocks']) == 4
+    assert stats['bestBound'] is None
+
+
+def test_scheduleDecomposedRepairsTheMonthlyBounds(monkeypatch):
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(30, 2020, 6, seed=0)
+    # Each block can give the doctors their monthly maximum, so the
+    # stitched schedule has too many shifts
+    def getBlockShiftConfs(shiftConfs, blocks, forcedShifts):
+        return [[dict(shiftConf, minShifts=0) for shiftConf in shiftConfs]
+            for _ in blocks]
+    monkeypatch.setattr(scheduler, 'getBlockShiftConfs', getBlockShiftConfs)
+    generatedSchedule = scheduleDecomposed(workload)
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert generatedSchedule['stats']['decomposition']['repairedDoctors']
+    assert 'repair' in generatedSchedule['stats']['phases']
+    assert scheduler.getBoundViolations(generatedSchedule,
+        workload['shiftConfs']) == []
+
+
+def test_decomposedSchedulesAreNotCached():
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(30, 2020, 6, seed=0)
+    memoryCache = cache.MemoryScheduleCache()
+    generatedSchedule = scheduleDecomposed(workload, cache=memoryCache)
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert generatedSchedule['stats']['cacheHit'] is False
+    assert memoryCache.counters()['entries'] == 0
@@ -0,0 +1,119 @@
+import random
+
+import pytest
+
+import generator
+import scheduler
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+SHIFT_CONF = {'minShifts': 2, 'maxShifts': 5, 'numConsultations': 2,
+    'doesCycleShifts': False, 'hasShiftsOnlyWhenCycleShifts': False}
+
+
+def generate(numClones=6):
+    '''Return a workload with numClones interchangeable doctors added to
+    a generated one'''
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    for docId in range(100, 100 + numClones):
+        workload['doctors'].append({'id': docId,
+            'startDate': '2019-01-01', 'absence': None})
+        workload['shiftConfs'].append(dict(SHIFT_CONF, doctorId=docId,
+            wantedConsultations=[], wantedShifts=[], unwantedShifts=[],
+            unavailableShifts=[], mandatoryShifts=[]))
+    for dayConf in workload['calendar']['dayConfigurations'][::3]:
+        if dayConf['isWorkingDay']:
+            dayConf['numConsultations'] = 1
+    return workload
+
+
+def scheduleWorkload(workload, aggregate):
+    schedulerConf = dict(workload['schedulerConf'],
+        aggregateEquivalentDoctors={'value': aggregate})
+    return scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], schedulerConf,
+        solverParameters=SOLVER_PARAMETERS, collectStats=True)
+
+
+def countAssignments(generatedSchedule, docId):
+    numShifts = sum(1 for day in generatedSchedule['days']
+        for doctor in day['shifts'] if doctor['id'] == docId)
+    numConsultations = sum(1 for day in generatedSchedule['days']
+        for doctor in day['consultations'] if doctor['id'] == docId)
+    return numShifts, numConsultations
+
+
+def test_aggregationKeepsTheObjective():
+    pytest.importorskip('ortools')
+    workload = generate()
+    aggregated = scheduleWorkload(workload, True)
+    unaggregated = scheduleWorkload(workload, False)
+    assert aggregated['stats']['status'] == 'OPTIMAL'
+    assert unaggregated['stats']['status'] == 'OPTIMAL'
+    assert aggregated['stats']['objective'] \
+        == unaggregated['stats']['objective']
+    assert aggregated['stats']['numVariables'] \
+        < unaggregated['stats']['numVariables']
+    for docId in range(100, 106):
+        numShifts, numConsultations = countAssignments(aggregated, docId)
+        assert numShifts >= SHIFT_CONF['minShifts']
+        assert numShifts + numConsultations <= SHIFT_CONF['maxShifts']
+        assert numConsultations <= SHIFT_CONF['numConsultations']
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_expandedRowsRespectTheirBounds(seed):
+    pytest.importorskip('ortools')
+    # The counts of a random distribution within the bounds
+    rng = random.Random(seed)
+    numDoctors = rng.randint(2, 6)
+    numDays = 20
+    shiftCounts = [0] * numDays
+    consultationCounts = [0] * numDays
+    for _ in range(numDoctors):
+        numConsultations = rng.randint(0, SHIFT_CONF['numConsultations'])
+        numShifts = rng.randint(SHIFT_CONF['minShifts'],
+            SHIFT_CONF['maxShifts'] - numConsultations)
+        days = rng.sample(range(numDays), numShifts + numConsultations)
+        for j in days[:numShifts]:
+            shiftCounts[j] += 1
+        for j in days[numShifts:]:
+            consultationCounts[j] += 1
+
+    shiftRows, consultationRows = scheduler.expandDoctorCounts(numDoctors,
+        shiftCounts, consultationCounts, shiftConf=SHIFT_CONF)
+    assert [sum(column) for column in zip(*shiftRows)] == shiftCounts
+    assert [sum(column) for column in zip(*consultationRows)] \
+        == consultationCounts
+    for shiftRow, consultationRow in zip(shiftRows, consultationRows):
+        assert not any(shift and consultation
+            for shift, consultation in zip(shiftRow, consultationRow))
+        assert sum(shiftRow) >= SHIFT_CONF['minShifts']
+        assert sum(shiftRow) + sum(consultationRow) \
+            <= SHIFT_CONF['maxShifts']
+        assert sum(consultationRow) <= SHIFT_CONF['numConsultations']
+
+
+def test_expandDoctorCountsWithoutAValidDistribution():
+    pytest.importorskip('ortools')
+    # Two shifts cannot give each of the 2 doctors their minimum of 2
+    assert scheduler.expandDoctorCounts(2, [1, 1, 0], [0, 0, 0],
+        shiftConf=SHIFT_CONF) is None
+
+
+def test_scheduleIsSolvedAgainWithoutAggregation(monkeypatch):
+    pytest.importorskip('ortools')
+    workload = generate()
+    unaggregated = scheduleWorkload(workload, False)
+    calls = []
+    def failingExpansion(*args, **kwargs):
+        calls.append(args)
+        return None
+    monkeypatch.setattr(scheduler, 'expandDoctorCounts', failingExpansion)
+    generatedSchedule = scheduleWorkload(workload, True)
+    assert calls
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert generatedSchedule['stats']['numVariables'] \
+        == unaggregated['stats']['numVariables']
+    assert generatedSchedule['stats']['objective'] \
+        == unaggregated['stats']['objective']
@@ -0,0 +1,117 @@
+import pytest
+
+import scheduler
+
+cp_model = pytest.importorskip('ortools.sat.python.cp_model')
+
+PARAMETERS = {'num_search_workers': 1}
+
+
+def buildModel(names):
+    '''Return a model with the constraints of the given names, and its
+    labeled constraints. Its only minimal conflicts are MINIMAL_CONFLICTS
+    '''
+    model = cp_model.CpModel()
+    x = model.NewBoolVar('x')
+    y = model.NewBoolVar('y')
+    z = model.NewBoolVar('z')
+    constraints = {
+        'xTrue': lambda: model.Add(x == 1),
+        'xFalse': lambda: model.Add(x == 0),
+        'yTrue': lambda: model.Add(y == 1),
+        'noneOfXY': lambda: model.Add(x + y == 0),
+        'zTrue': lambda: model.Add(z == 1),
+        'atMostTwo': lambda: model.Add(x + y + z <= 2)
+    }
+    return model, [(constraints[name](), {'constraint': name})
+        for name in names]
+
+
+ALL_CONSTRAINTS = ['zTrue', 'atMostTwo', 'yTrue', 'xTrue', 'noneOfXY',
+    'xFalse']
+MINIMAL_CONFLICTS = [{'xTrue', 'xFalse'}, {'xTrue', 'noneOfXY'},
+    {'yTrue', 'noneOfXY'}, {'xTrue', 'yTrue', 'zTrue', 'atMostTwo'}]
+
+
+def isFeasible(names):
+    model, _ = buildModel(names)
+    solver = cp_model.CpSolver()
+    return solver.Solve(model) in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+
+
+@pytest.fixture(autouse=True)
+def solver():
+    scheduler.importSolver()
+
+
+def test_explainInfeasibilityReturnsAMinimalConflict():
+    model, labeledConstraints = buildModel(ALL_CONSTRAINTS)
+    issues = scheduler.explainInfeasibility(model, labeledConstraints,
+        PARAMETERS, 10)
+    conflict = {issue['constraint'] for issue in issues}
+    assert conflict in MINIMAL_CONFLICTS
+    assert not isFeasible(conflict)
+    for name in conflict:
+        assert isFeasible(conflict - {name})
+
+
+@pytest.mark.parametrize('names', [
+    ['xTrue', 'yTrue', 'zTrue', 'atMostTwo'],
+    ['atMostTwo', 'zTrue', 'yTrue', 'xTrue'],
+    ['zTrue', 'xTrue', 'xFalse', 'atMostTwo', 'yTrue']
+])
+def test_explainInfeasibilityKeepsTheNeededConstraints(names):
+    model, labeledConstraints = buildModel(names)
+    issues = scheduler.explainInfeasibility(model, labeledConstraints,
+        PARAMETERS, 10)
+    conflict = {issue['constraint'] for issue in issues}
+    assert conflict in MINIMAL_CONFLICTS
+
+
+def test_explainInfeasibilityWithoutConflict():
+    model, labeledConstraints = buildModel(['xTrue', 'yTrue', 'zTrue'])
+    assert scheduler.explainInfeasibility(model, labeledConstraints,
+        PARAMETERS, 10) == []
+
+
+def test_explainInfeasibilityKeepsTheConstraintsAlreadyTested(monkeypatch):
+    # The model is only infeasible with d. Removing a cannot be decided
+    # in time, so a is kept. The solver then proves [a, c, d] infeasible
+    # with the sufficient set {c, d}, which must not drop a nor skip c
+    from ortools.sat import sat_parameters_pb2
+    model = cp_model.CpModel()
+    names = {}
+    labeledConstraints = []
+    for name in 'abcd':
+        var = model.NewBoolVar(name)
+        labeledConstraints.append((model.Add(var == 1), {'constraint': name}))
+    numSolves = []
+
+    class FakeSolver:
+        def __init__(self):
+            self.parameters = sat_parameters_pb2.SatParameters()
+
+        def Solve(self, solvedModel):
+            proto = solvedModel.Proto()
+            if not names:
+                # The first solve assumes all the enforcement literals
+                names.update(zip(proto.assumptions, 'abcd'))
+            self.assumptions = {names[index] for index in proto.assumptions}
+            numSolves.append(self.assumptions)
+            if self.assumptions == set('bcd'):
+                return cp_model.UNKNOWN
+            if 'd' in self.assumptions:
+                return cp_model.INFEASIBLE
+            return cp_model.OPTIMAL
+
+        def SufficientAssumptionsForInfeasibility(self):
+            sufficient = {'c', 'd'} if self.assumptions == set('acd') \
+                else self.assumptions
+            return [index for index, name in names.items()
+                if name in sufficient]
+
+    monkeypatch.setattr(scheduler.cp_model, 'CpSolver', FakeSolver)
+    issues = scheduler.explainInfeasibility(model, labeledConstraints,
+        PARAMETERS, 10)
+    assert [issue['constraint'] for issue in issues] == ['a', 'd']
+    assert set('ad') in numSolves
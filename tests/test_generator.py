@@ -0,0 +1,64 @@
+import datetime
+
+import pytest
+
+import generator
+import scheduler
+
+
+def getFeasibilityIssues(workload):
+    '''Run scheduler.checkFeasibility over a generated workload, as
+    scheduler.schedule does before building the model'''
+    shiftConfs = workload['shiftConfs']
+    calendarDict = workload['calendar']
+    dayConfs = sorted(calendarDict['dayConfigurations'],
+        key=lambda day: day['day'])
+    daysOfMonth = scheduler.getDaysOfMonth(calendarDict['year'],
+        calendarDict['month'], dayConfs)
+    requiredKeys = ('mandatoryShifts', 'unavailableShifts')
+    preferences = scheduler.getAllShiftPreferences(shiftConfs=shiftConfs,
+        dayConfs=dayConfs, keyPairs=(requiredKeys,),
+        daysOfMonth=daysOfMonth)
+    shiftConfsDict = {shiftConf['doctorId']: shiftConf
+        for shiftConf in shiftConfs}
+    absences = scheduler.getAbsences(workload['doctors'], daysOfMonth)
+    cycleShifts = scheduler.getCycleShifts(doctors=workload['doctors'],
+        shiftConfsDict=shiftConfsDict, daysOfMonth=daysOfMonth,
+        cycleShiftRate=workload['schedulerConf']['cycleShiftRate']['value'],
+        absences=absences)
+    workingDays = [dayConf['day'] for dayConf in dayConfs
+        if dayConf['isWorkingDay']]
+    forcedCycleShifts = scheduler.getForcedCycleShifts(
+        cycleShifts=cycleShifts, shiftConfsDict=shiftConfsDict,
+        workingDays=workingDays)
+    fixedShifts, fixedConsultations = scheduler.getFixedAssignments(
+        shiftConfsDict=shiftConfsDict, workingDays=workingDays,
+        required=preferences[requiredKeys],
+        forcedCycleShifts=forcedCycleShifts, absences=absences)
+    return scheduler.checkFeasibility(shiftConfs=shiftConfs,
+        dayConfs=dayConfs, workingDays=workingDays, fixedShifts=fixedShifts,
+        fixedConsultations=fixedConsultations)
+
+
+@pytest.mark.parametrize('numDoctors', [10, 100, 500, 1000])
+@pytest.mark.parametrize('seed', range(5))
+def test_generateWorkloadPassesThePrecheck(numDoctors, seed):
+    workload = generator.generateWorkload(numDoctors, 2020, 6, seed=seed)
+    assert getFeasibilityIssues(workload) == []
+
+
+def test_generateWorkloadIsReproducible():
+    assert generator.generateWorkload(50, 2020, 2, seed=3) \
+        == generator.generateWorkload(50, 2020, 2, seed=3)
+
+
+def test_maxShiftsIncludeTheMandatoryShifts():
+    workload = generator.generateWorkload(1000, 2020, 6, seed=0)
+    weekDays = [datetime.date(2020, 6, day).weekday()
+        for day in range(1, 31)]
+    for shiftConf in workload['shiftConfs']:
+        numMandatoryDays = sum(weekDays.count(
+                scheduler.WEEK_DAY[preference['shift']])
+            for preference in shiftConf['mandatoryShifts'])
+        assert shiftConf['maxShifts'] \
+            >= shiftConf['minShifts'] + 3 + numMandatoryDays
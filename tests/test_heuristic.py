@@ -0,0 +1,139 @@
+import threading
+
+import pytest
+
+import benchmark
+import generator
+import heuristic
+import scheduler
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+def generate(numDoctors, seed=0):
+    return generator.generateWorkload(numDoctors, 2020, 6, seed=seed)
+
+
+def scheduleWorkload(workload, **kwargs):
+    return scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], workload['schedulerConf'], **kwargs)
+
+
+def heuristicSchedule(workload, **kwargs):
+    return heuristic.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], workload['schedulerConf'], **kwargs)
+
+
+@pytest.mark.parametrize('numDoctors, seed', [(10, 0), (30, 1), (60, 2)])
+def test_heuristicSchedulesAreFeasible(numDoctors, seed):
+    pytest.importorskip('ortools')
+    workload = generate(numDoctors, seed)
+    generatedSchedule = heuristicSchedule(workload, collectStats=True)
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert generatedSchedule['heuristic'] is True
+    assert generatedSchedule['stats']['status'] == 'FEASIBLE'
+    # Re-scheduling without any changed day keeps all the assignments, so
+    # the solver checks the hard constraints and computes the objective
+    checked = scheduleWorkload(workload, collectStats=True,
+        solverParameters=SOLVER_PARAMETERS,
+        incremental={'schedule': generatedSchedule, 'days': [],
+            'radius': 0})
+    assert checked['status'] == 'PENDING_CONFIRMATION'
+    assert checked['days'] == generatedSchedule['days']
+    assert checked['stats']['objective'] \
+        == generatedSchedule['stats']['objective']
+
+
+def test_heuristicReportsThePrecheckIssues():
+    workload = generate(10)
+    for dayConf in workload['calendar']['dayConfigurations']:
+        dayConf['numShifts'] = 11
+    generatedSchedule = heuristicSchedule(workload, collectStats=True)
+    assert generatedSchedule['status'] == 'GENERATION_ERROR'
+    assert 'heuristic' not in generatedSchedule
+    assert generatedSchedule['issues']
+    assert generatedSchedule['stats']['status'] == 'INFEASIBLE'
+
+
+def test_fallbackWhenTheSolverFindsNoSchedule():
+    pytest.importorskip('ortools')
+    generatedSchedule = scheduleWorkload(generate(30), collectStats=True,
+        solverParameters={'max_time_in_seconds': 0})
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert generatedSchedule['heuristic'] is True
+    assert generatedSchedule['stats']['status'] == 'UNKNOWN'
+    assert generatedSchedule['stats']['heuristic'] is True
+    assert 'heuristic' in generatedSchedule['stats']['phases']
+
+
+def test_noFallbackWhenTheStopIsRequested(monkeypatch):
+    pytest.importorskip('ortools')
+
+    def failingSchedule(*args, **kwargs):
+        pytest.fail('The heuristic was used after the stop was requested')
+
+    monkeypatch.setattr(heuristic, 'schedule', failingSchedule)
+    stopEvent = threading.Event()
+    stopEvent.set()
+    generatedSchedule = scheduleWorkload(generate(30), stopEvent=stopEvent,
+        solverParameters={'max_time_in_seconds': 0})
+    assert generatedSchedule['status'] == 'GENERATION_ERROR'
+    assert 'heuristic' not in generatedSchedule
+
+
+def test_noFallbackWhenItIsDisabled():
+    pytest.importorskip('ortools')
+    workload = generate(30)
+    workload['schedulerConf']['heuristicFallback'] = {'value': False}
+    generatedSchedule = scheduleWorkload(workload,
+        solverParameters={'max_time_in_seconds': 0})
+    assert generatedSchedule['status'] == 'GENERATION_ERROR'
+
+
+SOLVER_STATS_KEYS = ('numVariables', 'numConstraints', 'numSolutions',
+    'numConflicts', 'numBranches')
+
+
+@pytest.fixture
+def withoutSolver(monkeypatch):
+    def importSolver():
+        raise ImportError('No module named ortools')
+
+    monkeypatch.setattr(scheduler, 'importSolver', importSolver)
+
+
+def test_fallbackWithoutTheSolver(withoutSolver):
+    generatedSchedule = scheduleWorkload(generate(10), collectStats=True)
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert generatedSchedule['heuristic'] is True
+    stats = generatedSchedule['stats']
+    assert stats['heuristic'] is True
+    for key in SOLVER_STATS_KEYS:
+        assert stats[key] == 0
+
+
+def test_heuristicStatsHaveTheKeysOfTheSolverStats():
+    pytest.importorskip('ortools')
+    workload = generate(10)
+    heuristicStats = heuristicSchedule(workload, collectStats=True)['stats']
+    solverStats = scheduleWorkload(workload, collectStats=True,
+        solverParameters=SOLVER_PARAMETERS)['stats']
+    assert set(solverStats) <= set(heuristicStats)
+
+
+def test_benchmarkWithoutTheSolver(withoutSolver):
+    schedulerConf = generate(10)['schedulerConf']
+    results = benchmark.runBenchmark([10], schedulerConf=schedulerConf,
+        repetitions=1)
+    assert results['results']['10']['status'] == 'FEASIBLE'
+    assert results['results']['10']['numVariables'] == 0
+
+
+def test_decompositionWithoutTheSolver(withoutSolver):
+    generatedSchedule = scheduleWorkload(generate(30), collectStats=True,
+        decomposition={'processes': 1})
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    stats = generatedSchedule['stats']
+    assert stats['decomposition']['blockStatuses'] == ['FEASIBLE'] * 4
+    for key in SOLVER_STATS_KEYS:
+        assert stats[key] == 0
@@ -0,0 +1,93 @@
+import pytest
+
+import generator
+import scheduler
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+def scheduleWorkload(workload, **kwargs):
+    return scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], workload['schedulerConf'],
+        solverParameters=SOLVER_PARAMETERS, collectStats=True, **kwargs)
+
+
+def getAssignedDays(generatedSchedule, docId):
+    return [day['day'] for day in generatedSchedule['days']
+        if any(doctor['id'] == docId for doctor in day['shifts']
+            + day['consultations'])]
+
+
+def test_repairScheduleHintKeepsTheFeasibleValues():
+    pytest.importorskip('ortools')
+    cp_model = scheduler.importSolver()
+    model = cp_model.CpModel()
+    variables = [model.NewBoolVar('x{}'.format(i)) for i in range(5)]
+    # At most one of the first three can be true, so the hint breaks a
+    # bound
+    model.Add(sum(variables[:3]) <= 1)
+    hintValues = [(var, True) for var in variables]
+    repaired = scheduler.repairScheduleHint(model, hintValues,
+        SOLVER_PARAMETERS)
+    assert [var.Index() for var, _ in repaired] \
+        == [var.Index() for var in variables]
+    values = [value for _, value in repaired]
+    assert sum(values[:3]) == 1
+    assert values[3:] == [True, True]
+    assert not model.Proto().solution_hint.vars
+
+
+def test_repairScheduleHintOfAnInfeasibleModel():
+    pytest.importorskip('ortools')
+    cp_model = scheduler.importSolver()
+    model = cp_model.CpModel()
+    var = model.NewBoolVar('x')
+    model.Add(var == 1)
+    model.Add(var == 0)
+    hintValues = [(var, True)]
+    assert scheduler.repairScheduleHint(model, hintValues,
+        SOLVER_PARAMETERS) is hintValues
+
+
+def test_hintOfTheSameInputs():
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    previous = scheduleWorkload(workload)
+    generatedSchedule = scheduleWorkload(workload, hint=previous)
+    assert generatedSchedule['stats']['status'] == 'OPTIMAL'
+    assert generatedSchedule['stats']['objective'] \
+        == previous['stats']['objective']
+
+
+def test_repairedHintDropsTheAssignmentsOfAbsentDoctors(monkeypatch):
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    previous = scheduleWorkload(workload)
+    # The first doctor with assignments becomes absent the whole month,
+    # so the previous schedule is an infeasible hint
+    docId = next(doctor['id'] for doctor in workload['doctors']
+        if getAssignedDays(previous, doctor['id']))
+    for doctor in workload['doctors']:
+        if doctor['id'] == docId:
+            doctor['absence'] = {'start': '2020-06-01', 'end': '2020-06-30'}
+    for shiftConf in workload['shiftConfs']:
+        if shiftConf['doctorId'] == docId:
+            shiftConf.update(minShifts=0, mandatoryShifts=[])
+
+    repairs = []
+    repairScheduleHint = scheduler.repairScheduleHint
+    def spyRepairScheduleHint(model, hintValues, solverParameters):
+        repaired = repairScheduleHint(model, hintValues, solverParameters)
+        repairs.append((hintValues, repaired))
+        return repaired
+    monkeypatch.setattr(scheduler, 'repairScheduleHint',
+        spyRepairScheduleHint)
+    generatedSchedule = scheduleWorkload(workload, hint=previous,
+        repairHint=True)
+    assert len(repairs) == 1
+    hintValues, repaired = repairs[0]
+    numChanged = sum(1 for (_, hinted), (_, value)
+        in zip(hintValues, repaired) if hinted != value)
+    assert 0 < numChanged
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert getAssignedDays(generatedSchedule, docId) == []
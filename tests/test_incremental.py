@@ -0,0 +1,126 @@
+import copy
+
+import pytest
+
+import generator
+import scheduler
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+@pytest.fixture(scope='module')
+def confirmed():
+    '''Return a generated workload and its confirmed schedule'''
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    confirmedSchedule = scheduler.schedule(workload['doctors'],
+        workload['shiftConfs'], workload['calendar'],
+        workload['schedulerConf'], solverParameters=SOLVER_PARAMETERS)
+    return workload, confirmedSchedule
+
+
+def getAssignments(generatedSchedule):
+    return {(doctor['id'], day['day'], kind)
+        for day in generatedSchedule['days']
+        for kind in ('shifts', 'consultations')
+        for doctor in day[kind]}
+
+
+def makeAbsent(workload, generatedSchedule, dayNum):
+    '''Return a copy of the workload in which the first doctor with a
+    shift in the given day is absent that day, and the id of the
+    doctor'''
+    workload = copy.deepcopy(workload)
+    day = next(day for day in generatedSchedule['days']
+        if day['day'] == dayNum)
+    docId = day['shifts'][0]['id']
+    for doctor in workload['doctors']:
+        if doctor['id'] == docId:
+            doctor['absence'] = {'start': '2020-06-{:02}'.format(dayNum),
+                'end': '2020-06-{:02}'.format(dayNum)}
+    return workload, docId
+
+
+def keepNumShifts(workload, generatedSchedule, docId):
+    '''Make the number of shifts of the doctor in the schedule their 
+    minimum'''
+    numShifts = sum(1 for assignment in getAssignments(generatedSchedule)
+        if assignment[0] == docId and assignment[2] == 'shifts')
+    for shiftConf in workload['shiftConfs']:
+        if shiftConf['doctorId'] == docId:
+            shiftConf.update(minShifts=numShifts, mandatoryShifts=[])
+
+
+def rescheduleIncrementally(workload, incremental):
+    return scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], workload['schedulerConf'],
+        solverParameters=SOLVER_PARAMETERS, incremental=incremental)
+
+
+def test_splitIncrementalRegion():
+    shiftVars = {(docId, dayNum): [object(), object()]
+        for docId in (1, 2, 3) for dayNum in range(1, 11)}
+    freeVars, fixedVars = scheduler.splitIncrementalRegion(shiftVars,
+        numDaysInMonth=10, changedDays=[1, 6], changedDoctors=[3],
+        radius=1)
+    assert set(freeVars) == {(docId, dayNum) for docId in (1, 2, 3)
+        for dayNum in (1, 2, 5, 6, 7)} | {(3, dayNum)
+            for dayNum in range(1, 11)}
+    assert set(fixedVars) == set(shiftVars) - set(freeVars)
+    assert all(freeVars[key] is shiftVars[key] for key in freeVars)
+
+
+def test_splitIncrementalRegionWithoutChanges():
+    shiftVars = {(1, dayNum): [object(), None] for dayNum in range(1, 4)}
+    freeVars, fixedVars = scheduler.splitIncrementalRegion(shiftVars,
+        numDaysInMonth=3)
+    assert freeVars == {}
+    assert fixedVars == shiftVars
+
+
+def test_incrementalKeepsTheAssignmentsOutsideTheRegion(confirmed):
+    workload, confirmedSchedule = confirmed
+    workload, docId = makeAbsent(workload, confirmedSchedule, 12)
+    generatedSchedule = rescheduleIncrementally(workload, {
+        'schedule': confirmedSchedule, 'days': [12], 'doctors': [docId],
+        'radius': 1})
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assignments = getAssignments(generatedSchedule)
+    assert (docId, 12, 'shifts') not in assignments
+    def isOutside(assignment):
+        return assignment[0] != docId and assignment[1] not in (11, 12, 13)
+    assert {assignment for assignment in assignments
+        if isOutside(assignment)} == {assignment for assignment
+            in getAssignments(confirmedSchedule) if isOutside(assignment)}
+
+
+def test_incrementalWidensTheRadiusOfAnInfeasibleRegion(confirmed,
+        monkeypatch):
+    workload, confirmedSchedule = confirmed
+    workload, docId = makeAbsent(workload, confirmedSchedule, 12)
+    # The doctor cannot lose the shift of the absence, as the rest of
+    # their assignments are kept outside a region of radius 0
+    keepNumShifts(workload, confirmedSchedule, docId)
+
+    radii = []
+    schedule = scheduler.schedule
+    def spySchedule(*args, **kwargs):
+        radii.append(kwargs['incremental']['radius'])
+        return schedule(*args, **kwargs)
+    monkeypatch.setattr(scheduler, 'schedule', spySchedule)
+    generatedSchedule = rescheduleIncrementally(workload, {
+        'schedule': confirmedSchedule, 'days': [12], 'radius': 0,
+        'maxRadius': 7})
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert radii[:2] == [0, 1]
+    assert radii == sorted(radii) and radii[-1] <= 7
+    assert (docId, 12, 'shifts') not in getAssignments(generatedSchedule)
+
+
+def test_incrementalGivesUpAtTheMaxRadius(confirmed):
+    workload, confirmedSchedule = confirmed
+    workload, docId = makeAbsent(workload, confirmedSchedule, 12)
+    keepNumShifts(workload, confirmedSchedule, docId)
+    generatedSchedule = rescheduleIncrementally(workload, {
+        'schedule': confirmedSchedule, 'days': [12]})
+    assert generatedSchedule['status'] == 'GENERATION_ERROR'
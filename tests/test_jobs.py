@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+import generator
+import jobs
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+def createJob(numDoctors, **kwargs):
+    workload = generator.generateWorkload(numDoctors, 2020, 6, seed=0)
+    return jobs.ScheduleJob(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], workload['schedulerConf'],
+        solverParameters=SOLVER_PARAMETERS, **kwargs)
+
+
+def test_startNeedsARunningLoop():
+    with pytest.raises(RuntimeError):
+        createJob(10).start()
+
+
+def test_startUsesTheRunningLoop():
+    pytest.importorskip('ortools')
+
+    async def run():
+        job = createJob(10).start()
+        assert job.loop is asyncio.get_running_loop()
+        progress = [item async for item in job.progress()]
+        return await job, progress
+
+    schedule, progress = asyncio.run(run())
+    assert schedule['status'] == 'PENDING_CONFIRMATION'
+    assert progress
+
+
+def test_startTwice():
+    pytest.importorskip('ortools')
+
+    async def run():
+        job = createJob(10).start()
+        with pytest.raises(RuntimeError):
+            job.start()
+        await job
+
+    asyncio.run(run())
+
+
+def test_cancel():
+    pytest.importorskip('ortools')
+
+    async def run():
+        job = createJob(100).start()
+        assert job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await job
+        assert job.done()
+        assert not job.cancel()
+
+    asyncio.run(run())
+
+
+def test_reservedArguments():
+    with pytest.raises(ValueError):
+        createJob(10, stopEvent=None)
+
+
+def test_progressAndBestSchedule():
+    pytest.importorskip('ortools')
+
+    async def run():
+        job = createJob(10, collectStats=True)
+        # Awaiting the job starts it
+        schedule = await job
+        progress = [item async for item in job.progress()]
+        return job, schedule, progress
+
+    job, schedule, progress = asyncio.run(run())
+    assert progress
+    for item in progress:
+        assert set(item) >= {'solution', 'objective', 'bestBound',
+            'wallTime'}
+    assert [item['solution'] for item in progress] \
+        == sorted(item['solution'] for item in progress)
+    assert job.lastProgress == progress[-1]
+    # The schedule returned may be another solution with the same 
+    # objective
+    assert progress[-1]['objective'] == schedule['stats']['objective']
+    assert job.bestSchedule['status'] == 'PENDING_CONFIRMATION'
+
+
+def test_timeoutReturnsTheBestScheduleFound():
+    pytest.importorskip('ortools')
+
+    async def run():
+        job = createJob(100, timeout=0.1)
+        return job, await job
+
+    job, schedule = asyncio.run(run())
+    assert job.stopEvent.is_set()
+    assert not job.cancelled
+    assert schedule['status'] in ('PENDING_CONFIRMATION', 'GENERATION_ERROR')
+
+
+def test_cancellingTheAwaitingTaskCancelsTheJob():
+    pytest.importorskip('ortools')
+
+    async def run():
+        job = createJob(100).start()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(job.result(), 0.5)
+        assert job.cancelled
+        assert job.stopEvent.is_set()
+        # The thread finishes once the search is stopped
+        await asyncio.wait([job.future])
+        assert job.done()
+
+    asyncio.run(run())
@@ -0,0 +1,107 @@
+import json
+import sys
+
+import pytest
+
+import generator
+import main
+import scheduler
+
+
+@pytest.fixture
+def workloadFiles(tmp_path):
+    '''Write a generated workload, and a configuration directory without
+    log files. Returns a dict with their paths'''
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    configDir = tmp_path / 'config'
+    configDir.mkdir()
+    (configDir / 'logging.json').write_text(json.dumps({'version': 1,
+        'disable_existing_loggers': False}))
+    (configDir / 'scheduler.json').write_text(json.dumps(dict(
+        workload['schedulerConf'], solverParameters={
+            'value': {'num_search_workers': 8, 'max_time_in_seconds': 60}})))
+    files = {'configDir': configDir}
+    for key, content in (('doctors', workload['doctors']),
+            ('shiftConfs', workload['shiftConfs']),
+            ('calendar', workload['calendar'])):
+        files[key] = tmp_path / (key + '.json')
+        files[key].write_text(json.dumps(content))
+    files['schedule'] = tmp_path / 'schedule.json'
+    return files
+
+
+def runMain(monkeypatch, files, *args):
+    monkeypatch.setattr(sys, 'argv', ['main.py',
+        '--configDir={}'.format(files['configDir'])] + [str(arg)
+            for arg in args])
+    main.main()
+
+
+def test_main(monkeypatch, workloadFiles):
+    pytest.importorskip('ortools')
+    runMain(monkeypatch, workloadFiles, workloadFiles['doctors'],
+        workloadFiles['shiftConfs'], workloadFiles['calendar'],
+        workloadFiles['schedule'])
+    generatedSchedule = json.loads(workloadFiles['schedule'].read_text())
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert 'stats' not in generatedSchedule
+
+
+def test_mainWritesTheMetrics(monkeypatch, workloadFiles, tmp_path):
+    pytest.importorskip('ortools')
+    metricsPath = tmp_path / 'scheduler.prom'
+    runMain(monkeypatch, workloadFiles, workloadFiles['doctors'],
+        workloadFiles['shiftConfs'], workloadFiles['calendar'],
+        workloadFiles['schedule'], '--metricsFile={}'.format(metricsPath))
+    generatedSchedule = json.loads(workloadFiles['schedule'].read_text())
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert 'stats' not in generatedSchedule
+    assert 'scheduler_jobs_total' in metricsPath.read_text()
+
+
+def test_mainWritesTheMetricsOfSchedulesWithoutStats(monkeypatch,
+        workloadFiles, tmp_path):
+    def schedule(doctors, shiftConfs, calendarDict, schedulerConf,
+            **kwargs):
+        return {'year': 2020, 'month': 6, 'status': 'GENERATION_ERROR',
+            'days': []}
+
+    monkeypatch.setattr(scheduler, 'schedule', schedule)
+    runMain(monkeypatch, workloadFiles, workloadFiles['doctors'],
+        workloadFiles['shiftConfs'], workloadFiles['calendar'],
+        workloadFiles['schedule'],
+        '--metricsFile={}'.format(tmp_path / 'scheduler.prom'))
+    generatedSchedule = json.loads(workloadFiles['schedule'].read_text())
+    assert generatedSchedule['status'] == 'GENERATION_ERROR'
+
+
+def test_mainStream(monkeypatch, workloadFiles, tmp_path):
+    pytest.importorskip('ortools')
+    job = {'solverParameters': {'num_search_workers': 8,
+        'max_time_in_seconds': 60}}
+    for key in ('doctors', 'shiftConfs', 'calendar'):
+        job[key] = json.loads(workloadFiles[key].read_text())
+    jobsPath = tmp_path / 'jobs.ndjson'
+    jobsPath.write_text(json.dumps(dict(job, id='a')) + '\n'
+        + json.dumps(dict(job, id='b')) + '\n')
+    resultsPath = tmp_path / 'results.ndjson'
+    runMain(monkeypatch, workloadFiles, '--stream', jobsPath, resultsPath)
+    records = [json.loads(line)
+        for line in resultsPath.read_text().splitlines()]
+    assert [record['id'] for record in records] == ['a', 'b']
+    assert all(record['status'] == 'PENDING_CONFIRMATION'
+        for record in records)
+
+
+def test_mainStreamExitsWithErrorWhenAJobFails(monkeypatch, workloadFiles,
+        tmp_path):
+    jobsPath = tmp_path / 'jobs.ndjson'
+    jobsPath.write_text('not json\n')
+    resultsPath = tmp_path / 'results.ndjson'
+    with pytest.raises(SystemExit) as excinfo:
+        runMain(monkeypatch, workloadFiles, '--stream', jobsPath,
+            resultsPath)
+    assert excinfo.value.code == 1
+    records = [json.loads(line)
+        for line in resultsPath.read_text().splitlines()]
+    assert records[0]['id'] == 1 and 'error' in records[0]
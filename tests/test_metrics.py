@@ -0,0 +1,140 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import generator
+import metrics
+import scheduler
+
+
+def getStats(**phases):
+    return {
+        'phases': {name: {'wallTime': wallTime, 'cpuTime': wallTime}
+            for name, wallTime in phases.items()},
+        'status': 'OPTIMAL',
+        'numVariables': 500,
+        'numConstraints': 700,
+        'gap': 0.0
+    }
+
+
+def getSample(samples, sampleName, **labels):
+    return samples[(metrics.getFamily(sampleName), sampleName,
+        tuple(sorted(labels.items(), key=lambda label: label[0] == 'le')))]
+
+
+@pytest.mark.parametrize('numDoctors, sizeClass', [
+    (1, 'small'), (20, 'small'), (21, 'medium'), (150, 'large'),
+    (151, 'xlarge')])
+def test_getSizeClass(numDoctors, sizeClass):
+    assert metrics.getSizeClass(numDoctors) == sizeClass
+
+
+def test_observeSchedule():
+    scheduleMetrics = metrics.ScheduleMetrics()
+    scheduleMetrics.observeSchedule({'stats': getStats(validation=0.01,
+        preferences=0.02, cycleShifts=0.03, symmetry=0.04, variables=0.05,
+        constraints=0.06, objective=0.07, solve=2.0)}, 10)
+    samples = metrics.parseSamples(scheduleMetrics.render())
+    assert getSample(samples, 'scheduler_jobs_total', size_class='small',
+        status='OPTIMAL') == 1
+    assert getSample(samples, 'scheduler_model_build_duration_seconds_sum',
+        size_class='small') == pytest.approx(0.28)
+    assert getSample(samples, 'scheduler_solve_duration_seconds_sum',
+        size_class='small') == pytest.approx(2.0)
+    assert getSample(samples, 'scheduler_solve_duration_seconds_bucket',
+        size_class='small', le='1.0') == 0
+    assert getSample(samples, 'scheduler_solve_duration_seconds_bucket',
+        size_class='small', le='+Inf') == 1
+    assert getSample(samples, 'scheduler_model_variables_count',
+        size_class='small') == 1
+
+
+def test_modelBuildPhasesCoverTheModelConstruction():
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    generatedSchedule = scheduler.schedule(workload['doctors'],
+        workload['shiftConfs'], workload['calendar'],
+        workload['schedulerConf'], collectStats=True,
+        solverParameters={'num_search_workers': 8})
+    phases = list(generatedSchedule['stats']['phases'])
+    for name in phases[:phases.index('solve')]:
+        assert name in metrics.MODEL_BUILD_PHASES \
+            or name in ('repairHint', 'heuristic', 'dump')
+
+
+def test_timeoutsAndCacheHits():
+    scheduleMetrics = metrics.ScheduleMetrics()
+    stats = getStats(solve=1)
+    stats['status'] = 'UNKNOWN'
+    stats['cacheHit'] = False
+    scheduleMetrics.observeSchedule({'stats': stats}, 30)
+    scheduleMetrics.observeSchedule({'stats': {'phases': {},
+        'cacheHit': True}}, 30)
+    scheduleMetrics.observeSchedule({}, 30)
+    samples = metrics.parseSamples(scheduleMetrics.render())
+    assert getSample(samples, 'scheduler_jobs_total', size_class='medium',
+        status='TIMEOUT') == 1
+    assert getSample(samples, 'scheduler_cache_requests_total',
+        size_class='medium', result='hit') == 1
+    assert getSample(samples, 'scheduler_cache_requests_total',
+        size_class='medium', result='miss') == 1
+
+
+def test_render():
+    scheduleMetrics = metrics.ScheduleMetrics()
+    assert scheduleMetrics.render() == ''
+    scheduleMetrics.observeSchedule({'stats': getStats(solve=0.2)}, 10)
+    lines = scheduleMetrics.render().splitlines()
+    assert '# TYPE scheduler_jobs_total counter' in lines
+    assert '# TYPE scheduler_solve_duration_seconds histogram' in lines
+    assert 'scheduler_jobs_total{size_class="small",status="OPTIMAL"} 1.0' \
+        in lines
+    buckets = [line for line in lines
+        if line.startswith('scheduler_solve_duration_seconds_bucket')]
+    assert buckets[0].endswith('{size_class="small",le="0.01"} 0.0')
+    assert buckets[-1].endswith('{size_class="small",le="+Inf"} 1.0')
+    assert metrics.parseSamples(scheduleMetrics.render()) \
+        == scheduleMetrics.samples
+
+
+def test_writeTextfileAddsTheSamplesOfEachProcess(tmp_path):
+    textfilePath = tmp_path / 'scheduler.prom'
+    first = metrics.ScheduleMetrics(textfilePath=textfilePath)
+    second = metrics.ScheduleMetrics(textfilePath=textfilePath)
+    first.observeSchedule({'stats': getStats(solve=1)}, 10)
+    first.writeTextfile()
+    second.observeSchedule({'stats': getStats(solve=1)}, 10)
+    second.writeTextfile()
+    # Nothing new to add
+    first.writeTextfile()
+    samples = metrics.parseSamples(textfilePath.read_text())
+    assert getSample(samples, 'scheduler_jobs_total', size_class='small',
+        status='OPTIMAL') == 2
+    assert getSample(samples, 'scheduler_solve_duration_seconds_sum',
+        size_class='small') == 2
+
+
+def test_writeTextfileWithoutPath():
+    scheduleMetrics = metrics.ScheduleMetrics()
+    scheduleMetrics.observeSchedule({'stats': getStats(solve=1)}, 10)
+    scheduleMetrics.writeTextfile()
+    assert scheduleMetrics.pendingSamples == {}
+
+
+def test_serve():
+    scheduleMetrics = metrics.ScheduleMetrics()
+    scheduleMetrics.observeSchedule({'stats': getStats(solve=1)}, 10)
+    server = scheduleMetrics.serve(0)
+    try:
+        url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+        with urllib.request.urlopen(url + metrics.METRICS_PATH) as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert response.read().decode('utf-8') \
+                == scheduleMetrics.render()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + '/other')
+    finally:
+        server.shutdown()
+        server.server_close()
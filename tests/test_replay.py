@@ -0,0 +1,58 @@
+import pytest
+
+import generator
+import replay
+import scheduler
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+@pytest.fixture
+def modelDumpDir(tmp_path):
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], workload['schedulerConf'],
+        solverParameters=SOLVER_PARAMETERS, modelDumpDir=tmp_path)
+    return tmp_path
+
+
+def test_loadModelDump(modelDumpDir):
+    model, info = replay.loadModelDump(modelDumpDir)
+    assert (info['year'], info['month']) == (2020, 6)
+    assert info['solve']['status'] == 'OPTIMAL'
+    assert len(model.Proto().variables) >= len(info['variables'])
+
+
+def test_solveModelFindsTheOriginalObjective(modelDumpDir):
+    model, info = replay.loadModelDump(modelDumpDir)
+    result = replay.solveModel(model, info['solverParameters'],
+        trackSolutions=True)
+    assert result['status'] == 'OPTIMAL'
+    assert result['objective'] == info['solve']['objective']
+    assert result['gap'] == 0
+    assert result['solutions'][-1][1] == result['objective']
+
+
+def test_solveModelWithoutSolutions(modelDumpDir):
+    model, info = replay.loadModelDump(modelDumpDir)
+    result = replay.solveModel(model, dict(info['solverParameters'],
+        max_time_in_seconds=0))
+    assert result['status'] == 'UNKNOWN'
+    assert result['objective'] is None
+    assert result['gap'] is None
+    assert 'solutions' not in result
+
+
+def test_replay(modelDumpDir):
+    results = replay.replay(modelDumpDir,
+        [{}, {'num_search_workers': 1}], repetitions=2)
+    assert results['model']['year'] == 2020
+    assert results['original']['status'] == 'OPTIMAL'
+    assert len(results['runs']) == 2
+    assert results['runs'][0]['parameters'] == SOLVER_PARAMETERS
+    assert results['runs'][1]['parameters']['num_search_workers'] == 1
+    for run in results['runs']:
+        assert len(run['results']) == 2
+        for result in run['results']:
+            assert result['objective'] == results['original']['objective']
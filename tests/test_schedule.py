@@ -0,0 +1,104 @@
+import datetime
+import logging
+
+import pytest
+
+import generator
+import scheduler
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+def scheduleWorkload(workload, **kwargs):
+    return scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], workload['schedulerConf'],
+        solverParameters=SOLVER_PARAMETERS, collectStats=True, **kwargs)
+
+
+def checkSchedule(workload, generatedSchedule):
+    '''Assert that the schedule meets the hard constraints of the
+    workload'''
+    dayConfs = {dayConf['day']: dayConf
+        for dayConf in workload['calendar']['dayConfigurations']}
+    shiftConfs = {shiftConf['doctorId']: shiftConf
+        for shiftConf in workload['shiftConfs']}
+    numShifts = {docId: 0 for docId in shiftConfs}
+    numConsultations = {docId: 0 for docId in shiftConfs}
+    for day in generatedSchedule['days']:
+        dayConf = dayConfs[day['day']]
+        shiftIds = [doctor['id'] for doctor in day['shifts']]
+        consultationIds = [doctor['id'] for doctor in day['consultations']]
+        if not dayConf['isWorkingDay']:
+            assert shiftIds == [] and consultationIds == []
+            continue
+        assert len(shiftIds) >= dayConf['numShifts']
+        assert len(consultationIds) >= dayConf['numConsultations']
+        assert len(set(shiftIds + consultationIds)) \
+            == len(shiftIds) + len(consultationIds)
+        for docId in shiftIds:
+            numShifts[docId] += 1
+        for docId in consultationIds:
+            numConsultations[docId] += 1
+    for doctor in workload['doctors']:
+        absence = doctor.get('absence', None)
+        if absence:
+            start = datetime.date.fromisoformat(absence['start'])
+            end = datetime.date.fromisoformat(absence['end'])
+            for day in generatedSchedule['days']:
+                date = datetime.date(generatedSchedule['year'],
+                    generatedSchedule['month'], day['day'])
+                if start <= date <= end:
+                    assert doctor['id'] not in {assigned['id']
+                        for assigned in day['shifts'] + day['consultations']}
+    # The doctors that only have cycle-shifts do not have bounds
+    for docId, shiftConf in shiftConfs.items():
+        if not shiftConf['hasShiftsOnlyWhenCycleShifts']:
+            assert numConsultations[docId] <= shiftConf['numConsultations']
+            assert numShifts[docId] >= shiftConf['minShifts']
+            assert numShifts[docId] + numConsultations[docId] \
+                <= shiftConf['maxShifts']
+
+
+@pytest.mark.parametrize('numDoctors, seed', [(10, 0), (25, 1), (40, 2)])
+def test_scheduleMeetsTheConstraints(numDoctors, seed):
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(numDoctors, 2020, 6, seed=seed)
+    generatedSchedule = scheduleWorkload(workload)
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert [day['day'] for day in generatedSchedule['days']] \
+        == list(range(1, 31))
+    checkSchedule(workload, generatedSchedule)
+
+
+def test_scheduleWithConsultations():
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    for shiftConf in workload['shiftConfs'][:4]:
+        shiftConf.update(numConsultations=2,
+            hasShiftsOnlyWhenCycleShifts=False)
+    for dayConf in workload['calendar']['dayConfigurations'][::5]:
+        if dayConf['isWorkingDay']:
+            dayConf['numConsultations'] = 1
+    generatedSchedule = scheduleWorkload(workload)
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert any(day['consultations'] for day in generatedSchedule['days'])
+    checkSchedule(workload, generatedSchedule)
+
+
+def test_preferencesOfUnknownDoctorsAreIgnored(caplog):
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    expected = scheduleWorkload(workload)
+    dayConf = workload['calendar']['dayConfigurations'][2]
+    # The doctor 999 does not have a shift configuration, and the first
+    # doctor does not do consultations
+    dayConf['wantedShifts'].append({'id': 999})
+    workload['calendar']['dayConfigurations'][3]['wantedConsultations'] = [
+        {'id': workload['shiftConfs'][0]['doctorId']}]
+    with caplog.at_level(logging.WARNING, logger='scheduler'):
+        generatedSchedule = scheduleWorkload(workload)
+    assert generatedSchedule['status'] == 'PENDING_CONFIRMATION'
+    assert generatedSchedule['stats']['objective'] \
+        == expected['stats']['objective']
+    assert 'The doctor 999 has shift preferences' in caplog.text
+    assert 'wants consultations the day 4' in caplog.text
@@ -0,0 +1,114 @@
+import datetime
+import random
+
+import pytest
+
+import scheduler
+
+KEY_PAIRS = [('wantedShifts', 'unwantedShifts'),
+    ('mandatoryShifts', 'unavailableShifts')]
+
+
+def getDays(year, month, numDays):
+    return [datetime.date(year, month, day) for day in range(1, numDays + 1)]
+
+
+def getShiftPreferencesByDoctor(shiftConfs, dayConfs, keys, daysOfMonth):
+    '''The preferences as they were extracted before the bitsets, doctor
+    by doctor. The ids of each day are returned as sets'''
+    key1, key2 = keys
+    shifts1ByWeekDay = [set() for _ in range(7)]
+    shifts2ByWeekDay = [set() for _ in range(7)]
+    for shiftConf in shiftConfs:
+        for shift in shiftConf.get(key1, []):
+            shifts1ByWeekDay[scheduler.WEEK_DAY[shift['shift']]].add(
+                shiftConf['doctorId'])
+        for shift in shiftConf.get(key2, []):
+            shifts2ByWeekDay[scheduler.WEEK_DAY[shift['shift']]].add(
+                shiftConf['doctorId'])
+    shiftPreferences = {}
+    for day, dayConf in zip(daysOfMonth, dayConfs):
+        highPriority1 = {doctor['id'] for doctor in dayConf.get(key1, [])}
+        highPriority2 = {doctor['id'] for doctor in dayConf.get(key2, [])}
+        shiftPreferences[day.day] = [
+            (shifts1ByWeekDay[day.weekday()] - highPriority2) | highPriority1,
+            (shifts2ByWeekDay[day.weekday()] - highPriority1) | highPriority2
+        ]
+    return shiftPreferences
+
+
+def asSets(shiftPreferences):
+    return {dayNum: [set(docIds) for docIds in preferences]
+        for dayNum, preferences in shiftPreferences.items()}
+
+
+def generatePreferences(seed, numDoctors, daysOfMonth):
+    '''Return random shiftConfs and dayConfs, with some doctors that are
+    only in the dayConfs and some keys missing'''
+    rng = random.Random(seed)
+    weekDays = list(scheduler.WEEK_DAY)
+    allKeys = [key for keys in KEY_PAIRS for key in keys]
+    shiftConfs = []
+    for docId in range(numDoctors):
+        shiftConf = {'doctorId': docId}
+        for key in allKeys:
+            if rng.random() < 0.9:
+                shiftConf[key] = [{'shift': weekDay} for weekDay
+                    in rng.sample(weekDays, rng.randint(0, 3))]
+        shiftConfs.append(shiftConf)
+    dayConfs = []
+    for _ in daysOfMonth:
+        dayConf = {}
+        for key in allKeys:
+            if rng.random() < 0.9:
+                dayConf[key] = [{'id': docId} for docId
+                    in rng.sample(range(numDoctors + 3), rng.randint(0, 4))]
+        dayConfs.append(dayConf)
+    return shiftConfs, dayConfs
+
+
+def test_getShiftPreferencesExample():
+    shiftConfs = [
+        {'doctorId': 1, 'wantedShifts': [{'shift': 'Monday'}],
+            'unwantedShifts': [{'shift': 'Tuesday'}]},
+        {'doctorId': 3, 'wantedShifts': [{'shift': 'Tuesday'}],
+            'unwantedShifts': []}
+    ]
+    # June 2020 starts on Monday
+    dayConfs = [
+        {'wantedShifts': [], 'unwantedShifts': [{'id': 1}, {'id': 5}]},
+        {'wantedShifts': [{'id': 1}], 'unwantedShifts': [{'id': 3}]},
+        {}
+    ]
+    preferences = scheduler.getShiftPreferences(shiftConfs=shiftConfs,
+        dayConfs=dayConfs, keys=('wantedShifts', 'unwantedShifts'),
+        daysOfMonth=getDays(2020, 6, 3))
+    assert preferences == {1: [[], [1, 5]], 2: [[1], [3]], 3: [[], []]}
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_getAllShiftPreferencesMatchesTheExtractionByDoctor(seed):
+    daysOfMonth = getDays(2020, 2, 29)
+    shiftConfs, dayConfs = generatePreferences(seed, 20, daysOfMonth)
+    allShiftPreferences = scheduler.getAllShiftPreferences(
+        shiftConfs=shiftConfs, dayConfs=dayConfs, keyPairs=KEY_PAIRS,
+        daysOfMonth=daysOfMonth)
+    assert list(allShiftPreferences) == KEY_PAIRS
+    for keys in KEY_PAIRS:
+        shiftPreferences = allShiftPreferences[keys]
+        expected = getShiftPreferencesByDoctor(shiftConfs, dayConfs, keys,
+            daysOfMonth)
+        assert asSets(shiftPreferences) == expected
+        for preferences in shiftPreferences.values():
+            for docIds in preferences:
+                assert len(docIds) == len(set(docIds))
+        assert asSets(scheduler.getShiftPreferences(shiftConfs=shiftConfs,
+            dayConfs=dayConfs, keys=keys, daysOfMonth=daysOfMonth)) \
+                == expected
+
+
+def test_getDoctorIdsFromMask():
+    docIds = [7, 3, 11, 5]
+    assert scheduler.getDoctorIdsFromMask(0, docIds) == []
+    assert scheduler.getDoctorIdsFromMask(0b1010, docIds) == [3, 5]
+    assert scheduler.getDoctorIdsFromMask(0b1111, docIds) == docIds
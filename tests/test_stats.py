@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+import stats
+
+
+def test_phaseTimerAccumulatesThePhases():
+    timer = stats.PhaseTimer()
+    timer.startPhase('build')
+    time.sleep(0.01)
+    timer.startPhase('solve')
+    timer.startPhase('build')
+    time.sleep(0.01)
+    timer.stop()
+    phases = timer.toDict()
+    assert list(phases) == ['build', 'solve']
+    assert phases['build']['wallTime'] >= 0.02
+    assert phases['solve']['wallTime'] < phases['build']['wallTime']
+    assert set(phases['solve']) == {'wallTime', 'cpuTime'}
+
+
+def test_phaseTimerStopIsIdempotent():
+    timer = stats.PhaseTimer()
+    timer.stop()
+    assert timer.toDict() == {}
+    timer.startPhase('build')
+    timer.stop()
+    wallTime = timer.toDict()['build']['wallTime']
+    timer.stop()
+    assert timer.toDict()['build']['wallTime'] == wallTime
+
+
+def test_toDictReturnsACopy():
+    timer = stats.PhaseTimer()
+    timer.startPhase('build')
+    timer.stop()
+    timer.toDict()['build']['wallTime'] = 100
+    assert timer.toDict()['build']['wallTime'] < 100
+
+
+@pytest.mark.parametrize('objective, bestBound, gap', [
+    (10, 10, 0),
+    (10, 12, 0.2),
+    (-10, -8, 0.2),
+    (0, 0.5, 0.5)
+])
+def test_getRelativeGap(objective, bestBound, gap):
+    assert stats.getRelativeGap(objective, bestBound) == pytest.approx(gap)
@@ -0,0 +1,28 @@
+import pytest
+
+import storage
+
+
+def test_writeAndReadJsonFile(tmp_path):
+    path = tmp_path / 'schedule.json'
+    storage.writeJsonFile(path, {'days': [1, 2], 'status': 'OK'})
+    assert storage.readJsonFile(path) == {'days': [1, 2], 'status': 'OK'}
+    storage.writeJsonFile(str(path), [])
+    assert storage.readJsonFile(path) == []
+
+
+def test_writeTextFileLeavesNoTemporaryFiles(tmp_path):
+    path = tmp_path / 'metrics.prom'
+    storage.writeTextFile(path, 'a 1\n')
+    storage.writeTextFile(path, 'a 2\n')
+    assert path.read_text() == 'a 2\n'
+    assert [child.name for child in tmp_path.iterdir()] == ['metrics.prom']
+
+
+def test_writeTextFileKeepsTheOldContentOnErrors(tmp_path):
+    path = tmp_path / 'metrics.prom'
+    storage.writeTextFile(path, 'a 1\n')
+    with pytest.raises(TypeError):
+        storage.writeTextFile(path, b'not a str')
+    assert path.read_text() == 'a 1\n'
+    assert [child.name for child in tmp_path.iterdir()] == ['metrics.prom']
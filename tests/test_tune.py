@@ -0,0 +1,88 @@
+import json
+import logging
+
+import pytest
+
+import generator
+import tune
+
+
+def test_getSettingsStartsWithTheReference():
+    settings = tune.getSettings({'a': [1, 2], 'b': [True, False]})
+    assert settings[0] == {}
+    assert len(settings) == 5
+    assert {'a': 2, 'b': False} in settings
+
+
+def test_getSettingsRandomSample():
+    settings = tune.getSettings({'a': [1, 2, 3], 'b': [1, 2, 3]},
+        search='random', samples=4, seed=1)
+    assert settings[0] == {}
+    assert len(settings) == 5
+    assert settings == tune.getSettings({'a': [1, 2, 3], 'b': [1, 2, 3]},
+        search='random', samples=4, seed=1)
+
+
+@pytest.mark.parametrize('objective, reference, gap', [
+    (None, 10, 1),
+    (10, 10, 0),
+    (5, 10, 0.5),
+    (-5, 10, 1)
+])
+def test_getPrimalGap(objective, reference, gap):
+    assert tune.getPrimalGap(objective, reference) == pytest.approx(gap)
+
+
+def test_getPrimalIntegral():
+    # Gap 1 until 2s, 0.5 until 4s and 0 until the time limit of 10s
+    assert tune.getPrimalIntegral([[2, 5], [4, 10]], 10, 10) \
+        == pytest.approx(3)
+    assert tune.getPrimalIntegral([], 10, 10) == 10
+
+
+def test_tuneRejectsUnknownRankings():
+    with pytest.raises(ValueError):
+        tune.tune([], [{}], rankBy='objective')
+
+
+def test_loadCorpusSkipsWorkloadsRejectedByThePrecheck(monkeypatch, caplog):
+    generateWorkload = generator.generateWorkload
+
+    def generateInfeasibleWorkload(*args, **kwargs):
+        workload = generateWorkload(*args, **kwargs)
+        for dayConf in workload['calendar']['dayConfigurations']:
+            dayConf['numShifts'] = len(workload['shiftConfs']) + 1
+        return workload
+
+    monkeypatch.setattr(generator, 'generateWorkload',
+        generateInfeasibleWorkload)
+    with caplog.at_level(logging.WARNING, logger='tune'):
+        corpus = tune.loadCorpus(sizes=[10], schedulerConf={})
+    assert corpus == []
+    assert '10 doctors' in caplog.text
+
+
+def test_writeConfigurationMergesTheParameters(tmp_path):
+    path = tmp_path / 'scheduler.json'
+    tune.writeConfiguration({'maxTimeInSeconds': {'value': 60},
+            'solverParameters': {'value': {'num_search_workers': 8},
+                'description': ['CP-SAT parameters']}},
+        {'linearization_level': 2}, path)
+    assert json.loads(path.read_text()) == {
+        'maxTimeInSeconds': {'value': 60},
+        'solverParameters': {'value': {'num_search_workers': 8,
+            'linearization_level': 2},
+            'description': ['CP-SAT parameters']}}
+    tune.writeConfiguration({}, {'linearization_level': 2}, path)
+    assert json.loads(path.read_text()) == {
+        'solverParameters': {'value': {'linearization_level': 2}}}
+    assert [child.name for child in tmp_path.iterdir()] == ['scheduler.json']
+
+
+def test_writeConfigurationKeepsTheFileOnErrors(tmp_path):
+    path = tmp_path / 'scheduler.json'
+    path.write_text('{"maxTimeInSeconds": {"value": 60}}')
+    with pytest.raises(TypeError):
+        tune.writeConfiguration({}, {'random_seed': object()}, path)
+    assert path.read_text() == '{"maxTimeInSeconds": {"value": 60}}'
+    assert [child.name for child in tmp_path.iterdir()] == ['scheduler.json']
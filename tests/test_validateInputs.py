@@ -0,0 +1,64 @@
+import copy
+
+import pytest
+
+import generator
+import scheduler
+
+
+@pytest.fixture
+def workload():
+    return generator.generateWorkload(10, 2020, 6, seed=0)
+
+
+def validate(workload):
+    return scheduler.validateInputs(workload['doctors'],
+        workload['shiftConfs'], workload['calendar'])
+
+
+def getErrorPaths(issues):
+    return [issue['path'] for issue in issues if issue['level'] == 'error']
+
+
+def test_generatedWorkloadsAreValid(workload):
+    assert getErrorPaths(validate(workload)) == []
+
+
+def test_validateInputsDoesNotModifyTheInputs(workload):
+    original = copy.deepcopy(workload)
+    validate(workload)
+    assert workload == original
+
+
+def test_notAList(workload):
+    workload['doctors'] = {}
+    workload['shiftConfs'] = None
+    paths = getErrorPaths(validate(workload))
+    assert 'doctors' in paths
+    assert 'shiftConfs' in paths
+
+
+def test_invalidShiftConf(workload):
+    workload['shiftConfs'][2]['maxShifts'] = -1
+    workload['shiftConfs'][3]['doctorId'] = 'three'
+    paths = getErrorPaths(validate(workload))
+    assert 'shiftConfs[2].maxShifts' in paths
+    assert 'shiftConfs[3].doctorId' in paths
+
+
+def test_invalidPreference(workload):
+    workload['shiftConfs'][0]['wantedShifts'] = [{'shift': 'Someday'}]
+    paths = getErrorPaths(validate(workload))
+    assert 'shiftConfs[0].wantedShifts[0]' in paths
+
+
+def test_invalidCalendar(workload):
+    workload['calendar']['month'] = 13
+    assert 'calendar.month' in getErrorPaths(validate(workload))
+
+
+def test_scheduleRejectsTheErrors(workload):
+    workload['shiftConfs'][2]['maxShifts'] = -1
+    with pytest.raises(ValueError):
+        scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+            workload['calendar'], workload['schedulerConf'])
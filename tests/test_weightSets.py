@@ -0,0 +1,78 @@
+import pytest
+
+import generator
+import scheduler
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+WEIGHT_SETS = [{'wantedShiftWeight': 1}, {'wantedShiftWeight': 10,
+    'unwantedShiftWeight': 0}, {}]
+
+
+def scheduleWorkload(workload, schedulerConf, **kwargs):
+    return scheduler.schedule(workload['doctors'], workload['shiftConfs'],
+        workload['calendar'], schedulerConf,
+        solverParameters=SOLVER_PARAMETERS, **kwargs)
+
+
+def countAssignments(generatedSchedule, kind):
+    return sum(len(day[kind]) for day in generatedSchedule['days'])
+
+
+def test_weightSetsReturnAScheduleForEachSet():
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    portfolio = scheduleWorkload(workload, workload['schedulerConf'],
+        weightSets=WEIGHT_SETS)
+    assert isinstance(portfolio, list)
+    assert len(portfolio) == len(WEIGHT_SETS)
+    for entry, weightSet in zip(portfolio, WEIGHT_SETS):
+        assert set(entry) == {'weights', 'schedule', 'objectiveTerms'}
+        assert set(entry['weights']) == {weightKey
+            for _, weightKey, _ in scheduler.OBJECTIVE_TERMS}
+        for weightKey, weight in weightSet.items():
+            assert entry['weights'][weightKey] == weight
+        assert entry['schedule']['status'] == 'PENDING_CONFIRMATION'
+        objectiveTerms = entry['objectiveTerms']
+        assert [term for term, _, _ in scheduler.OBJECTIVE_TERMS] \
+            == list(objectiveTerms)
+        assert objectiveTerms['shifts']['count'] \
+            == countAssignments(entry['schedule'], 'shifts')
+        assert objectiveTerms['consultations']['count'] \
+            == countAssignments(entry['schedule'], 'consultations')
+        for term, weightKey, sign in scheduler.OBJECTIVE_TERMS:
+            objectiveTerm = objectiveTerms[term]
+            assert objectiveTerm['weight'] == entry['weights'][weightKey]
+            assert objectiveTerm['contribution'] \
+                == sign * objectiveTerm['weight'] * objectiveTerm['count']
+    # The weights missing in a set are the ones of the configuration
+    assert dict(portfolio[0]['weights'], wantedShiftWeight=0) \
+        == dict(portfolio[2]['weights'], wantedShiftWeight=0)
+
+
+def test_weightSetsMatchTheirOwnSolves():
+    pytest.importorskip('ortools')
+    workload = generator.generateWorkload(10, 2020, 6, seed=0)
+    portfolio = scheduleWorkload(workload, workload['schedulerConf'],
+        weightSets=WEIGHT_SETS)
+    for entry in portfolio:
+        schedulerConf = dict(workload['schedulerConf'], **{
+            weightKey: {'value': weight}
+            for weightKey, weight in entry['weights'].items()})
+        generatedSchedule = scheduleWorkload(workload, schedulerConf,
+            collectStats=True)
+        assert generatedSchedule['stats']['status'] == 'OPTIMAL'
+        assert sum(objectiveTerm['contribution']
+            for objectiveTerm in entry['objectiveTerms'].values()) \
+                == generatedSchedule['stats']['objective']
+
+
+@pytest.mark.parametrize('weightSets', [[], [{'unknownWeight': 1}], [1],
+    None, 3])
+def test_checkWeightSets(weightSets):
+    with pytest.raises(ValueError):
+        scheduler.checkWeightSets(weightSets)
+
+
+def test_checkWeightSetsReturnsAList():
+    assert scheduler.checkWeightSets(iter(WEIGHT_SETS)) == WEIGHT_SETS
@@ -0,0 +1,205 @@
+import io
+import json
+import logging
+
+import pytest
+
+import generator
+import scheduler
+import worker
+
+SOLVER_PARAMETERS = {'num_search_workers': 8, 'max_time_in_seconds': 60}
+
+
+def runWorker(lines, schedulerConf=None):
+    '''Serve the given request lines, and return the responses'''
+    outStream = io.StringIO()
+    worker.serve(io.StringIO(''.join(line + '\n' for line in lines)),
+        outStream, lambda: schedulerConf or {})
+    return [json.loads(line) for line in outStream.getvalue().splitlines()]
+
+
+def scheduleRequest(requestId, **params):
+    return json.dumps({'jsonrpc': '2.0', 'id': requestId,
+        'method': 'schedule', 'params': params})
+
+
+@pytest.fixture
+def workload():
+    return generator.generateWorkload(10, 2020, 6, seed=0)
+
+
+def getInputs(workload):
+    return {'doctors': workload['doctors'],
+        'shiftConfs': workload['shiftConfs'],
+        'calendar': workload['calendar'],
+        'solverParameters': SOLVER_PARAMETERS}
+
+
+def test_serveSchedules(workload):
+    pytest.importorskip('ortools')
+    responses = runWorker([scheduleRequest(1, **getInputs(workload))],
+        workload['schedulerConf'])
+    assert len(responses) == 1
+    assert responses[0]['id'] == 1
+    assert responses[0]['result']['status'] == 'PENDING_CONFIRMATION'
+    assert 'stats' not in responses[0]['result']
+
+
+def test_serveSchedulesFromFiles(workload, tmp_path):
+    pytest.importorskip('ortools')
+    params = {'scheduleFile': str(tmp_path / 'schedule.json'),
+        'solverParameters': SOLVER_PARAMETERS, 'stats': True}
+    for key in ('doctors', 'shiftConfs', 'calendar'):
+        path = tmp_path / (key + '.json')
+        path.write_text(json.dumps(workload[key]))
+        params[key + 'File'] = str(path)
+    responses = runWorker([scheduleRequest(1, **params)],
+        workload['schedulerConf'])
+    result = responses[0]['result']
+    assert result['status'] == 'PENDING_CONFIRMATION'
+    assert result['stats']['status'] == 'OPTIMAL'
+    assert json.loads((tmp_path / 'schedule.json').read_text()) == result
+
+
+def test_serveReportsInvalidRequests():
+    responses = runWorker([
+        'not json',
+        '[1, 2]',
+        '{"jsonrpc": "2.0", "id": 3, "method": "unknown"}',
+        '{"jsonrpc": "2.0", "id": 4, "method": "schedule", "params": 1}'
+    ])
+    assert [response['error']['code'] for response in responses] == [
+        worker.PARSE_ERROR, worker.INVALID_REQUEST, worker.METHOD_NOT_FOUND,
+        worker.INVALID_PARAMS]
+    assert [response['id'] for response in responses] == [None, None, 3, 4]
+
+
+def test_serveReportsInvalidParams(workload, tmp_path):
+    inputs = getInputs(workload)
+    invalidShiftConfs = [dict(shiftConf) for shiftConf in
+        workload['shiftConfs']]
+    invalidShiftConfs[0]['maxShifts'] = -1
+    requests = [
+        dict(inputs, calendar=None),
+        dict(inputs, stats='yes'),
+        dict(inputs, shiftConfs=invalidShiftConfs),
+        dict(inputs, doctors=None,
+            doctorsFile=str(tmp_path / 'missing.json')),
+        dict(inputs, doctors=None, doctorsFile=3),
+        dict(inputs, weightSets=[{'unknownWeight': 1}]),
+        dict(inputs, weightSets=[{}], alternatives={'count': 2,
+            'minDistance': 1}),
+        dict(inputs, incremental={'schedule': {'year': 2020, 'month': 7,
+            'days': []}, 'days': [3]}),
+        dict(inputs, incremental={'days': [3]})
+    ]
+    responses = runWorker([scheduleRequest(i, **params)
+        for i, params in enumerate(requests)], workload['schedulerConf'])
+    assert [response['id'] for response in responses] \
+        == list(range(len(requests)))
+    for response in responses:
+        assert response['error']['code'] == worker.INVALID_PARAMS
+    assert 'shiftConfs[0].maxShifts' in responses[2]['error']['message']
+
+
+def test_serveReportsInternalErrors(workload, monkeypatch, caplog):
+    def schedule(*args, **kwargs):
+        raise KeyError('numVariables')
+
+    monkeypatch.setattr(scheduler, 'schedule', schedule)
+    with caplog.at_level(logging.ERROR, logger='worker'):
+        responses = runWorker([scheduleRequest(1, **getInputs(workload))],
+            workload['schedulerConf'])
+    assert responses[0]['error'] == {'code': worker.INTERNAL_ERROR,
+        'message': "KeyError: 'numVariables'"}
+    assert 'Traceback' in caplog.text
+
+
+def test_serveStopsOnShutdown():
+    responses = runWorker([
+        '{"jsonrpc": "2.0", "id": 1, "method": "shutdown"}',
+        '{"jsonrpc": "2.0", "id": 2, "method": "reloadConfiguration"}'
+    ])
+    assert responses == [{'jsonrpc': '2.0', 'id': 1, 'result': True}]
+
+
+def test_notificationsHaveNoResponse():
+    assert runWorker(['{"jsonrpc": "2.0", '
+        '"method": "reloadConfiguration"}']) == []
+
+
+def test_cacheCountersWithoutCache():
+    responses = runWorker(['{"jsonrpc": "2.0", "id": 1, '
+        '"method": "cacheCounters"}'])
+    assert responses[0]['result'] is None
+
+
+def test_serveImportsTheSolverBeforeTheFirstRequest(monkeypatch):
+    pytest.importorskip('ortools')
+    monkeypatch.setattr(scheduler, 'cp_model', None)
+    assert runWorker([]) == []
+    assert scheduler.cp_model is not None
+
+
+def test_serveWithoutTheSolver(monkeypatch):
+    def importSolver():
+        raise ImportError('No module named ortools')
+
+    monkeypatch.setattr(scheduler, 'importSolver', importSolver)
+    responses = runWorker(['{"jsonrpc": "2.0", "id": 1, '
+        '"method": "reloadConfiguration"}'])
+    assert responses == [{'jsonrpc': '2.0', 'id': 1, 'result': True}]
+
+
+def runStream(lines, schedulerConf=None):
+    '''Run the given job lines, and return the counts and the records'''
+    outStream = io.StringIO()
+    counts = worker.streamJobs(io.StringIO(''.join(line + '\n'
+        for line in lines)), outStream, lambda: schedulerConf or {})
+    return counts, [json.loads(line)
+        for line in outStream.getvalue().splitlines()]
+
+
+def test_streamJobs(workload, tmp_path):
+    pytest.importorskip('ortools')
+    scheduleFile = tmp_path / 'schedule.json'
+    counts, records = runStream([
+        json.dumps(dict(getInputs(workload), id='june')),
+        '',
+        json.dumps(dict(getInputs(workload), scheduleFile=str(scheduleFile),
+            weightSets=[{'wantedShiftWeight': 5}]))
+    ], workload['schedulerConf'])
+    assert counts == (2, 0)
+    assert [record['id'] for record in records] == ['june', 3]
+    assert records[0]['status'] == 'PENDING_CONFIRMATION'
+    assert records[0]['schedule']['status'] == 'PENDING_CONFIRMATION'
+    # The weight sets are ignored, so a single schedule is written
+    assert records[1] == {'id': 3, 'status': 'PENDING_CONFIRMATION',
+        'scheduleFile': str(scheduleFile)}
+    assert json.loads(scheduleFile.read_text())['status'] \
+        == 'PENDING_CONFIRMATION'
+
+
+def test_streamJobsReportsFailedJobs(workload, monkeypatch):
+    def schedule(*args, **kwargs):
+        raise KeyError('numVariables')
+
+    inputs = getInputs(workload)
+    counts, records = runStream([
+        'not json',
+        '[1, 2]',
+        json.dumps(dict(inputs, id=7, doctors='doctors.json')),
+    ], workload['schedulerConf'])
+    assert counts == (3, 3)
+    assert [record['id'] for record in records] == [1, 2, 7]
+    assert all('error' in record and 'schedule' not in record
+        for record in records)
+    assert records[0]['error'].startswith('Parse error')
+    assert records[1]['error'] == 'A job must be an object'
+
+    monkeypatch.setattr(scheduler, 'schedule', schedule)
+    counts, records = runStream([json.dumps(inputs)],
+        workload['schedulerConf'])
+    assert counts == (1, 1)
+    assert records == [{'id': 1, 'error': "KeyError: 'numVariables'"}]